@@ -2,7 +2,26 @@
 # Stefan Agapie                     #
 # Final Project -- Toy Interpreter  #
 # # # # # # # # # # # # # # # # # # #
+import array
+import bisect
+import collections
+import collections.abc
+import contextlib
+import heapq
+import io
+import itertools
+import mmap
+import operator
+import os
 import re
+import struct
+import sys
+import time
+
+# The modules that only some features need, such as argparse, asyncio,
+# concurrent.futures, fractions, hashlib, multiprocessing and tempfile, are
+# imported by the functions that use them, so that a program that is run from
+# the command line starts quickly.
 
 # Defines colors that may be used for pretty print output.
 class BCOLORS:
@@ -21,6 +40,10 @@ class InterpreterSyntaxError(Exception):
     def __init__(self):
         Exception.__init__(self,"Syntax Error.")
 
+    # Errors are pickled to be sent back from worker processes.
+    def __reduce__(self):
+        return (type(self), ())
+
 
 # Defines Uninitialized Variable Interpreter Exception
 class InterpreterUninitializedVariableError(Exception):
@@ -28,9 +51,18 @@ class InterpreterUninitializedVariableError(Exception):
         Exception.__init__(self,"{0} is undefined.".format(dErrorArguments))
         self.dErrorArguments = dErrorArguments
 
+    def __reduce__(self):
+        return (type(self), (self.dErrorArguments,))
+
 
 # The base class of an Abstract Syntax Tree (AST)
+#
+# AST nodes, like tokens, declare their attributes with __slots__, which
+# leaves out the per-instance __dict__ that would otherwise take up most of
+# the memory of a node.
 class AST(object):
+    __slots__ = ()
+
     def __repr__(self):
         return self.__str__()
 
@@ -38,6 +70,8 @@ class AST(object):
 # The AST root class is the input program that is
 # defined as a collection of assignments or statements.
 class Program(AST):
+    __slots__ = ('assignments',)
+
     def __init__(self):
         self.assignments = []
 
@@ -55,40 +89,76 @@ class Program(AST):
 
 
 # The AST variable that corresponds to some variable
-# in a program statement, is defined by a token that is
-# extracted by the lexical analyzer from some program.
+# in a program statement, is defined by the name of the
+# variable, as extracted by the lexical analyzer from some
+# program. Its token, which has no position, is only created
+# when it is asked for.
 class Id(AST):
-    def __init__(self, token):
-        self.token = token
-        self.value = token.value
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    @property
+    def token(self):
+        return Token(ID, self.value)
 
     def __str__(self):
-        return 'Id({value})'.format(value=repr(self.token.value))
+        return 'Id({value})'.format(value=repr(self.value))
 
 
 # The AST number that corresponds to some number in
-# a program statement, is defined by a token that is extracted
-# by the lexical analyzer from some program.
+# a program statement, is defined by its lexeme, as extracted
+# by the lexical analyzer from some program. Like that of an
+# Id, its token is only created when it is asked for.
 class Num(AST):
-    def __init__(self, token):
-        self.token = token
-        self.value = token.value
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    @property
+    def token(self):
+        return Token(INTEGER, self.value)
 
     def __str__(self):
         return 'Num({value})'.format(value=repr(self.value))
 
 
+# The AST constant is a number that is not extracted from some program but
+# is computed by the optimizer when it folds a constant subtree. Its value is
+# the computed number itself rather than a lexeme, and since division is true
+# division that number is a float whenever the folded subtree divides.
+class Constant(Num):
+    __slots__ = ()
+
+    def __str__(self):
+        return 'Constant({value})'.format(value=repr(self.value))
+
+
 # The AST assignment operator that corresponds to some assignment
 # operator in a program statement, is defined by a variable to the
 # left of the assignment operator, followed by the assignment token
 # that is extracted by the lexical analyzer from some program,
 # followed by some expression that is to the right of the assignment
 # operator. Note that the left and right properties are AST objects.
+# The assignment token is stored once and is also available as 'op'.
+# The line and column are those of the variable assigned, since the
+# nodes of identifiers and numbers are shared by all of their uses
+# and have no position of their own.
 class Assign(AST):
-    def __init__(self, left, op, right):
+    __slots__ = ('left', 'token', 'right', 'line', 'column')
+
+    def __init__(self, left, op, right, line=None, column=None):
         self.left = left
-        self.token = self.op = op
+        self.token = op
         self.right = right
+        self.line = line
+        self.column = column
+
+    @property
+    def op(self):
+        return self.token
 
     def __str__(self):
         return 'Assign({value})'.format(value=repr(self.token.value))
@@ -99,13 +169,20 @@ class Assign(AST):
 # binary operator, followed by the operator token that is extracted
 # by the lexical analyzer from some program, followed by some operand
 # that is to the right of the binary operator. Note that the left and
-# right properties are AST objects.
+# right properties are AST objects. The operator token is stored once
+# and is also available as 'op'.
 class BinOp(AST):
+    __slots__ = ('left', 'token', 'right')
+
     def __init__(self, left, op, right):
         self.left = left
-        self.token = self.op = op
+        self.token = op
         self.right = right
 
+    @property
+    def op(self):
+        return self.token
+
     def __str__(self):
         return 'BinOp({value})'.format(value=repr(self.token.value))
 
@@ -114,12 +191,19 @@ class BinOp(AST):
 # program statement, is defined by the operator token that is extracted
 # by the lexical analyzer from some program, followed by some operand
 # that is to the right of unary operator, that is labeled as 'expr'
-# (expression). Note that the expr property is an AST objects.
+# (expression). Note that the expr property is an AST objects. The
+# operator token is stored once and is also available as 'op'.
 class UnaryOp(AST):
+    __slots__ = ('token', 'expr')
+
     def __init__(self, op, expr):
-        self.token = self.op = op
+        self.token = op
         self.expr = expr
 
+    @property
+    def op(self):
+        return self.token
+
     def __str__(self):
         return 'UnaryOp({value})'.format(value=repr(self.token.value))
 
@@ -136,6 +220,8 @@ INTEGER, ID, ASSIGN, PLUS, MINUS, MUL, DIV, LPAREN, RPAREN, SEMI, EOF = \
 # is defined as a type from a finite domain of types, a value, along with
 # the its line and starting column position within a given program.
 class Token(object):
+    __slots__ = ('type', 'value', 'line', 'column')
+
     def __init__(self, type, value=None, line=None, column=None):
         self.type = type
         self.value = value
@@ -149,66 +235,242 @@ class Token(object):
         return self.__str__()
 
 
+# Token kinds
+#
+# The lexer records the type of each token as a small integer, its kind,
+# which is the index of the type in TOKEN_TYPES.
+KIND_EOF, KIND_INTEGER, KIND_ID, KIND_ASSIGN, KIND_PLUS, KIND_MINUS, KIND_MUL, KIND_DIV, KIND_LPAREN, KIND_RPAREN, \
+    KIND_SEMI = range(11)
+TOKEN_TYPES = (EOF, INTEGER, ID, ASSIGN, PLUS, MINUS, MUL, DIV, LPAREN, RPAREN, SEMI)
+TOKEN_KINDS = dict((type, kind) for (kind, type) in enumerate(TOKEN_TYPES))
+
+# The lexemes of the token kinds that have a single lexeme.
+FIXED_VALUES = {KIND_ASSIGN: '=', KIND_SEMI: ';', KIND_LPAREN: '(', KIND_RPAREN: ')',
+                KIND_PLUS: '+', KIND_MINUS: '-', KIND_MUL: '*', KIND_DIV: '/'}
+
+
+# The tokens of a scanned program, stored as parallel typed arrays rather
+# than as Token objects: the kind, the offset and length of the lexeme within
+# the program's source, and the line of each token, along with the offset at
+# which each line starts. A Token is only created when one is requested, by
+# index or by iteration; the lexeme of a token is only copied out of the
+# source when its value is needed.
+class TokenArray(object):
+    def __init__(self, source=''):
+        self.source = source
+        self.kinds = array.array('B')
+        self.starts = array.array('q')
+        self.lengths = array.array('L')
+        self.lines = array.array('L')
+        self.line_starts = array.array('q', [0])
+        self.values = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    # Returns the value of the token at a given index. A lexeme of a bytes
+    # source is decoded once and shared by all of its tokens.
+    def value(self, index):
+
+        value = FIXED_VALUES.get(self.kinds[index])
+        if value is None:
+            start = self.starts[index]
+            value = self.source[start:start + self.lengths[index]]
+            if not isinstance(value, str):
+                lexeme = value
+                value = self.values.get(lexeme)
+                if value is None:
+                    value = self.values[lexeme] = sys.intern(lexeme.decode('ascii'))
+        return value
+
+    # Returns the line and column of the token at a given index.
+    def position(self, index):
+
+        line = self.lines[index]
+        return (line, self.starts[index] - self.line_starts[line - 1])
+
+    # Returns a Token for the token at a given index.
+    def token(self, index):
+        return Token(TOKEN_TYPES[self.kinds[index]], self.value(index), *self.position(index))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.token(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("token index out of range")
+        return self.token(index)
+
+    def __iter__(self):
+        return map(self.token, range(len(self)))
+
+    # Returns the number of bytes used by the arrays.
+    def nbytes(self):
+        return sum(len(values) * values.itemsize
+                   for values in (self.kinds, self.starts, self.lengths, self.lines, self.line_starts))
+
+    def __str__(self):
+        return str(list(self))
+
+    def __repr__(self):
+        return self.__str__()
+
+
 # This is the Lexical Analyzer.
 # The job of the lexer is to generate tokens from a given
 # program as defined by the Toy Grammar (see below).
 class Lexer(object):
+    token_specification = [
+        ('INTEGER', r'(?:[0]|[1-9]\d*)'),               # Integer or decimal number
+        ('ASSIGN',  r'='),                              # Assignment operator
+        ('SEMI',    r';'),                              # Statement terminator
+        ('LPAREN',  r'\('),                             # Open Parenthesis
+        ('RPAREN',  r'\)'),                             # Close Parenthesis
+        ('ID',      r'[A-Za-z](?:[0-9]|[A-Za-z]|\_)*'), # Identifier
+        ('PLUS',    r'[+]'),                            # Arithmetic operators
+        ('MINUS',   r'[\-]'),                           # Arithmetic operators
+        ('MUL',     r'[*]'),                            # Arithmetic operators
+        ('DIV',     r'[\/]'),                           # Arithmetic operators
+        ('NEWLINE', r'\n'),                             # Line endings
+        ('SKIP',    r'[ \t]'),                          # Skip over spaces and tabs
+    ]
+    tok_regex = '|'.join('(?P<%s>%s)' % pair for pair in token_specification)
+
+    # The regular expression is compiled once, for every lexer. Each of its
+    # groups matches one entry of the specification; the kind of each group's
+    # tokens is looked up by the group's index, where newlines and skipped
+    # characters have the negative kinds _NEWLINE and _SKIP.
+    _NEWLINE, _SKIP = (-1, -2)
+    _group_kinds = (None,) + tuple(map(dict(TOKEN_KINDS, NEWLINE=_NEWLINE, SKIP=_SKIP).get,
+                                       (name for (name, _) in token_specification)))
+    get_token = re.compile(tok_regex).match
+    find_tokens = re.compile(tok_regex).finditer
+    find_bytes_tokens = re.compile(tok_regex.encode('ascii')).finditer
+
+    _eof_token = Token(EOF)
+
     def __init__(self):
         self.current_token_index = None
-        self.tokens = []
-        self.token_specification = [
-            ('INTEGER', r'([0]|[1-9]\d*)'),                 # Integer or decimal number
-            ('ASSIGN',  r'='),                              # Assignment operator
-            ('SEMI',    r';'),                              # Statement terminator
-            ('LPAREN',  r'\('),                             # Open Parenthesis
-            ('RPAREN',  r'\)'),                             # Close Parenthesis
-            ('ID',      r'[A-Za-z]([0-9]|[A-Za-z]|\_)*'),   # Identifier
-            ('PLUS',    r'[+]'),                            # Arithmetic operators
-            ('MINUS',   r'[\-]'),                           # Arithmetic operators
-            ('MUL',     r'[*]'),                            # Arithmetic operators
-            ('DIV',     r'[\/]'),                           # Arithmetic operators
-            ('NEWLINE', r'\n'),                             # Line endings
-            ('SKIP',    r'[ \t]'),                          # Skip over spaces and tabs
-        ]
-        self.tok_regex = '|'.join('(?P<%s>%s)' % pair for pair in self.token_specification)
-        self.get_token = re.compile(self.tok_regex).match
-
-    # Resets this lexer's state to its initial state.
+        self.tokens = TokenArray()
+
+    # Resets this lexer's state to its initial state. The memory map of a
+    # file that scanner_file() scanned is closed.
     def reset(self):
+        if isinstance(self.tokens.source, mmap.mmap):
+            self.tokens.source.close()
         self.current_token_index = None
-        self.tokens = []
+        self.tokens = TokenArray()
 
     # Given an entire program, it is scanned from end to end and tokens
     # are generated from each discovered lexeme. Note that piecewise program
     # inputs are not supported since on each call of this method the lexer's
     # internal state is reset to its initial state.
     #
-    # To access the generated tokens call get_next_token().
+    # The tokens are stored in a TokenArray; to access them as Tokens call
+    # get_next_token().
     def scanner_input(self, input_program):
 
+        self._scan(input_program, self.find_tokens)
+
+    # Scans a program file as scanner_input() does, without reading it into a
+    # string: the file is memory mapped and scanned by scanner_buffer(). The
+    # file must not be modified while its tokens are in use, so the lexer
+    # should be reset as soon as they have been parsed; the Tokens of an AST
+    # hold decoded values and do not refer to the file.
+    def scanner_file(self, path):
+
+        with open(path, 'rb') as file:
+            try:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # An empty file can not be mapped.
+                buffer = b''
+        self.scanner_buffer(buffer)
+
+    # Scans a program that is given as a bytes-like buffer, such as bytes or
+    # an mmap, as scanner_input() does. The lexemes stay in the buffer until
+    # their values are needed, and each distinct identifier or integer is then
+    # decoded once, so that all of its tokens share a single, interned, string.
+    def scanner_buffer(self, buffer):
+
+        self._scan(buffer, self.find_bytes_tokens)
+
+    def _scan(self, source, find_tokens):
+
         self.reset()
+        tokens = self.tokens = TokenArray(source)
+        group_kinds = self._group_kinds
+        newline = self._NEWLINE
+        add_kind = tokens.kinds.append
+        add_start = tokens.starts.append
+        add_length = tokens.lengths.append
+        add_line = tokens.lines.append
+        add_line_start = tokens.line_starts.append
         pos = 0
         line = 1
-        line_start = 0
 
-        mo = self.get_token(input_program)
-        while mo is not None:
-            type = mo.lastgroup
-            if type == 'NEWLINE':
-                line_start = pos
+        for mo in find_tokens(source):
+            (start, end) = mo.span()
+            if start != pos:
+                self._error()
+            pos = end
+            kind = group_kinds[mo.lastindex]
+            if kind > 0:
+                add_kind(kind)
+                add_start(start)
+                add_length(end - start)
+                add_line(line)
+            elif kind == newline:
                 line += 1
-            elif type != 'SKIP':
-                val = mo.group(type)
-                self.tokens.append(Token(type, val, line, mo.start() - line_start))
-
-            pos = mo.end()
-            mo = self.get_token(input_program, pos)
-        if pos != len(input_program):
+                add_line_start(start)
+        if pos != len(source):
             self._error()
 
-        if len(self.tokens) > 0:
+        if len(tokens) > 0:
             self.current_token_index = 0
 
+    # Scans a program that is given as an iterable of chunks of text and
+    # yields each token as soon as it is discovered, so that a program of any
+    # size is scanned in memory bounded by the size of its chunks. A lexeme may
+    # be split across chunks: a match that reaches the end of a chunk is
+    # carried over and scanned again together with the next chunk. Token lines
+    # and columns are the same as the ones produced by scanner_input().
+    #
+    # Note that unlike scanner_input() an invalid lexeme is only reported once
+    # the tokens that precede it have been consumed.
+    def generate_tokens(self, chunks):
+
+        get_token = self.get_token
+        pending = ""
+        base = 0
+        line = 1
+        line_start = 0
+
+        for chunk in itertools.chain(chunks, (None,)):
+            final = chunk is None
+            buffer = pending if final else pending + chunk
+            end = len(buffer)
+            pos = 0
+
+            mo = get_token(buffer)
+            while mo is not None and (final or mo.end() < end):
+                type = mo.lastgroup
+                if type == 'NEWLINE':
+                    line_start = base + pos
+                    line += 1
+                elif type != 'SKIP':
+                    val = mo.group(type)
+                    yield Token(type, val, line, base + mo.start() - line_start)
+
+                pos = mo.end()
+                mo = get_token(buffer, pos)
+            if mo is None and pos != end:
+                self._error()
+
+            pending = buffer[pos:]
+            base += pos
+
     def _error(self):
         raise InterpreterSyntaxError()
 
@@ -217,28 +479,79 @@ class Lexer(object):
     # token is returned on subsequent calls.
     def get_next_token(self):
 
-        while self.current_token_index is not None and self.current_token_index < len(self.tokens):
+        index = self.current_token_index
+        if index is not None and index < len(self.tokens):
+            self.current_token_index = index + 1
+            return self.tokens.token(index)
 
-            token = self.tokens[self.current_token_index]
-            self.current_token_index += 1
-            return token
+        return self._eof_token
 
-        return Token(EOF)
+    # Returns an iterator over the tokens of a previously scanned program,
+    # starting at the current token, that yields End of File tokens once all
+    # the tokens have been consumed.
+    def token_stream(self):
+
+        start = self.current_token_index or 0
+        return itertools.chain(map(self.tokens.token, range(start, len(self.tokens))),
+                               itertools.repeat(self._eof_token))
 
 
 # This is the Syntax Analyzer.
 # The job of the parser to build an in memory Parser Tree, via recursive
-# calls, that checks for syntax error and build an Abstract Syntax Tree
-# (AST) as the Parser Tree frontier is expanded.
+# descent for statements and operator precedence for expressions, that checks
+# for syntax error and build an Abstract Syntax Tree (AST) as the Parser Tree
+# frontier is expanded.
+#
+# The parser reads the token kinds of the Lexer's TokenArray by position and
+# creates no Tokens. Every distinct identifier and integer of a program is a
+# single Id or Num node, made from its lexeme the first time it is seen and
+# shared by all of its uses, and all the operator nodes of a kind share one
+# Token. Only the position of the variable that each assignment assigns is
+# kept, by its Assign node.
 class Parser(object):
+
+    # Pending operators are kept as codes: the kind of a binary operator, or
+    # the kind plus _UNARY for a unary operator, an open parenthesis and the
+    # End of File at the bottom of the operator stack. The level of a code is
+    # how tightly it binds. Unary operators bind tighter than any binary
+    # operator and an open parenthesis, like the bottom of the stack, binds
+    # loosest of all, so that a reduction never crosses it. Every other kind
+    # ends an operand's expression at level 1.
+    _UNARY = 16
+    _binding_levels = {KIND_PLUS: 2, KIND_MINUS: 2, KIND_MUL: 3, KIND_DIV: 3, _UNARY + KIND_PLUS: 4,
+                       _UNARY + KIND_MINUS: 4, _UNARY + KIND_LPAREN: 0, _UNARY + KIND_EOF: 0}
+    _levels = tuple(map(_binding_levels.get, range(2 * _UNARY), itertools.repeat(1)))
+    _code_tokens = dict((kind, Token(TOKEN_TYPES[kind], value)) for (kind, value) in FIXED_VALUES.items())
+    _code_tokens[_UNARY + KIND_PLUS] = _code_tokens[KIND_PLUS]
+    _code_tokens[_UNARY + KIND_MINUS] = _code_tokens[KIND_MINUS]
+    _operator_tokens = tuple(map(_code_tokens.get, range(2 * _UNARY)))
+    _end = bytes((KIND_EOF,))
+
     def __init__(self, lexer):
         self.lexer = lexer
         # set current token to the first token taken from the input
-        self.current_token = self.lexer.get_next_token()
+        self.reset()
 
     # Resets this parser's state to its initial state.
     def reset(self):
-        self.current_token = self.lexer.get_next_token()
+        tokens = self.lexer.tokens
+        self._read(bytes(tokens.kinds), tokens.source, tokens.starts, tokens.lengths, tokens.lines, tokens.line_starts)
+        self.position = self.lexer.current_token_index or 0
+
+    # Sets the tokens to parse: their kinds, the source their lexemes are
+    # sliced from, where each lexeme starts and how long it is, the line of
+    # each token and where each line starts. The kinds are followed by an End
+    # of File.
+    def _read(self, kinds, source, starts, lengths, lines, line_starts):
+        self.kinds = kinds + self._end
+        self.source = source
+        self.decode = not isinstance(source, str)
+        self.starts = starts
+        self.lengths = lengths
+        self.lines = lines
+        self.line_starts = line_starts
+        self.leaves = {}
+        self.position = 0
 
     # Initiates a series of call procedures as defined by the Toy Grammar
     # that results in the generation of an in memory Parser Tree and the
@@ -246,361 +559,4438 @@ class Parser(object):
     def program(self):
 
         program = Program()
-
-        while self.current_token.type != EOF:
-            program.addStatement(self._statement())
+        program.assignments.extend(self._assignments())
 
         return program
 
+    # Parses the tokens of the given iterator and yields each assignment as
+    # soon as it has been parsed, rather than building the whole Program, so
+    # that only one statement at a time needs to be held in memory. The tokens
+    # of a statement are read up to its semicolon and then parsed as a program
+    # of their own, whose assignment then takes the position of its first
+    # token.
+    def statements(self, tokens):
+
+        statement = []
+        for token in tokens:
+            statement.append(token)
+            if token.type == SEMI:
+                yield self._buffered_statement(statement)
+                statement = []
+
+        if statement:
+            yield self._buffered_statement(statement)
+
+    def _buffered_statement(self, tokens):
+
+        values = [token.value for token in tokens]
+        lengths = [len(value) for value in values]
+        self._read(bytes(TOKEN_KINDS[token.type] for token in tokens), "".join(values),
+                   list(itertools.accumulate(lengths, initial=0)), lengths, (1,), (0,))
+        assignment = next(self._assignments())
+        (assignment.line, assignment.column) = (tokens[0].line, tokens[0].column)
+        return assignment
+
     def _error_syntax(self):
         raise InterpreterSyntaxError()
 
-    def _match(self, token_type):
+    # Parses the statements from the current position on and yields each
+    # assignment. A statement is an identifier and an assignment operator,
+    # parsed by looking at their kinds, followed by an expression and a
+    # semicolon. The expression is parsed with an iterative, table driven,
+    # operator precedence parser: operands are kept on an operand stack while
+    # pending operators, unary operators and open parentheses are kept, as
+    # codes, on an operator stack. Left associative chains such as
+    # 1 + 1 + ... + 1 and arbitrarily deep nesting of parentheses and unary
+    # operators are handled in a loop, so no Python recursion is used and the
+    # generated AST is identical to the one described by the grammar. The
+    # whole program is parsed in this one frame, with every table held in a
+    # local variable.
+    def _assignments(self):
+
+        kinds = self.kinds
+        source = self.source
+        decode = self.decode
+        starts = self.starts
+        lengths = self.lengths
+        lines = self.lines
+        line_starts = self.line_starts
+        leaves = self.leaves
+        levels = self._levels
+        operator_tokens = self._operator_tokens
+        assign_token = operator_tokens[KIND_ASSIGN]
+        unary = self._UNARY
+        operands = []
+        push = operands.append
+        pop = operands.pop
+        operators = [unary + KIND_EOF]
+        push_operator = operators.append
+        pop_operator = operators.pop
+        position = self.position
+
+        while kinds[position] != KIND_EOF:
+            if kinds[position] != KIND_ID or kinds[position + 1] != KIND_ASSIGN:
+                self._error_syntax()
+            start = starts[position]
+            lexeme = source[start:start + lengths[position]]
+            left = leaves.get(lexeme)
+            if left is None:
+                left = leaves[lexeme] = Id(sys.intern(lexeme.decode('ascii')) if decode else lexeme)
+            line = lines[position]
+            column = start - line_starts[line - 1]
+            position += 2
+            open_parens = 0
+
+            while True:
+                # An operand is expected: any number of prefix operators and
+                # open parentheses followed by a literal or an identifier.
+                kind = kinds[position]
+                while kind > KIND_ID:
+                    if kind == KIND_LPAREN:
+                        open_parens += 1
+                        push_operator(unary + kind)
+                    elif kind == KIND_PLUS or kind == KIND_MINUS:
+                        push_operator(unary + kind)
+                    else:
+                        self._error_syntax()
+                    position += 1
+                    kind = kinds[position]
+                if kind == KIND_EOF:
+                    self._error_syntax()
+
+                start = starts[position]
+                lexeme = source[start:start + lengths[position]]
+                leaf = leaves.get(lexeme)
+                if leaf is None:
+                    value = sys.intern(lexeme.decode('ascii')) if decode else lexeme
+                    leaf = leaves[lexeme] = Num(value) if kind == KIND_INTEGER else Id(value)
+                push(leaf)
+                position += 1
+
+                # An operator is expected: a binary operator, a close
+                # parenthesis or the end of the expression. Every pending
+                # operator that binds at least as tight as the one just seen is
+                # reduced first; a close parenthesis or the end of the
+                # expression reduce everything down to the innermost open
+                # parenthesis, which a close parenthesis then pops.
+                kind = kinds[position]
+                level = levels[kind]
+                while True:
+                    while levels[operators[-1]] >= level:
+                        code = pop_operator()
+                        if code > unary:
+                            push(UnaryOp(operator_tokens[code], pop()))
+                        else:
+                            right = pop()
+                            push(BinOp(pop(), operator_tokens[code], right))
+                    if level > 1 or kind != KIND_RPAREN or not open_parens:
+                        break
+                    pop_operator()
+                    open_parens -= 1
+                    position += 1
+                    kind = kinds[position]
+                    level = levels[kind]
+
+                if level == 1:
+                    break
+                push_operator(kind)
+                position += 1
+
+            if open_parens or kinds[position] != KIND_SEMI:
+                self._error_syntax()
+            position += 1
+            self.position = position
+
+            yield Assign(left, assign_token, pop(), line, column)
+
+
+# This is the AST Optimizer.
+# The job of the optimizer is to rewrite a Parser generated Abstract Syntax
+# Tree (AST) into an equivalent, smaller one before it is evaluated:
+#   1. Constant subtrees are folded into a single Constant.
+#   2. Runs of unary operators are collapsed: unary plus is dropped and pairs
+#      of unary minus cancel out.
+#   3. The identities x * 1, 1 * x, x + 0, 0 + x and x - 0 are applied.
+# The optimized AST evaluates to exactly the same values and raises exactly
+# the same errors as the original one. Every variable read is preserved, so
+# undefined variables are still reported, a subtree whose evaluation raises
+# (e.g. a division by zero) is left as is so that it raises at run time, and
+# identities only apply to integer 0 and 1 since adding or multiplying by
+# the float 0.0 or 1.0 would turn an integer into a float. The given AST is
+# never modified; the nodes that do not change are shared with the new AST.
+class Optimizer(object):
+
+    def optimize_program(self, program):
+
+        optimized = Program()
+        for assignment in program.assignments:
+            optimized.addStatement(self.optimize_statement(assignment))
+
+        return optimized
+
+    def optimize_statement(self, assignment):
+
+        right = self.optimize_expression(assignment.right)
+        if right is not assignment.right:
+            assignment = Assign(assignment.left, assignment.op, right, assignment.line, assignment.column)
+        return assignment
+
+    # Optimizes an expression bottom up. The tree is walked in post-order
+    # with an explicit stack, so arbitrarily deep trees need no recursion.
+    def optimize_expression(self, root):
+
+        results = []
+        pending = [(root, False)]
+
+        while pending:
+            node, visited = pending.pop()
+
+            if isinstance(node, BinOp):
+                if visited:
+                    right = results.pop()
+                    left = results.pop()
+                    results.append(self._optimize_binary(node, left, right))
+                else:
+                    pending.append((node, True))
+                    pending.append((node.right, False))
+                    pending.append((node.left, False))
+
+            elif isinstance(node, UnaryOp):
+                if visited:
+                    results.append(self._optimize_unary(node, results.pop()))
+                else:
+                    pending.append((node, True))
+                    pending.append((node.expr, False))
 
-        token = self.current_token
-        if self.current_token.type == token_type:
-            self.current_token = self.lexer.get_next_token()
-            return token
-        else:
-            self._error_syntax()
+            else:
+                results.append(node)
 
-    def _statement(self):
+        return results.pop()
 
-        left_node = self._identifier()
-        assign_token = self._match(ASSIGN)
-        right_node = self._expression()
-        self._match(SEMI)
+    # Returns the number a node evaluates to if it is a Num, otherwise None.
+    def _constant_value(self, node):
 
-        return Assign(left_node, assign_token, right_node)
+        if isinstance(node, Constant):
+            return node.value
+        elif isinstance(node, Num):
+            return int(node.value)
+        return None
 
-    def _identifier(self):
+    def _is_integer(self, value, integer):
+        return type(value) is int and value == integer
 
-        token = self._match(ID)
-        node = Id(token)
+    def _optimize_binary(self, node, left, right):
 
-        return node
+        left_value = self._constant_value(left)
+        right_value = self._constant_value(right)
+        op_type = node.token.type
 
-    def _factor(self):
+        if left_value is not None and right_value is not None:
+            try:
+                if op_type == PLUS:
+                    return Constant(left_value + right_value)
+                elif op_type == MINUS:
+                    return Constant(left_value - right_value)
+                elif op_type == MUL:
+                    return Constant(left_value * right_value)
+                elif op_type == DIV:
+                    return Constant(left_value / right_value)
+            except ArithmeticError:
+                pass
+
+        if op_type == MUL:
+            if self._is_integer(right_value, 1):
+                return left
+            if self._is_integer(left_value, 1):
+                return right
+
+        elif op_type == PLUS:
+            if self._is_integer(right_value, 0):
+                return left
+            if self._is_integer(left_value, 0):
+                return right
+
+        elif op_type == MINUS:
+            if self._is_integer(right_value, 0):
+                return left
+
+        if left is node.left and right is node.right:
+            return node
+        return BinOp(left, node.op, right)
 
-        token = self.current_token
+    def _optimize_unary(self, node, expr):
 
-        if token.type == PLUS:
-            self._match(PLUS)
-            return UnaryOp(token, self._factor())
+        value = self._constant_value(expr)
+        op_type = node.token.type
 
-        elif token.type == MINUS:
-            self._match(MINUS)
-            return UnaryOp(token, self._factor())
+        if op_type == PLUS:
+            return expr
 
-        elif token.type == INTEGER:
-            self._match(INTEGER)
-            return Num(token)
+        elif op_type == MINUS:
+            if value is not None:
+                return Constant(-value)
+            if isinstance(expr, UnaryOp) and expr.token.type == MINUS:
+                return expr.expr
 
-        elif token.type == LPAREN:
-            self._match(LPAREN)
-            node = self._expression()
-            self._match(RPAREN)
+        if expr is node.expr:
             return node
+        return UnaryOp(node.op, expr)
 
-        elif token.type == ID:
-            return self._identifier()
 
-        else:
-            self._error_syntax()
+# Node kinds of a NodeTable.
+NODE_NUM, NODE_CONSTANT, NODE_ID, NODE_BINOP, NODE_UNARYOP, NODE_ASSIGN = range(6)
 
-    def _term(self):
+# Operator codes of a NodeTable, which index the operator symbols.
+OPERATOR_PLUS, OPERATOR_MINUS, OPERATOR_MUL, OPERATOR_DIV = range(4)
+OPERATOR_SYMBOLS = ('+', '-', '*', '/')
 
-        node = self._factor()
-        node = self._term_prime(node)
 
-        return node
+# The compact form of an Abstract Syntax Tree (AST): a struct of arrays node
+# table. Node i is described by kinds[i], its NODE_* kind, by operators[i],
+# the OPERATOR_* code of an operator node, and by firsts[i] and seconds[i]:
+#   NODE_NUM, NODE_CONSTANT:  firsts[i] indexes constants.
+#   NODE_ID:                  firsts[i] indexes names.
+#   NODE_BINOP:               firsts[i] and seconds[i] are the left and right operands.
+#   NODE_UNARYOP:             firsts[i] is the operand.
+#   NODE_ASSIGN:              firsts[i] indexes names, seconds[i] is the expression.
+# The nodes of each statement are stored in post-order, children before their
+# parents, and statements holds the index of the NODE_ASSIGN node of every
+# statement, in program order. The numbers are stored in machine sized array
+# buffers and names and constants are stored once, so a node costs a few
+# bytes rather than a few Python objects.
+class NodeTable(object):
 
-    def _term_prime(self, node):
+    _operator_codes = {PLUS: OPERATOR_PLUS, MINUS: OPERATOR_MINUS, MUL: OPERATOR_MUL, DIV: OPERATOR_DIV}
 
-        token = self.current_token
+    def __init__(self):
+        self.kinds = array.array('B')
+        self.operators = array.array('B')
+        self.firsts = array.array('i')
+        self.seconds = array.array('i')
+        self.constants = []
+        self.names = []
+        self.statements = array.array('i')
+        self.constant_index = {}
+        self.name_index = {}
 
-        if token.type == MUL:
-            self._match(MUL)
-            node = BinOp(left=node, op=token, right=self._factor())
-            node = self._term_prime(node)
+    def __str__(self):
+        return 'NodeTable({value})'.format(value=repr(len(self.statements)))
 
-        elif token.type == DIV:
-            self._match(DIV)
-            node = BinOp(left=node, op=token, right=self._factor())
-            node = self._term_prime(node)
+    def __repr__(self):
+        return self.__str__()
 
-        return node
+    def __len__(self):
+        return len(self.kinds)
+
+    # Appends the nodes of the given Program.
+    def add_program(self, program):
+
+        for assignment in program.assignments:
+            self.add_statement(assignment)
+
+    # Appends the nodes of the given assignment and returns the index of its
+    # NODE_ASSIGN node. The tree is walked in post-order with an explicit
+    # stack, so arbitrarily deep trees need no recursion.
+    def add_statement(self, assignment):
+
+        indices = []
+        pending = [(assignment.right, False)]
+
+        while pending:
+            node, visited = pending.pop()
+
+            if isinstance(node, BinOp):
+                if visited:
+                    right = indices.pop()
+                    indices.append(self._add(NODE_BINOP, node.token.type, indices.pop(), right))
+                else:
+                    pending.append((node, True))
+                    pending.append((node.right, False))
+                    pending.append((node.left, False))
+
+            elif isinstance(node, UnaryOp):
+                if visited:
+                    indices.append(self._add(NODE_UNARYOP, node.token.type, indices.pop(), 0))
+                else:
+                    pending.append((node, True))
+                    pending.append((node.expr, False))
+
+            elif isinstance(node, Constant):
+                indices.append(self._add(NODE_CONSTANT, None, self._constant(node.value), 0))
+
+            elif isinstance(node, Num):
+                indices.append(self._add(NODE_NUM, None, self._constant(int(node.value)), 0))
+
+            elif isinstance(node, Id):
+                indices.append(self._add(NODE_ID, None, self._name(node.value), 0))
+
+        index = self._add(NODE_ASSIGN, None, self._name(assignment.left.value), indices.pop())
+        self.statements.append(index)
+        return index
+
+    def _add(self, kind, operator_type, first, second):
+
+        self.kinds.append(kind)
+        self.operators.append(self._operator_codes.get(operator_type, 0))
+        self.firsts.append(first)
+        self.seconds.append(second)
+        return len(self.kinds) - 1
+
+    # Constants are keyed by their repr, which tells a float apart from an
+    # equal integer.
+    def _constant(self, value):
+
+        key = repr(value)
+        index = self.constant_index.get(key)
+        if index is None:
+            index = self.constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def _name(self, name):
+
+        index = self.name_index.get(name)
+        if index is None:
+            index = self.name_index[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    # Returns the approximate number of bytes used by this table.
+    def nbytes(self):
+
+        size = 0
+        for buffer in (self.kinds, self.operators, self.firsts, self.seconds, self.statements):
+            size += buffer.buffer_info()[1] * buffer.itemsize
+        for value in itertools.chain(self.names, self.constants):
+            size += sys.getsizeof(value) + 2 * 8 + 100
+        return size
+
+    # Returns the children of node i, in order.
+    def children(self, i):
+
+        kind = self.kinds[i]
+        if kind == NODE_BINOP:
+            return (self.firsts[i], self.seconds[i])
+        elif kind == NODE_UNARYOP:
+            return (self.firsts[i],)
+        elif kind == NODE_ASSIGN:
+            return (self.seconds[i],)
+        return ()
+
+    # Returns a description of node i, in the format of the AST classes.
+    def node_string(self, i):
+
+        kind = self.kinds[i]
+        if kind == NODE_NUM:
+            return 'Num({value})'.format(value=repr(str(self.constants[self.firsts[i]])))
+        elif kind == NODE_CONSTANT:
+            return 'Constant({value})'.format(value=repr(self.constants[self.firsts[i]]))
+        elif kind == NODE_ID:
+            return 'Id({value})'.format(value=repr(self.names[self.firsts[i]]))
+        elif kind == NODE_BINOP:
+            return 'BinOp({value})'.format(value=repr(OPERATOR_SYMBOLS[self.operators[i]]))
+        elif kind == NODE_UNARYOP:
+            return 'UnaryOp({value})'.format(value=repr(OPERATOR_SYMBOLS[self.operators[i]]))
+        return 'Assign({value})'.format(value=repr('='))
+
+
+# Opcodes of the stack based Virtual Machine.
+#
+# Every instruction is an (opcode, argument) pair. The argument of PUSH_CONST
+# is an index into the constant pool, the argument of LOAD and STORE is an
+# index into the name pool, and the arithmetic opcodes, which operate on the
+# values at the top of the stack, take no argument (None).
+OP_PUSH_CONST, OP_LOAD, OP_STORE, OP_ADD, OP_SUB, OP_MUL, OP_DIV, OP_NEG = range(8)
+OPCODE_NAMES = ('PUSH_CONST', 'LOAD', 'STORE', 'ADD', 'SUB', 'MUL', 'DIV', 'NEG')
+
+
+# The compiled form of a program: a flat list of instructions together with
+# the pools of constants and variable names the instructions refer to. The
+# index of a name in its pool is the slot of its variable in a frame, see
+# resolve().
+class Bytecode(object):
+    def __init__(self):
+        self.code = []
+        self.constants = []
+        self.names = []
+        self.free_slots = None
+        self.stored_slots = None
+
+    # Resolves the variables of the program to slots of a frame, i.e. a list
+    # with one value per name, and finds the free variables, which are read
+    # before the program assigns them and so must be defined before it runs.
+    # Sets free_slots to the slots of the free variables, in the order of
+    # their first reads, and stored_slots to the slots of the assigned
+    # variables, in the order of their first assignments.
+    def resolve(self):
+
+        assigned = [False] * len(self.names)
+        seen = [False] * len(self.names)
+        free_slots = []
+        stored_slots = []
+        for (opcode, arg) in self.code:
+            if opcode == OP_LOAD and not assigned[arg] and not seen[arg]:
+                seen[arg] = True
+                free_slots.append(arg)
+            elif opcode == OP_STORE and not assigned[arg]:
+                assigned[arg] = True
+                stored_slots.append(arg)
+
+        self.free_slots = free_slots
+        self.stored_slots = stored_slots
+        return self
 
-    def _expression(self):
+    def __str__(self):
+        return 'Bytecode({value})'.format(value=repr(len(self.code)))
 
-        node = self._term()
-        node = self._expression_prime(node)
+    def __repr__(self):
+        return self.__str__()
 
-        return node
+    # Returns a human readable listing of the instructions, one per line.
+    def disassemble(self):
+
+        lines = []
+        for (offset, (opcode, arg)) in enumerate(self.code):
+            line = "{offset:04d} {name}".format(offset=offset, name=OPCODE_NAMES[opcode])
+            if opcode == OP_PUSH_CONST:
+                line += " {arg} ({value})".format(arg=arg, value=self.constants[arg])
+            elif opcode == OP_LOAD or opcode == OP_STORE:
+                line += " {arg} ({value})".format(arg=arg, value=self.names[arg])
+            lines.append(line)
+        return "\n".join(lines)
+
+
+# This is the Liveness Analysis.
+# The job of the liveness analysis is to find the statements of a program
+# whose values are never used, so that they need not be evaluated. Going
+# backward from the end of the program, it tracks the set of live variables:
+# the variables whose current value is read by a later statement or is an
+# output of the program. A statement is live if it assigns a live variable.
+# Its variable is then dead until an earlier assignment, and the variables it
+# reads become live.
+#
+# By default every variable is an output, so only dead stores are skipped:
+# these are assignments that are overwritten before they are ever read. When
+# outputs are given, only the statements that the outputs depend on,
+# transitively, are kept. Unlike the Optimizer, pruning changes which errors
+# a program raises, since a skipped statement can not fail.
+class LivenessAnalysis(object):
+
+    # Returns, for every assignment, whether it is live.
+    def live_statements(self, assignments, outputs=None):
+
+        if outputs is None:
+            live = set(assignment.left.value for assignment in assignments)
+        else:
+            live = set(outputs)
+
+        flags = [False] * len(assignments)
+        for index in range(len(assignments) - 1, -1, -1):
+            assignment = assignments[index]
+            variable_name = assignment.left.value
+            if variable_name in live:
+                flags[index] = True
+                live.discard(variable_name)
+                live.update(self.reads(assignment.right))
+
+        return flags
+
+    # Returns a new Program of the live assignments of a program, and the
+    # number of assignments skipped.
+    def prune(self, program, outputs=None):
+
+        pruned = Program()
+        flags = self.live_statements(program.assignments, outputs)
+        for (assignment, live) in zip(program.assignments, flags):
+            if live:
+                pruned.addStatement(assignment)
+
+        return (pruned, len(flags) - len(pruned.assignments))
+
+    # Returns the names of the variables an expression reads.
+    def reads(self, root):
+
+        names = set()
+        pending = [root]
+        while pending:
+            node = pending.pop()
+            if isinstance(node, Id):
+                names.add(node.value)
+            elif isinstance(node, BinOp):
+                pending.append(node.left)
+                pending.append(node.right)
+            elif isinstance(node, UnaryOp):
+                pending.append(node.expr)
+
+        return names
+
+
+# This is the Subexpression Interner.
+# The job of the interner is to hash-cons the AST of a program: to rebuild it
+# so that structurally identical subexpressions, within a statement and
+# across statements, are a single shared node, which turns the AST into a
+# DAG. Nodes are interned bottom up, keyed by their type, operator and the
+# identities of their already interned children, so that every distinct
+# subexpression is stored once.
+#
+# The interner also counts the uses of every operator node and records the
+# variables that each of them reads. The operator nodes used more than once
+# are the common subexpressions, which the Interpreter computes once and
+# reuses for as long as the variables they read do not change; see
+# Interpreter._walk(). The given AST is never modified.
+class SubexpressionInterner(object):
+
+    # Returns the hash-consed Program of a given Program, and the common
+    # subexpressions: a dictionary from the id of each common subexpression
+    # to the set of the names of the variables it reads.
+    def intern_program(self, program):
+
+        nodes = {}
+        uses = {}
+        reads = {}
+        interned = Program()
+        for assignment in program.assignments:
+            right = self.intern_expression(assignment.right, nodes, uses, reads)
+            if right is not assignment.right:
+                assignment = Assign(assignment.left, assignment.op, right, assignment.line, assignment.column)
+            interned.addStatement(assignment)
+
+        shared = dict((key, reads[key]) for (key, count) in uses.items() if count > 1)
+        return (interned, shared)
+
+    # Interns an expression in the given tables of interned nodes by key, of
+    # the uses of operator nodes by id and of the variables read by id. The
+    # tree is walked in post-order with an explicit stack, so arbitrarily deep
+    # trees need no recursion.
+    def intern_expression(self, root, nodes, uses, reads):
+
+        results = []
+        pending = [(root, False)]
+
+        while pending:
+            node, visited = pending.pop()
+
+            if isinstance(node, BinOp):
+                if not visited:
+                    pending.append((node, True))
+                    pending.append((node.right, False))
+                    pending.append((node.left, False))
+                    continue
+                right = results.pop()
+                left = results.pop()
+                key = (NODE_BINOP, node.token.type, id(left), id(right))
+                interned = nodes.get(key)
+                if interned is None:
+                    if left is not node.left or right is not node.right:
+                        node = BinOp(left, node.op, right)
+                    interned = nodes[key] = node
+                    reads[id(node)] = reads[id(left)] | reads[id(right)]
+                    uses[id(node)] = 0
+                uses[id(interned)] += 1
+
+            elif isinstance(node, UnaryOp):
+                if not visited:
+                    pending.append((node, True))
+                    pending.append((node.expr, False))
+                    continue
+                expr = results.pop()
+                key = (NODE_UNARYOP, node.token.type, id(expr))
+                interned = nodes.get(key)
+                if interned is None:
+                    if expr is not node.expr:
+                        node = UnaryOp(node.op, expr)
+                    interned = nodes[key] = node
+                    reads[id(node)] = reads[id(expr)]
+                    uses[id(node)] = 0
+                uses[id(interned)] += 1
 
-    def _expression_prime(self, node):
+            else:
+                if isinstance(node, Id):
+                    key = (NODE_ID, node.value)
+                elif isinstance(node, Constant):
+                    # The repr tells a float apart from an equal integer.
+                    key = (NODE_CONSTANT, repr(node.value))
+                else:
+                    key = (NODE_NUM, node.value)
+                interned = nodes.get(key)
+                if interned is None:
+                    interned = nodes[key] = node
+                    reads[id(node)] = frozenset((node.value,)) if isinstance(node, Id) else frozenset()
+
+            results.append(interned)
+
+        return results.pop()
+
+
+# This is the Bytecode Compiler.
+# The job of the compiler is to lower a Parser generated Abstract Syntax Tree
+# (AST) into Bytecode for the Virtual Machine. Expressions are emitted in
+# post-order, left operand first, so operands are evaluated in the same order
+# as the tree walking interpreter evaluates them. The tree is walked with an
+# explicit stack, so arbitrarily deep trees compile without recursion.
+class Compiler(object):
+
+    _binary_instructions = {PLUS: (OP_ADD, None), MINUS: (OP_SUB, None), MUL: (OP_MUL, None), DIV: (OP_DIV, None)}
+    _negate_instruction = (OP_NEG, None)
 
-        token = self.current_token
+    def __init__(self):
+        self.bytecode = None
+        self.name_index = {}
+        self.constant_instructions = {}
+        self.load_instructions = {}
+
+    # Compiles every assignment of the given program, in order, and returns
+    # the resulting Bytecode.
+    def compile_program(self, program):
+
+        self._begin()
+        for assignment in program.assignments:
+            self._compile_statement(assignment)
+
+        return self._end()
+
+    # Compiles a single assignment into its own Bytecode.
+    def compile_statement(self, assignment):
+
+        self._begin()
+        self._compile_statement(assignment)
+
+        return self._end()
+
+    # Compiles a NodeTable. Its nodes are already in post-order, so each node
+    # maps to at most one instruction.
+    def compile_table(self, table):
+
+        self._begin()
+        bytecode = self.bytecode
+        emit = bytecode.code.append
+        bytecode.constants = list(table.constants)
+        bytecode.names = list(table.names)
+        binary_opcodes = (OP_ADD, OP_SUB, OP_MUL, OP_DIV)
+
+        for (kind, operator, first) in zip(table.kinds, table.operators, table.firsts):
+            if kind == NODE_NUM or kind == NODE_CONSTANT:
+                emit((OP_PUSH_CONST, first))
+            elif kind == NODE_ID:
+                emit((OP_LOAD, first))
+            elif kind == NODE_BINOP:
+                emit((binary_opcodes[operator], None))
+            elif kind == NODE_UNARYOP:
+                # Unary plus leaves any number unchanged, so it emits nothing.
+                if operator == OPERATOR_MINUS:
+                    emit(self._negate_instruction)
+            elif kind == NODE_ASSIGN:
+                emit((OP_STORE, first))
+
+        return self._end()
+
+    def _begin(self):
+        self.bytecode = Bytecode()
+        self.name_index = {}
+        self.constant_instructions = {}
+        self.load_instructions = {}
+
+    def _end(self):
+        bytecode = self.bytecode
+        self.bytecode = None
+        return bytecode
+
+    def _compile_statement(self, assignment):
+        self._compile_expression(assignment.right)
+        self.bytecode.code.append((OP_STORE, self._name(assignment.left.value)))
+
+    def _name(self, name):
+
+        index = self.name_index.get(name)
+        if index is None:
+            index = self.name_index[name] = len(self.bytecode.names)
+            self.bytecode.names.append(name)
+        return index
+
+    # Instructions are immutable, so the instruction that pushes a given
+    # literal, or loads a given variable, is created once and then shared.
+    # Literals have no leading zeros, so they are keyed by their lexeme, and
+    # the numbers of folded constants are keyed by their repr, which is the
+    # lexeme for an integer and tells a float apart from an equal integer.
+    def _constant_instruction(self, literal, value):
+
+        instruction = (OP_PUSH_CONST, len(self.bytecode.constants))
+        self.bytecode.constants.append(value)
+        self.constant_instructions[literal] = instruction
+        return instruction
+
+    def _load_instruction(self, name):
+
+        instruction = (OP_LOAD, self._name(name))
+        self.load_instructions[name] = instruction
+        return instruction
+
+    def _compile_expression(self, root):
+
+        emit = self.bytecode.code.append
+        constant_instructions = self.constant_instructions
+        load_instructions = self.load_instructions
+        binary_instructions = self._binary_instructions
+        pending = [root]
+        push = pending.append
+        pop = pending.pop
+
+        while pending:
+            node = pop()
+            node_type = type(node)
+
+            if node_type is BinOp:
+                push(binary_instructions[node.token.type])
+                push(node.right)
+                push(node.left)
+
+            elif node_type is Num:
+                instruction = constant_instructions.get(node.value)
+                emit(instruction or self._constant_instruction(node.value, int(node.value)))
+
+            elif node_type is Constant:
+                literal = repr(node.value)
+                instruction = constant_instructions.get(literal)
+                emit(instruction or self._constant_instruction(literal, node.value))
+
+            elif node_type is Id:
+                instruction = load_instructions.get(node.value)
+                emit(instruction or self._load_instruction(node.value))
+
+            elif node_type is UnaryOp:
+                # Unary plus leaves any number unchanged, so it emits nothing.
+                if node.token.type == MINUS:
+                    push(self._negate_instruction)
+                push(node.expr)
+
+            # An instruction that was deferred until its operands were emitted.
+            else:
+                emit(node)
 
-        if token.type == PLUS:
-            self._match(PLUS)
-            node = BinOp(left=node, op=token, right=self._term())
-            node = self._expression_prime(node)
 
-        elif token.type == MINUS:
-            self._match(MINUS)
-            node = BinOp(left=node, op=token, right=self._term())
-            node = self._expression_prime(node)
+# Arithmetic modes
+#
+# The arithmetic of the toy language divides with true division and truncates
+# values to integers when they are assigned, so that 7 / 2 * 2 is 7. The
+# default float arithmetic carries out divisions with floats, which lose
+# precision once operands exceed 2**53. The other modes are exact:
+#
+#   exact    the same results as float arithmetic, computed exactly: a
+#            division that has a remainder yields a Fraction instead of a
+#            float, so values of any size are exact.
+#   integer  integer arithmetic on Python integers: every division truncates
+#            towards zero at once, so 7 / 2 * 2 is 6. Values never overflow.
+#   int64    the integer arithmetic of 64 bit machine integers: division
+#            truncates towards zero and every result, constant and variable
+#            read wraps around modulo 2**64 into [-2**63, 2**63), so that
+#            (-2**63) / -1 is -2**63.
+#
+# In every mode a division by zero raises ZeroDivisionError.
+#
+# Python integers have no fixed width, so int64 arithmetic is not faster than
+# the others. Addition, subtraction, multiplication and negation give the same
+# results modulo 2**64 whether or not their operands have wrapped around, so
+# int64 arithmetic only wraps values where it matters: the operands and result
+# of a division, and every value assigned. Values within an expression may
+# exceed 64 bits, but every value that is divided or assigned is the one that
+# wrapping every result, constant and variable read would give.
+ARITHMETIC_FLOAT, ARITHMETIC_EXACT, ARITHMETIC_INTEGER, ARITHMETIC_INT64 = ('float', 'exact', 'integer', 'int64')
 
-        return node
+_INT64_OFFSET = 1 << 63
+_INT64_MASK = (1 << 64) - 1
 
 
-# This is the Toy Interpreter.
-# The job of the interpreter is to facilitate the communication between
-# an instantiated Lexer and Parser, manage a global Symbol Table, evaluate
-# a Parser generated Abstract Syntax Tree (AST), and report any detected
-# errors during the evaluation of an AST.
-class Interpreter(object):
+def _wrap_int64(value):
+    return ((value + _INT64_OFFSET) & _INT64_MASK) - _INT64_OFFSET
 
-    def __init__(self):
-        self.lexer = Lexer()
-        self.parser = Parser(self.lexer)
-        self.symbol_table = {}
 
-    # Resets this interpreter's state to its initial state.
-    def reset(self):
-        self.lexer.reset()
-        self.parser.reset()
-        self.symbol_table = {}
+def _exact_divide(left, right):
 
-    # Evaluates a given program by:
-    #   1. Generating a stream of tokens from the program -- Lexer's Job.
-    #   2. Generating a Abstract Syntax Tree (AST) from the stream of tokens -- Parser's Job.
-    #   3. Evaluating the AST provided by the parser -- Interpreter's Job.
-    #   4. Update the symbol table with the evaluated AST values.
-    # This method also returns a reference to the AST generated by the Parser.
-    def evaluate_input(self, input_string):
-        self.lexer.scanner_input(input_string)
-        self.parser.reset()
-        prog = self.parser.program()
-        self._evaluate_program(prog)
+    if type(left) is int and type(right) is int and right:
+        (quotient, remainder) = divmod(left, right)
+        if not remainder:
+            return quotient
+    import fractions
+    return fractions.Fraction(left) / right
 
-        return prog
 
-    def _error_undefined_variable(self, data):
-        raise InterpreterUninitializedVariableError(data)
+def _truncating_divide(left, right):
 
-    def _evaluate_program(self, root):
+    quotient = abs(left) // abs(right)
+    return quotient if (left < 0) == (right < 0) else -quotient
 
-        if isinstance(root, Program):
-            for assignment in root.assignments:
-                self._evaluate_program(assignment)
 
-        if isinstance(root, Assign):
-            variable_name = root.left.value
-            self.symbol_table[variable_name] = int(self._compute_AST(root.right))
+# Divides as _truncating_divide() does after wrapping the operands; only
+# (-2**63) / -1 then needs to wrap its result.
+def _int64_divide(left, right):
 
-    def _compute_AST(self, root):
+    left = ((left + _INT64_OFFSET) & _INT64_MASK) - _INT64_OFFSET
+    right = ((right + _INT64_OFFSET) & _INT64_MASK) - _INT64_OFFSET
+    quotient = abs(left) // abs(right)
+    if (left < 0) != (right < 0):
+        return -quotient
+    return quotient if quotient != _INT64_OFFSET else -quotient
 
-        if isinstance(root, Id):
-            variable_name = root.value
-            identifier_value = self.symbol_table.get(variable_name)
-            if identifier_value is None:
-                self._error_undefined_variable(repr(variable_name))
-            else:
-                return identifier_value
 
-        elif isinstance(root, Num):
-            return int(root.value)
+# An arithmetic mode: the functions the Virtual Machine applies for each
+# arithmetic instruction and for the conversion of a value to an integer on
+# assignment and, if any, the function that gives the value the mode gives to
+# any value within an expression, with which values are reported to hooks.
+class Arithmetic(object):
+    def __init__(self, name, add, sub, mul, div, neg, store, wrap=None):
+        self.name = name
+        self.binary = {OP_ADD: add, OP_SUB: sub, OP_MUL: mul, OP_DIV: div}
+        self.neg = neg
+        self.store = store
+        self.wrap = wrap
 
-        elif isinstance(root, BinOp):
+    def __str__(self):
+        return 'Arithmetic({name})'.format(name=self.name)
 
-            if root.token.type == PLUS:
-                return self._compute_AST(root.left) + self._compute_AST(root.right)
+    def __repr__(self):
+        return self.__str__()
 
-            elif root.token.type == MINUS:
-                return self._compute_AST(root.left) - self._compute_AST(root.right)
 
-            elif root.token.type == MUL:
-                return self._compute_AST(root.left) * self._compute_AST(root.right)
+ARITHMETICS = {
+    ARITHMETIC_FLOAT: Arithmetic(ARITHMETIC_FLOAT, operator.add, operator.sub, operator.mul, operator.truediv,
+                                 operator.neg, int),
+    ARITHMETIC_EXACT: Arithmetic(ARITHMETIC_EXACT, operator.add, operator.sub, operator.mul, _exact_divide,
+                                 operator.neg, int),
+    ARITHMETIC_INTEGER: Arithmetic(ARITHMETIC_INTEGER, operator.add, operator.sub, operator.mul, _truncating_divide,
+                                   operator.neg, int),
+    ARITHMETIC_INT64: Arithmetic(ARITHMETIC_INT64, operator.add, operator.sub, operator.mul, _int64_divide,
+                                 operator.neg, _wrap_int64, _wrap_int64),
+}
+
+
+# This is the stack based Virtual Machine.
+# The job of the virtual machine is to execute Bytecode generated by the
+# Compiler against a Symbol Table with a single dispatch loop. Its results
+# and errors are the same as those of the tree walking interpreter.
+class VirtualMachine(object):
+
+    def run(self, bytecode, symbol_table):
+
+        constants = bytecode.constants
+        names = bytecode.names
+        stack = []
+        push = stack.append
+        pop = stack.pop
+
+        for (opcode, arg) in bytecode.code:
+            if opcode == OP_PUSH_CONST:
+                push(constants[arg])
+
+            elif opcode == OP_LOAD:
+                identifier_value = symbol_table.get(names[arg])
+                if identifier_value is None:
+                    raise InterpreterUninitializedVariableError(repr(names[arg]))
+                push(identifier_value)
+
+            elif opcode == OP_ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+
+            elif opcode == OP_SUB:
+                right = pop()
+                stack[-1] = stack[-1] - right
+
+            elif opcode == OP_MUL:
+                right = pop()
+                stack[-1] = stack[-1] * right
+
+            # Supports Integer Division Only, truncated on assignment as in
+            # the tree walking interpreter.
+            elif opcode == OP_DIV:
+                right = pop()
+                stack[-1] = stack[-1] / right
+
+            elif opcode == OP_NEG:
+                stack[-1] = -stack[-1]
+
+            elif opcode == OP_STORE:
+                symbol_table[names[arg]] = int(pop())
+
+    # Executes Bytecode as run() does, but with the given Arithmetic.
+    def run_arithmetic(self, bytecode, symbol_table, arithmetic):
+
+        constants = bytecode.constants
+        names = bytecode.names
+        binary = arithmetic.binary
+        neg = arithmetic.neg
+        store = arithmetic.store
+        stack = []
+        push = stack.append
+        pop = stack.pop
+
+        for (opcode, arg) in bytecode.code:
+            if opcode == OP_PUSH_CONST:
+                push(constants[arg])
+
+            elif opcode == OP_LOAD:
+                identifier_value = symbol_table.get(names[arg])
+                if identifier_value is None:
+                    raise InterpreterUninitializedVariableError(repr(names[arg]))
+                push(identifier_value)
+
+            elif opcode == OP_STORE:
+                symbol_table[names[arg]] = store(pop())
+
+            elif opcode == OP_NEG:
+                stack[-1] = neg(stack[-1])
 
-            # Supports Integer Division Only: 2/3 returns 0 and 3/2 returns 1
-            elif root.token.type == DIV:
-                return self._compute_AST(root.left) / self._compute_AST(root.right)
+            else:
+                right = pop()
+                stack[-1] = binary[opcode](stack[-1], right)
 
-        elif isinstance(root, UnaryOp):
+    # Executes resolved Bytecode against a frame that holds the value of each
+    # of its slots. Every free variable must have been checked to be defined,
+    # so variables are read from the frame without any check.
+    def run_frame(self, bytecode, frame):
 
-            if root.token.type == PLUS:
-                return +self._compute_AST(root.expr)
+        constants = bytecode.constants
+        stack = []
+        push = stack.append
+        pop = stack.pop
 
-            elif root.token.type == MINUS:
-                return -self._compute_AST(root.expr)
+        for (opcode, arg) in bytecode.code:
+            if opcode == OP_PUSH_CONST:
+                push(constants[arg])
 
-    # Evaluation output is formatted to a single line.
-    def stringed_output(self):
+            elif opcode == OP_LOAD:
+                push(frame[arg])
 
-        output = ""
-        for (key, value) in self.symbol_table.items():
-            output += "{key} = {value}, ".format(key=key, value=value)
-        output = output[:-2]
-        return output
+            elif opcode == OP_ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
 
-    # Evaluation output is formatted to multi-line--one assignment per line.
-    def normal_output(self):
-        output = ""
-        for (key, value) in self.symbol_table.items():
-            output += "{key} = {value}\n".format(key=key, value=value)
-        output = output[:-1]
-        return output
+            elif opcode == OP_SUB:
+                right = pop()
+                stack[-1] = stack[-1] - right
 
-    # Shows the AST hierarchy by indenting nodes according ot their level in the tree.
-    def show_tree_heirarchy(self, root):
+            elif opcode == OP_MUL:
+                right = pop()
+                stack[-1] = stack[-1] * right
 
-        def show_tree(root, level):
+            elif opcode == OP_DIV:
+                right = pop()
+                stack[-1] = stack[-1] / right
 
-            padding = ""
-            if level > 0:
-                padding = " " * level * 4
-                # padding += "\u2514"
-                # padding += "\u2500\u2500"
-            print(padding + root.__str__())
+            elif opcode == OP_NEG:
+                stack[-1] = -stack[-1]
 
-            if isinstance(root, Program):
-                for assignment in root.assignments:
-                    show_tree(assignment, level + 1)
+            elif opcode == OP_STORE:
+                frame[arg] = int(pop())
 
-            if isinstance(root, BinOp):
-                show_tree(root.left, level + 1)
-                show_tree(root.right, level + 1)
 
-            if isinstance(root, Assign):
-                show_tree(root.left, level + 1)
-                show_tree(root.right, level + 1)
+# NumPy is only needed to evaluate programs in batches, so it is imported on
+# first use rather than being a dependency of the interpreter.
+def _import_numpy():
 
-            elif isinstance(root, UnaryOp):
-                show_tree(root.expr, level + 1)
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("batch evaluation requires NumPy")
+    return numpy
 
-        show_tree(root, 0)
 
-def test_driver():
-    program = "program"
-    expected = "expected"
-    programs = [
-        {program: "eval = 3;",  expected: "eval = 3"},
-        {program: "eval = 5 +7;",   expected: "eval = 12"},
-        {program: "eval = 7- 5;",   expected: "eval = 2"},
-        {program: "eval = 5+7;",    expected: "eval = 12"},
-        {program: "eval = 7-5;",    expected: "eval = 2"},
-        {program: "eval = 5 + 7;",      expected: "eval = 12"},
-        {program: "eval = 7 - 5;",      expected: "eval = 2"},
-        {program: "eval = 27+11;",      expected: "eval = 38"},
-        {program: "eval = 11+22;",      expected: "eval = 33"},
-        {program: "eval = 27+ 11;",     expected: "eval = 38"},
-        {program: "eval = 11 +22;",     expected: "eval = 33"},
-        {program: "eval = 27 + 11;",    expected: "eval = 38"},
-        {program: "eval = 11 + 22;",    expected: "eval = 33"},
-        {program: "eval = 22 + 1;",     expected: "eval = 23"},
-        {program: "eval = 1 + 22;",     expected: "eval = 23"},
-        {program: "eval = 1 + 2 + 3;",      expected: "eval = 6"},
-        {program: "eval = 11 + 2 + 30;",    expected: "eval = 43"},
-        {program: "eval = 11 + 2 + 30 + 4;",    expected: "eval = 47"},
-        {program: "eval = 11 - 2 + 30 - 4;",    expected: "eval = 35"},
-        {program: "eval = 11-2+30-4;",          expected: "eval = 35"},
-        {program: "eval = 7 * 4 / 2;",          expected: "eval = 14"},
-        {program: "eval = 7 * 4 / 2 * 3;",      expected: "eval = 42"},
-        {program: "eval = 10 * 4  * 2 * 3 / 8;",    expected: "eval = 30"},
-        {program: "eval = 14 + 2 * 3 - 6 / 2;",     expected: "eval = 17"},
-        {program: "eval = 2 + 7 * 4;",              expected: "eval = 30"},
-        {program: "eval = 7 - 8 / 4;",              expected: "eval = 5"},
-        {program: "eval = (14 + 2) * (9 - 3) / 3;", expected: "eval = 32"},
-        {program: "eval = (2 + 7) * 4;",            expected: "eval = 36"},
-        {program: "eval = (1 - 9) / 4;",            expected: "eval = -2"},
-        {program: "eval = 7 + 3 * (10 / (12 / (3 + 1) - 1));",  expected: "eval = 22"},
-        {program: "eval = 7 + (((3 + 2)));",                    expected: "eval = 12"},
-        {program: "eval = 7 + 3 * (10 / (12 / (3 + 1) - 1)) / (2 + 3) - 5 - 3 + (8);", expected: "eval = 10"},
-        {program: "eval = - 3;",    expected: "eval = -3"},
-        {program: "eval = + 3;",    expected: "eval = 3"},
-        {program: "eval = - - - 5 + - 3;",              expected: "eval = -8"},
-        {program: "eval = - - - - 5 + - 3;",            expected: "eval = 2"},
-        {program: "eval = 5 - - - + - 3;",              expected: "eval = 8"},
-        {program: "eval = 5 - - - + - (3 + 4) - +2;",   expected: "eval = 10"},
-        {program: "rate = 4 + 5; kite = 5; flight = rate + kite;",  expected: "rate = 9, kite = 5, flight = 14"},
-        {program: "x = 1; y = 2; z = ---(x+y)*(x+-y);", expected: "x = 1, y = 2, z = 3"},
-        {program: "x = 0 y = x; z = ---(x+y);",     expected: "syntax error"},
-        {program: "x = 0; y = x; z = ---(x+y));",   expected: "syntax error"},
-        {program: "x_2 = 0;",       expected: "x_2 = 0"},
-        {program: "x = 001;",       expected: "syntax error"},
-        {program: "_2 = 0;",        expected: "syntax error"},
-        {program: "0x = 11;",       expected: "syntax error"},
-        {program: "3 = 11;",        expected: "syntax error"},
-        {program: "_ = 11;",        expected: "syntax error"},
-        {program: "x123a = 21;",    expected: "x123a = 21"},
-        {program: "x = y;",         expected: "uninitialized variable error: 'y' is undefined."},
-        {program: "x = x;",         expected: "uninitialized variable error: 'x' is undefined."},
-        {program: "x = y;",         expected: "uninitialized variable error: 'y' is undefined."},
-        {program: "x = 56; y = x + z;",             expected: "uninitialized variable error: 'z' is undefined."},
-        {program: "x = 56; y = t + v;",             expected: "uninitialized variable error: 't' is undefined."},
-        {program: "x = 56; y = (x + (z));",         expected: "uninitialized variable error: 'z' is undefined."},
-        {program: "rate = 4; time = rate + speed;", expected: "uninitialized variable error: 'speed' is undefined."},
-        {program: "\n rate = 4 + 5; \n kite = 5; \n flight = rate + kite; \n", expected: "rate = 9, kite = 5, flight = 14"},
-    ]
+# The result of a batch evaluation: the columns of the Symbol Table, i.e. the
+# input columns together with one column per assigned variable, and a boolean
+# mask of the rows whose evaluation failed. The values of a failed row are
+# unspecified.
+class BatchResult(object):
+    def __init__(self, columns, errors):
+        self.columns = columns
+        self.errors = errors
 
-    failed_tests = 0
-    passed_tests = 0
-    print(BCOLORS.OKBLUE, "\n:: BEGIN TESTS ::\n", BCOLORS.ENDC)
+    def __str__(self):
+        return 'BatchResult(rows={rows}, errors={errors})'.format(
+            rows=len(self.errors), errors=int(self.errors.sum()))
 
-    interpreter = Interpreter()
-    for program_pkg in programs:
+    def __repr__(self):
+        return self.__str__()
 
-        interpreter.reset()
 
-        output = ""
-        prog = None
+# This is the Vector Machine.
+# The job of the vector machine is to execute Bytecode against columns of
+# values rather than single values, i.e. a Symbol Table that maps variable
+# names to NumPy arrays, so that one program is evaluated for every row of
+# its input columns at once. Each instruction applies to a whole column:
+#
+#   dtype 'int64':  machine integers. Fast, but, as in NumPy, values wrap
+#                   around on overflow and divisions of operands beyond 2**53
+#                   may round differently than Python's exact true division.
+#   dtype object:   Python integers, evaluated exactly as the interpreter does.
+#
+# A division is true division and assignments truncate, as in the interpreter.
+# A row that divides by zero, or whose value cannot be converted to an
+# integer on assignment (an infinite or nan float, or, for 'int64', a value
+# outside its range), is flagged in the error mask instead of aborting the
+# batch. An undefined variable is an error of the program rather than of a
+# row, so it raises InterpreterUninitializedVariableError, and so does a
+# literal that the dtype cannot hold, which raises ValueError.
+class VectorMachine(object):
+
+    def run(self, bytecode, columns, dtype='int64'):
+
+        numpy = _import_numpy()
+        dtype = numpy.dtype(dtype)
+        symbol_table = collections.OrderedDict(
+            (variable_name, numpy.asarray(column, dtype=dtype)) for (variable_name, column) in columns.items())
+        rows = None
+        for (variable_name, column) in symbol_table.items():
+            if column.ndim > 1:
+                raise ValueError("column {0} is not one-dimensional".format(repr(variable_name)))
+            if column.ndim == 1 and rows is not None and len(column) != rows:
+                raise ValueError("column {0} has {1} rows, expected {2}".format(repr(variable_name), len(column), rows))
+            if column.ndim == 1:
+                rows = len(column)
+        if rows is None:
+            rows = 1
+        for (variable_name, column) in symbol_table.items():
+            symbol_table[variable_name] = numpy.broadcast_to(column, (rows,))
+
+        errors = numpy.zeros(rows, dtype=bool)
+        constants = self._constants(numpy, bytecode.constants, dtype)
+        names = bytecode.names
+        stack = []
+        push = stack.append
+        pop = stack.pop
+
+        with numpy.errstate(all='ignore'):
+            for (opcode, arg) in bytecode.code:
+                if opcode == OP_PUSH_CONST:
+                    push(constants[arg])
+
+                elif opcode == OP_LOAD:
+                    identifier_value = symbol_table.get(names[arg])
+                    if identifier_value is None:
+                        raise InterpreterUninitializedVariableError(repr(names[arg]))
+                    push(identifier_value)
+
+                elif opcode == OP_NEG:
+                    stack[-1] = self._apply(numpy, operator.neg, errors, stack[-1])
+
+                elif opcode == OP_STORE:
+                    symbol_table[names[arg]] = self._truncate(numpy, pop(), rows, dtype, errors)
+
+                else:
+                    right = pop()
+                    if opcode == OP_DIV:
+                        zero = numpy.equal(right, 0)
+                        if numpy.any(zero):
+                            errors |= zero
+                            right = numpy.where(zero, 1, right)
+                    stack[-1] = self._apply(numpy, self._binary_operators[opcode], errors, stack[-1], right)
+
+        return BatchResult(symbol_table, errors)
+
+    _binary_operators = {OP_ADD: operator.add, OP_SUB: operator.sub, OP_MUL: operator.mul, OP_DIV: operator.truediv}
+
+    # Converts the constants of a program to the dtype. A literal that the
+    # dtype cannot hold is an error of the program rather than of a row.
+    def _constants(self, numpy, constants, dtype):
+
+        if dtype == object:
+            return list(constants)
+
+        converted = []
+        for constant in constants:
+            if isinstance(constant, float):
+                converted.append(numpy.float64(constant))
+                continue
+            try:
+                converted.append(dtype.type(constant))
+            except OverflowError:
+                raise ValueError("literal {0} does not fit in dtype {1}".format(constant, dtype))
+        return converted
 
-        try:
-            prog = interpreter.evaluate_input(program_pkg[program])
-            output = interpreter.stringed_output()
-        except InterpreterSyntaxError:
-            output = "syntax error"
-        except InterpreterUninitializedVariableError as err:
-            output = "uninitialized variable error: {0}".format(err)
-        except:
-            output = "unknown error"
+    # Applies an operator to whole columns. Should it raise for some row, as
+    # Python integers may, it is applied again row by row and the rows that
+    # raise are flagged.
+    def _apply(self, numpy, function, errors, *operands):
 
-        if str(output) != str(program_pkg[expected]):
-            print(BCOLORS.FAIL, "Test: <Failed> Input:", program_pkg[program],
-                  "\n\t:: Expected:", program_pkg[expected], "\n\t::   Actual:", output, BCOLORS.ENDC)
-            failed_tests += 1
-            print(interpreter.lexer.tokens)
-            interpreter.show_tree_heirarchy(prog)
-        else:
-            print(BCOLORS.OKGREEN, "Test: <Passed> Input:", program_pkg[program], ":: Output:", output, BCOLORS.ENDC)
-            passed_tests += 1
+        try:
+            return function(*operands)
+        except ArithmeticError:
+            pass
 
-    print(BCOLORS.HEADER, "\n\tSTATISTICS: Failed = "+str(failed_tests)+", Passed = "+str(passed_tests), BCOLORS.ENDC)
-    print(BCOLORS.OKBLUE, "\n:: END TESTS ::", BCOLORS.ENDC)
+        operands = [numpy.broadcast_to(operand, errors.shape) for operand in operands]
+        result = numpy.zeros(errors.shape, dtype=object)
+        for row in range(len(result)):
+            try:
+                result[row] = function(*[operand[row] for operand in operands])
+            except ArithmeticError:
+                errors[row] = True
+        return result
+
+    # Converts a column to integers on assignment, as int() does for a value.
+    def _truncate(self, numpy, value, rows, dtype, errors):
+
+        value = numpy.broadcast_to(value, (rows,))
+
+        if dtype == object:
+            result = numpy.zeros(rows, dtype=object)
+            for row in range(rows):
+                try:
+                    result[row] = int(value[row])
+                except (ArithmeticError, ValueError):
+                    errors[row] = True
+            return result
+
+        if value.dtype.kind == 'f':
+            valid = numpy.isfinite(value) & (numpy.abs(value) < 2.0 ** 63)
+            errors |= ~valid
+            value = numpy.trunc(numpy.where(valid, value, 0))
+        return value.astype(dtype)
+
+
+# Reads a variable from a Symbol Table on behalf of a compiled program,
+# reporting it the same way the interpreter does when it is undefined.
+def _read_variable(symbol_table, variable_name):
+
+    identifier_value = symbol_table.get(variable_name)
+    if identifier_value is None:
+        raise InterpreterUninitializedVariableError(repr(variable_name))
+    return identifier_value
+
+
+# This is the Python Compiler.
+# The job of the Python compiler is to translate a Parser generated Abstract
+# Syntax Tree (AST) into the source of a Python function, and to compile it
+# with compile(), so that a program can be run repeatedly at the speed of
+# native Python code. The function takes a Symbol Table, or None for an empty
+# one, evaluates the program against it, and returns it updated.
+#
+# Every variable is held in a Python local: a variable assigned by the
+# program is stored both in its local and in the Symbol Table, so the Symbol
+# Table is updated statement by statement as in the interpreter, and a
+# variable that is only read is read from the Symbol Table, and checked, once.
+# Expressions are nested Python expressions with the same operators, so they
+# are evaluated in the same order and with the same semantics as in the
+# interpreter. An expression that nests deeper than MAX_DEPTH, which Python's
+# own compiler could not handle, is split into temporaries; so is every
+# expression that is pending when a variable is first read, so that the read,
+# and any error it raises, still happen in evaluation order.
+class PythonCompiler(object):
+
+    MAX_DEPTH = 50
+
+    _binary_operators = {PLUS: '+', MINUS: '-', MUL: '*', DIV: '/'}
 
+    def __init__(self):
+        self.lines = []
+        self.namespace = {}
+        self.variables = set()
+        self.assigned = set()
+        self.temporaries = 0
+
+    # Compiles the given Program and returns the resulting Python function.
+    # The generated source is available as the function's 'source' attribute.
+    def compile_program(self, program):
+
+        self.lines = ["def program(symbol_table=None):",
+                      "    if symbol_table is None:",
+                      "        symbol_table = {}"]
+        self.namespace = {'_read_variable': _read_variable, 'int': int}
+        self.variables = set()
+        self.assigned = set()
+        self.temporaries = 0
+
+        for assignment in program.assignments:
+            code, integral = self._compile_expression(assignment.right)
+            if not integral:
+                code = "int({code})".format(code=code)
+            variable_name = assignment.left.value
+            self.lines.append("    v_{name} = symbol_table[{key}] = {code}".format(
+                name=variable_name, key=repr(variable_name), code=code))
+            self.variables.add(variable_name)
+            self.assigned.add(variable_name)
+        self.lines.append("    return symbol_table")
+
+        source = "\n".join(self.lines) + "\n"
+        exec(compile(source, "<toy program>", "exec"), self.namespace)
+        function = self.namespace['program']
+        function.source = source
+
+        self.lines = []
+        self.namespace = {}
+        return function
+
+    # Returns the Python expression of the given expression, together with
+    # whether it is known to evaluate to an integer, i.e. it only involves
+    # literals and variables assigned by the program, which are integers, and
+    # no division. The tree is walked in post-order with an explicit stack;
+    # each result is a [code, depth, integral, pure] entry, where a pure entry
+    # is one whose evaluation can neither fail nor be reordered.
+    def _compile_expression(self, root):
+
+        results = []
+        pending = [(root, False)]
+
+        while pending:
+            node, visited = pending.pop()
+
+            if isinstance(node, BinOp):
+                if visited:
+                    right = results.pop()
+                    left = results.pop()
+                    op_type = node.token.type
+                    code = "({left} {op} {right})".format(left=left[0], op=self._binary_operators[op_type], right=right[0])
+                    integral = left[2] and right[2] and op_type != DIV
+                    self._push(results, [code, max(left[1], right[1]) + 1, integral, False])
+                else:
+                    pending.append((node, True))
+                    pending.append((node.right, False))
+                    pending.append((node.left, False))
+
+            elif isinstance(node, UnaryOp):
+                if visited:
+                    expr = results.pop()
+                    op = '-' if node.token.type == MINUS else '+'
+                    code = "({op}{expr})".format(op=op, expr=expr[0])
+                    self._push(results, [code, expr[1] + 1, expr[2], False])
+                else:
+                    pending.append((node, True))
+                    pending.append((node.expr, False))
+
+            elif isinstance(node, Constant):
+                name = "c{index}".format(index=len(self.namespace))
+                self.namespace[name] = node.value
+                results.append([name, 0, type(node.value) is int, True])
+
+            elif isinstance(node, Num):
+                results.append([node.value, 0, True, True])
+
+            elif isinstance(node, Id):
+                variable_name = node.value
+                if variable_name not in self.variables:
+                    self._spill(results)
+                    self.lines.append("    v_{name} = _read_variable(symbol_table, {key})".format(
+                        name=variable_name, key=repr(variable_name)))
+                    self.variables.add(variable_name)
+                results.append(["v_" + variable_name, 0, variable_name in self.assigned, True])
+
+        return results[0][0], results[0][2]
+
+    def _push(self, results, entry):
+
+        results.append(entry)
+        if entry[1] > self.MAX_DEPTH:
+            self._spill(results)
+
+    # Moves every impure entry into a temporary, in evaluation order.
+    def _spill(self, results):
+
+        for entry in results:
+            if not entry[3]:
+                name = "t{index}".format(index=self.temporaries)
+                self.temporaries += 1
+                self.lines.append("    {name} = {code}".format(name=name, code=entry[0]))
+                entry[0], entry[1], entry[3] = name, 0, True
+
+
+# Evaluation engines
+#
+# The tree walking interpreter evaluates the AST directly, while the virtual
+# machine first compiles the AST to Bytecode and then executes the Bytecode.
+# The slots engine executes the Bytecode too, but with its variables resolved
+# to the slots of a frame, see Interpreter._run_slots().
+ENGINE_TREE, ENGINE_VM, ENGINE_SLOTS = ('tree', 'vm', 'slots')
+ENGINES = (ENGINE_TREE, ENGINE_VM, ENGINE_SLOTS)
+
+# The events of an Interpreter's hooks; see Interpreter.register_hook().
+EVENT_STATEMENT_START, EVENT_STATEMENT_END, EVENT_NODE, EVENT_READ, EVENT_WRITE = (
+    'statement_start', 'statement_end', 'node', 'read', 'write')
+EVENTS = (EVENT_STATEMENT_START, EVENT_STATEMENT_END, EVENT_NODE, EVENT_READ, EVENT_WRITE)
+
+# The number of events a TraceRecorder keeps by default.
+TRACE_CAPACITY = 4096
+
+# The number of characters read at a time when a program file is streamed.
+CHUNK_SIZE = 64 * 1024
+
+
+# The approximate number of bytes that a parsed program keeps in memory per
+# token of its source, i.e. its AST nodes, the tokens they refer to and its
+# compiled forms, which is used to account for the size of cached programs.
+CACHE_BYTES_PER_TOKEN = 128
+
+# The largest number of programs that evaluate_programs() sends to a worker
+# process at a time.
+BATCH_CHUNK_SIZE = 256
+
+# The number of variables that the output writers format and write at a time.
+OUTPUT_BATCH_SIZE = 4096
+
+# Snapshots of a Symbol Table begin with SNAPSHOT_MAGIC and a format version.
+SNAPSHOT_MAGIC = b'TOYSNAP\0'
+SNAPSHOT_VERSION = 1
+
+# Programs saved by the ProgramCache begin with PROGRAM_MAGIC and a format
+# version, which must change whenever the format or the NodeTable does.
+PROGRAM_MAGIC = b'TOYPROG\0'
+PROGRAM_VERSION = 1
+
+
+# This is the Parse Cache.
+# The job of the parse cache is to keep the most recently used parsed, and
+# possibly optimized or compiled, programs keyed by their source text and by
+# the options they were prepared with, so that a program that is submitted
+# again is not scanned and parsed again. The cache is bounded both by a
+# number of entries and by an approximate number of bytes, and the least
+# recently used entries are evicted first. A cache may be shared by several
+# interpreters, even in different threads: every access holds its lock.
+#
+# Cached programs are shared between evaluations and must never be modified;
+# evaluation never modifies an AST, and a Program is cached as a copy whose
+# statements are frozen into a tuple, so that the Program that was given to
+# put() stays as it was while no statement can be added to the cached one.
+# Programs that are taken from the cache are therefore read-only.
+class ParseCache(object):
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        import threading
+
+        self.lock = threading.Lock()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __str__(self):
+        return 'ParseCache(entries={entries}, bytes={nbytes}, hits={hits}, misses={misses}, evictions={evictions})'.format(
+            entries=len(self.entries), nbytes=self.nbytes, hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Returns the value cached for the given key, or None.
+    def get(self, key):
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    # Caches a value of approximately size bytes for the given key, evicting
+    # the least recently used entries as needed. A value that is larger than
+    # the whole cache is not cached.
+    def put(self, key, value, size):
+
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+
+        value = tuple(map(self._frozen, value))
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous[1]
+
+            self.entries[key] = (value, size)
+            self.nbytes += size
+
+            while len(self.entries) > self.max_entries or self.nbytes > self.max_bytes:
+                (_, (_, evicted_size)) = self.entries.popitem(last=False)
+                self.nbytes -= evicted_size
+                self.evictions += 1
+
+    @staticmethod
+    def _frozen(item):
+
+        if isinstance(item, Program):
+            frozen = Program()
+            frozen.assignments = tuple(item.assignments)
+            return frozen
+        return item
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+
+# This is the Program Cache.
+# The job of the program cache is to save the programs of files, once they
+# are scanned and parsed, to disk, like the .pyc files of Python, so that
+# later runs load them instead of scanning and parsing the files again. A
+# program is saved as a NodeTable, which evaluate_file() runs on any engine,
+# in a file next to its source in a __toycache__ directory or, if a
+# directory is given, in that directory:
+#
+#   interpreter = Interpreter(program_cache=ProgramCache())
+#   interpreter.evaluate_file('model.toy')   # saves __toycache__/model.toy.toyc
+#   interpreter.evaluate_file('model.toy')   # loads it
+#
+# A saved program records the SHA-256 hash of its source and the format
+# version PROGRAM_VERSION, so it is replaced as soon as the source changes,
+# or the format does. Saved programs are written to a temporary file that
+# is then renamed, so concurrent runs never see a partial file, and a cache
+# that can not be read or written is simply bypassed.
+class ProgramCache(object):
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return 'ProgramCache({value})'.format(value=repr(self.directory))
+
+    def __repr__(self):
+        return self.__str__()
+
+    # Returns the path of the saved program of a source file.
+    def cache_path(self, path, optimize=False):
+
+        import hashlib
+
+        path = os.path.abspath(path)
+        name = os.path.basename(path) + ('.opt' if optimize else '') + '.toyc'
+        if self.directory is None:
+            return os.path.join(os.path.dirname(path), '__toycache__', name)
+        # Files of the same name in different directories are kept apart.
+        prefix = hashlib.sha256(os.fsencode(path)).hexdigest()[:16]
+        return os.path.join(self.directory, prefix + '-' + name)
+
+    # Returns the NodeTable of the program of a source file, loaded from the
+    # cache if it is there and current, or else built from the source by the
+    # given function, which takes the source as bytes, and saved.
+    def load(self, path, optimize, build):
+        import hashlib
+
+        with open(path, 'rb') as file:
+            source = file.read()
+        digest = hashlib.sha256(source).digest()
+        cache_path = self.cache_path(path, optimize)
+
+        try:
+            with open(cache_path, 'rb') as file:
+                table = self._read(file.read(), digest, optimize)
+        except (EnvironmentError, ValueError, struct.error):
+            table = None
+        if table is not None:
+            self.hits += 1
+            return table
+
+        self.misses += 1
+        table = build(source)
+        self._save(cache_path, self._write(table, digest, optimize))
+        return table
+
+    def _save(self, cache_path, data):
+        import tempfile
+
+        directory = os.path.dirname(cache_path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            (descriptor, temporary_path) = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(descriptor, 'wb') as file:
+                    file.write(data)
+                os.replace(temporary_path, cache_path)
+            except:
+                os.unlink(temporary_path)
+                raise
+        except EnvironmentError:
+            pass
+
+    # The format of a saved program: PROGRAM_MAGIC, PROGRAM_VERSION, whether
+    # it is optimized, the hash of its source, and the arrays, names and
+    # constants of its NodeTable. Numbers are little endian; integer
+    # constants are stored at their own size and float constants as doubles.
+    def _write(self, table, digest, optimize):
+
+        data = bytearray(PROGRAM_MAGIC)
+        data.append(PROGRAM_VERSION)
+        data.append(1 if optimize else 0)
+        data += digest
+
+        _write_varint(data, len(table.kinds))
+        data += table.kinds.tobytes()
+        data += table.operators.tobytes()
+        for buffer in (table.firsts, table.seconds, table.statements):
+            if buffer is table.statements:
+                _write_varint(data, len(buffer))
+            if sys.byteorder != 'little':
+                buffer = array.array(buffer.typecode, buffer)
+                buffer.byteswap()
+            data += buffer.tobytes()
+
+        name_table = b'\0'.join(name.encode('ascii') for name in table.names)
+        _write_varint(data, len(table.names))
+        _write_varint(data, len(name_table))
+        data += name_table
+
+        _write_varint(data, len(table.constants))
+        for value in table.constants:
+            if type(value) is float:
+                data.append(1)
+                data += struct.pack('<d', value)
+            else:
+                size = (value.bit_length() + 8) // 8
+                data.append(0)
+                _write_varint(data, size)
+                data += value.to_bytes(size, 'little', signed=True)
+
+        return bytes(data)
+
+    # Reads a saved program, or returns None if it is not current.
+    def _read(self, data, digest, optimize):
+
+        pos = len(PROGRAM_MAGIC)
+        if data[:pos] != PROGRAM_MAGIC or data[pos:pos + 2] != bytes((PROGRAM_VERSION, 1 if optimize else 0)):
+            return None
+        pos += 2
+        if data[pos:pos + len(digest)] != digest:
+            return None
+        pos += len(digest)
+
+        table = NodeTable()
+        (count, pos) = _read_varint(data, pos)
+        table.kinds.frombytes(data[pos:pos + count])
+        pos += count
+        table.operators.frombytes(data[pos:pos + count])
+        pos += count
+        for buffer in (table.firsts, table.seconds, table.statements):
+            if buffer is table.statements:
+                (count, pos) = _read_varint(data, pos)
+            size = count * buffer.itemsize
+            buffer.frombytes(data[pos:pos + size])
+            pos += size
+            if sys.byteorder != 'little':
+                buffer.byteswap()
+
+        (count, pos) = _read_varint(data, pos)
+        (size, pos) = _read_varint(data, pos)
+        names = data[pos:pos + size].decode('ascii').split('\0') if count else []
+        table.names = list(map(sys.intern, names))
+        pos += size
+
+        (count, pos) = _read_varint(data, pos)
+        for _ in range(count):
+            tag = data[pos:pos + 1]
+            pos += 1
+            if tag == b'\1':
+                table.constants.append(struct.unpack_from('<d', data, pos)[0])
+                pos += 8
+            else:
+                (size, pos) = _read_varint(data, pos)
+                table.constants.append(int.from_bytes(data[pos:pos + size], 'little', signed=True))
+                pos += size
+
+        nodes = len(table.kinds)
+        if pos != len(data) or not len(table.operators) == len(table.firsts) == len(table.seconds) == nodes:
+            raise ValueError("corrupt saved program")
+
+        return table
+
+
+# This is the Dependency Graph.
+# The job of the dependency graph is to keep a program as a model of
+# definitions, like the cells of a spreadsheet, and to recompute only what a
+# change to a definition affects. Every definition is a statement of the
+# model; for every statement the graph records the variables its Id nodes
+# read and which earlier statement defines the value read, or -1 for a value
+# taken from the base Symbol Table, i.e. the Symbol Table as it was before the
+# first definition. The values of the statements, and so the Symbol Table,
+# are always those that a full, in order, evaluation of the model's
+# statements on top of the base Symbol Table would produce.
+#
+# When definitions are redefined, only the redefined statements and the
+# statements that transitively read their values are recomputed, in program
+# order, which is a topological order of the graph, and the propagation stops
+# at every statement whose value does not change. Redefinitions are
+# transactional: if any recomputed statement raises, the model and the
+# Symbol Table are left as they were.
+class DependencyGraph(object):
+
+    def __init__(self, compiler, virtual_machine):
+        self.compiler = compiler
+        self.virtual_machine = virtual_machine
+        self.base = None
+        self.targets = []
+        self.bytecodes = []
+        self.sources = []
+        self.dependents = []
+        self.values = []
+        self.definitions = {}
+
+    def __str__(self):
+        return 'DependencyGraph({value})'.format(value=repr(len(self.targets)))
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self.targets)
+
+    # Applies the given assignments to the model and updates the Symbol Table.
+    # The n-th assignment to a variable in the given assignments redefines the
+    # n-th definition of that variable in the model, so a whole program that is
+    # submitted again only changes the statements that differ; assignments
+    # beyond the definitions the model has are appended to it. Returns the
+    # names of the variables of the recomputed statements, in program order.
+    def define(self, assignments, symbol_table):
+
+        if self.base is None:
+            self.base = dict(symbol_table)
+
+        occurrences = {}
+        undo = []
+        dirty = []
+
+        try:
+            for assignment in assignments:
+                variable_name = assignment.left.value
+                occurrence = occurrences.get(variable_name, 0)
+                occurrences[variable_name] = occurrence + 1
+                bytecode = self.compiler.compile_statement(assignment)
+                indices = self.definitions.setdefault(variable_name, [])
+
+                if occurrence < len(indices):
+                    index = indices[occurrence]
+                    previous = self.bytecodes[index]
+                    if (previous.code, previous.constants, previous.names) == \
+                            (bytecode.code, bytecode.constants, bytecode.names):
+                        continue
+                    undo.append((index, previous))
+                    self._unlink(index)
+                    self.bytecodes[index] = bytecode
+                else:
+                    index = len(self.targets)
+                    undo.append((index, None))
+                    self.targets.append(variable_name)
+                    self.bytecodes.append(bytecode)
+                    self.sources.append(())
+                    self.dependents.append(set())
+                    self.values.append(None)
+                    indices.append(index)
+
+                self._link(index)
+                heapq.heappush(dirty, index)
+
+            recomputed = self._recompute(dirty)
+
+        except:
+            self._rollback(undo)
+            raise
+
+        # A new variable is added to the Symbol Table by its first definition,
+        # so that the Symbol Table keeps the order of a full evaluation.
+        for (index, value) in sorted(recomputed.items()):
+            self.values[index] = value
+            variable_name = self.targets[index]
+            if self.definitions[variable_name][-1] == index or variable_name not in symbol_table:
+                symbol_table[variable_name] = value
+
+        return [self.targets[index] for index in sorted(recomputed)]
+
+    # Recomputes the given statements and, transitively, the statements that
+    # read a value that changed. Returns the new values by statement.
+    def _recompute(self, dirty):
+
+        recomputed = {}
+        while dirty:
+            index = heapq.heappop(dirty)
+            if index in recomputed:
+                continue
+
+            environment = {}
+            for (variable_name, source) in self.sources[index]:
+                if source < 0:
+                    identifier_value = self.base.get(variable_name)
+                else:
+                    identifier_value = recomputed.get(source, self.values[source])
+                if identifier_value is not None:
+                    environment[variable_name] = identifier_value
+
+            self.virtual_machine.run(self.bytecodes[index], environment)
+            value = recomputed[index] = environment[self.targets[index]]
+
+            if value != self.values[index] or self.values[index] is None:
+                for dependent in self.dependents[index]:
+                    heapq.heappush(dirty, dependent)
+
+        return recomputed
+
+    # Records the variables that a statement reads and, for each of them, the
+    # last statement before it that defines the variable.
+    def _link(self, index):
+
+        bytecode = self.bytecodes[index]
+        sources = []
+        seen = set()
+        for (opcode, arg) in bytecode.code:
+            if opcode == OP_LOAD and arg not in seen:
+                seen.add(arg)
+                variable_name = bytecode.names[arg]
+                indices = self.definitions.get(variable_name, ())
+                position = bisect.bisect_left(indices, index)
+                source = indices[position - 1] if position > 0 else -1
+                sources.append((variable_name, source))
+                if source >= 0:
+                    self.dependents[source].add(index)
+        self.sources[index] = tuple(sources)
+
+    def _unlink(self, index):
+
+        for (_, source) in self.sources[index]:
+            if source >= 0:
+                self.dependents[source].discard(index)
+        self.sources[index] = ()
+
+    def _rollback(self, undo):
+
+        for (index, previous) in reversed(undo):
+            self._unlink(index)
+            if previous is None:
+                variable_name = self.targets.pop()
+                self.definitions[variable_name].pop()
+                if not self.definitions[variable_name]:
+                    del self.definitions[variable_name]
+                self.bytecodes.pop()
+                self.sources.pop()
+                self.dependents.pop()
+                self.values.pop()
+            else:
+                self.bytecodes[index] = previous
+                self._link(index)
+
+
+# The kinds of dependency between two statements of a StatementDAG: a read
+# after write, i.e. a statement that reads a value an earlier statement
+# assigned, a write after write of the same variable, and a write after read,
+# i.e. a statement that assigns a variable an earlier statement read.
+HAZARD_RAW, HAZARD_WAW, HAZARD_WAR = ('RAW', 'WAW', 'WAR')
+
+
+# This is the Statement DAG.
+# The job of the statement DAG is to evaluate the statements of a program in
+# parallel. It records, for every statement, the variables it reads and the
+# earlier statement that assigns each value read, or -1 for a value taken
+# from the Symbol Table, and the hazards between its statements as edges
+# (earlier, later, kind).
+#
+# Every statement assigns its value to a slot of its own rather than to the
+# Symbol Table, which renames the variables the way a processor renames its
+# registers: a statement is sent the values it reads when it becomes ready,
+# so write after write and write after read hazards can not change what it
+# computes and only read after write edges hold it back. Statements run as
+# soon as the statements they read from are done, on an Executor, and their
+# values are applied to the Symbol Table in program order afterwards, which
+# resolves every write after write.
+#
+# Should statements fail, the first of them in program order is the error of
+# the program: only the statements before it are applied, so the Symbol Table
+# is the same as after a sequential evaluation, and the error is raised.
+class StatementDAG(object):
+
+    def __init__(self, compiler, assignments):
+        self.targets = []
+        self.bytecodes = []
+        self.sources = []
+        self.successors = []
+        self.edges = []
+
+        last_writers = {}
+        readers = {}
+        for (index, assignment) in enumerate(assignments):
+            variable_name = assignment.left.value
+            bytecode = compiler.compile_statement(assignment)
+
+            sources = []
+            seen = set()
+            for (opcode, arg) in bytecode.code:
+                if opcode == OP_LOAD and arg not in seen:
+                    seen.add(arg)
+                    name = bytecode.names[arg]
+                    source = last_writers.get(name, -1)
+                    sources.append((name, source))
+                    if source >= 0:
+                        self.successors[source].append(index)
+                        self.edges.append((source, index, HAZARD_RAW))
+
+            writer = last_writers.get(variable_name)
+            if writer is not None:
+                self.edges.append((writer, index, HAZARD_WAW))
+            for reader in readers.pop(variable_name, ()):
+                self.edges.append((reader, index, HAZARD_WAR))
+            for (name, _) in sources:
+                if name != variable_name:
+                    readers.setdefault(name, []).append(index)
+            last_writers[variable_name] = index
+
+            self.targets.append(variable_name)
+            self.bytecodes.append(bytecode)
+            self.sources.append(tuple(sources))
+            self.successors.append([])
+
+    def __str__(self):
+        return 'StatementDAG({value})'.format(value=repr(len(self.targets)))
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self.targets)
+
+    # Evaluates the statements on an Executor and updates the Symbol Table.
+    def run(self, executor, symbol_table):
+        import concurrent.futures
+
+        values = [None] * len(self.targets)
+        waiting = [0] * len(self.targets)
+        for successors in self.successors:
+            for successor in successors:
+                waiting[successor] += 1
+
+        ready = [index for (index, count) in enumerate(waiting) if not count]
+        running = {}
+        failed = len(self.targets)
+        error = None
+
+        while ready or running:
+            # Statements after a failed one would be discarded, so they are
+            # not started.
+            while ready:
+                index = heapq.heappop(ready)
+                if index < failed:
+                    environment = {}
+                    for (variable_name, source) in self.sources[index]:
+                        value = symbol_table.get(variable_name) if source < 0 else values[source]
+                        if value is not None:
+                            environment[variable_name] = value
+                    future = executor.submit(_evaluate_statement, self.bytecodes[index], environment, self.targets[index])
+                    running[future] = index
+
+            (done, _) = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                try:
+                    values[index] = future.result()
+                except Exception as err:
+                    if index < failed:
+                        (failed, error) = (index, err)
+                    continue
+                for successor in self.successors[index]:
+                    waiting[successor] -= 1
+                    if not waiting[successor]:
+                        heapq.heappush(ready, successor)
+
+        for index in range(failed):
+            symbol_table[self.targets[index]] = values[index]
+        if error is not None:
+            raise error
+
+
+# Evaluates a statement of a StatementDAG, possibly in a worker process, on
+# the values it reads and returns the value it assigns.
+def _evaluate_statement(bytecode, environment, variable_name):
+
+    VirtualMachine().run(bytecode, environment)
+    return environment[variable_name]
+
+
+# The instrumentation of an Interpreter, which is recorded only while it is
+# enabled with Interpreter.enable_stats():
+#
+#   phases      the number of times each phase ran and its total wall time
+#               in seconds: 'lex', 'parse', 'optimize', 'compile' and
+#               'evaluate'. A compact program is scanned and parsed, and
+#               optimized, in a single 'parse' phase.
+#   programs    the number of programs evaluated, and cache_hits the number
+#               of them that were taken from the ParseCache.
+#   tokens      the number of tokens scanned.
+#   nodes       the number of AST nodes evaluated, by type.
+#   statements  the number of evaluations, and their total wall time, of
+#               each assignment, keyed by its variable name and position
+#               'name@line:column', or 'name#index' in a compact program.
+#   max_depth   the deepest expression evaluated, i.e. the deepest recursion
+#               of the tree walking evaluator, which also bounds the stack of
+#               the virtual machine.
+#   skipped_statements  the number of statements that pruned evaluations
+#               skipped (see Interpreter.evaluate_input()).
+#
+# Statements of a compact program are evaluated together, so they are only
+# counted, and timed as a whole, when the program evaluates without error.
+# A pruned program is also evaluated as a whole, so its statements are not
+# recorded, unless it is traced or shared, and so evaluated statement by
+# statement.
+class InterpreterStats(object):
+    def __init__(self):
+        self.phases = collections.OrderedDict()
+        self.programs = 0
+        self.cache_hits = 0
+        self.tokens = 0
+        self.nodes = collections.Counter()
+        self.statements = collections.OrderedDict()
+        self.max_depth = 0
+        self.skipped_statements = 0
+
+    def add_phase(self, phase, seconds):
+        record = self.phases.get(phase)
+        if record is None:
+            record = self.phases[phase] = [0, 0.0]
+        record[0] += 1
+        record[1] += seconds
+
+    def add_statement(self, key, seconds):
+        record = self.statements.get(key)
+        if record is None:
+            record = self.statements[key] = [0, 0.0]
+        record[0] += 1
+        record[1] += seconds
+
+    # Counts the nodes of a program, or of a NodeTable, and records its depth.
+    def add_nodes(self, root):
+
+        nodes = self.nodes
+        if isinstance(root, NodeTable):
+            kind_names = self._kind_names
+            depths = array.array('i', bytes(4 * len(root)))
+            for index in range(len(root)):
+                nodes[kind_names[root.kinds[index]]] += 1
+                children = root.children(index)
+                if children:
+                    depths[index] = 1 + max(depths[child] for child in children)
+                    if depths[index] > self.max_depth:
+                        self.max_depth = depths[index]
+            return
+
+        pending = [(root, 0)]
+        while pending:
+            (node, depth) = pending.pop()
+            nodes[type(node).__name__] += 1
+            if depth > self.max_depth:
+                self.max_depth = depth
+            if isinstance(node, Program):
+                pending.extend((assignment, 0) for assignment in node.assignments)
+            elif isinstance(node, Assign):
+                pending.append((node.left, 1))
+                pending.append((node.right, 1))
+            elif isinstance(node, BinOp):
+                pending.append((node.left, depth + 1))
+                pending.append((node.right, depth + 1))
+            elif isinstance(node, UnaryOp):
+                pending.append((node.expr, depth + 1))
+
+    _kind_names = ('Num', 'Constant', 'Id', 'BinOp', 'UnaryOp', 'Assign')
+
+    def clear(self):
+        self.__init__()
+
+    # Returns the stats as a dictionary of plain values, e.g. for JSON.
+    def as_dict(self):
+        return collections.OrderedDict([
+            ('phases', collections.OrderedDict(
+                (phase, {'calls': calls, 'seconds': seconds}) for (phase, (calls, seconds)) in self.phases.items())),
+            ('programs', self.programs),
+            ('cache_hits', self.cache_hits),
+            ('tokens', self.tokens),
+            ('nodes', dict(self.nodes)),
+            ('statements', collections.OrderedDict(
+                (key, {'evaluations': count, 'seconds': seconds}) for (key, (count, seconds)) in self.statements.items())),
+            ('max_depth', self.max_depth),
+            ('skipped_statements', self.skipped_statements),
+        ])
+
+    # Returns the times recorded in the folded stack format of flame graph
+    # tools such as flamegraph.pl and speedscope: one line per stack, its
+    # frames separated by semicolons, followed by its time in microseconds.
+    # The time of each statement is nested within the 'evaluate' phase.
+    def flame_graph(self):
+
+        lines = []
+        statement_time = 0.0
+        for (key, (_, seconds)) in self.statements.items():
+            statement_time += seconds
+            lines.append('interpreter;evaluate;{0} {1}'.format(key.replace(';', ':'), int(round(seconds * 1e6))))
+        for (phase, (_, seconds)) in self.phases.items():
+            if phase == 'evaluate':
+                seconds = max(0.0, seconds - statement_time)
+            lines.append('interpreter;{0} {1}'.format(phase, int(round(seconds * 1e6))))
+        return '\n'.join(lines) + '\n'
+
+    def __str__(self):
+        lines = ['InterpreterStats(programs={0}, cache_hits={1}, tokens={2}, max_depth={3}, skipped_statements={4})'.format(
+            self.programs, self.cache_hits, self.tokens, self.max_depth, self.skipped_statements)]
+        for (phase, (calls, seconds)) in self.phases.items():
+            lines.append('    {0:<10} {1:>8} calls {2:>12.6f} s'.format(phase, calls, seconds))
+        for (key, (count, seconds)) in sorted(self.statements.items(), key=lambda item: -item[1][1])[:10]:
+            lines.append('    {0:<20} {1:>8} evals {2:>12.6f} s'.format(key, count, seconds))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+# A recorder of the events of an Interpreter's hooks, that keeps only the
+# last capacity events in a ring buffer, so that a program can be traced
+# under load without the trace growing without bound. For instance:
+#
+#   recorder = TraceRecorder(100)
+#   recorder.attach(interpreter)
+#   interpreter.evaluate_input("x = 1; y = x * 2;")
+#   print(recorder.format())
+#   recorder.detach(interpreter)
+#
+# Every event is recorded as a tuple of its name and the arguments of its
+# hook, oldest first; see Interpreter.register_hook().
+class TraceRecorder(object):
+    def __init__(self, capacity=TRACE_CAPACITY, events=EVENTS):
+        self.capacity = capacity
+        self.events = tuple(events)
+        self.buffer = collections.deque(maxlen=capacity)
+        self.callbacks = dict((event, self._recorder(event)) for event in self.events)
+
+    def _recorder(self, event):
+
+        append = self.buffer.append
+
+        def record(*args):
+            append((event,) + args)
+        return record
+
+    def attach(self, interpreter):
+
+        for (event, callback) in self.callbacks.items():
+            interpreter.register_hook(event, callback)
+
+    def detach(self, interpreter):
+
+        for (event, callback) in self.callbacks.items():
+            interpreter.unregister_hook(event, callback)
+
+    def clear(self):
+        self.buffer.clear()
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __iter__(self):
+        return iter(self.buffer)
+
+    # Returns the events as text, one event per line.
+    def format(self):
+        return "\n".join(" ".join(str(field) for field in event) for event in self.buffer)
+
+    def __str__(self):
+        return 'TraceRecorder({value})'.format(value=repr(len(self.buffer)))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+# A node of a PersistentMap: a bitmap with one bit set for every one of the
+# 32 branches that is used, and the entries of those branches in order. An
+# entry is either a (key, value, sequence) leaf or a child node. Keys whose
+# hashes are equal in all of their bits share a collision node, whose
+# entries are all leaves.
+class _TrieNode(object):
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+class _CollisionNode(object):
+    __slots__ = ('entries',)
+
+    def __init__(self, entries):
+        self.entries = entries
+
+
+_HASH_MASK = (1 << 64) - 1
+_EMPTY_NODE = _TrieNode(0, ())
+_MISSING = object()
+
+
+# This is the Persistent Map.
+# A persistent map is an immutable mapping: setting or deleting a key returns
+# a new map and leaves the old one as it was. It is a hash array mapped trie,
+# a tree that branches 32 ways on five bits of the hash of a key at a time,
+# so that a new map copies only the at most 13 nodes on the path to its key
+# and shares all others with the old map. Keeping a map is therefore a
+# snapshot that costs nothing, however large the map.
+#
+# Like a dict, a map iterates in the order its keys were first set; every
+# key that is added takes the next sequence number, which its leaf records.
+# Iterating walks the trie once and puts every leaf in the slot of its
+# sequence number, so that it takes time in proportion to the keys ever
+# added, rather than sorting them. The items are then yielded one at a time
+# and never gathered in a list.
+class PersistentMap(object):
+    __slots__ = ('_root', '_size', '_sequence')
+
+    def __init__(self, root=_EMPTY_NODE, size=0, sequence=0):
+        self._root = root
+        self._size = size
+        self._sequence = sequence
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key):
+
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+
+        key_hash = hash(key) & _HASH_MASK
+        node = self._root
+        shift = 0
+        while True:
+            if type(node) is _CollisionNode:
+                for leaf in node.entries:
+                    if leaf[0] == key:
+                        return leaf[1]
+                return default
+
+            bit = 1 << ((key_hash >> shift) & 31)
+            if not node.bitmap & bit:
+                return default
+            entry = node.entries[bin(node.bitmap & (bit - 1)).count('1')]
+            if type(entry) is tuple:
+                return entry[1] if entry[0] == key else default
+            node = entry
+            shift += 5
+
+    # Returns a map in which key is set to value.
+    def set(self, key, value):
+
+        (root, added) = self._set(self._root, 0, hash(key) & _HASH_MASK, key, value)
+        if root is self._root:
+            return self
+        if added:
+            return PersistentMap(root, self._size + 1, self._sequence + 1)
+        return PersistentMap(root, self._size, self._sequence)
+
+    # Returns a map without key, which must be in the map.
+    def delete(self, key):
+
+        root = self._delete(self._root, 0, hash(key) & _HASH_MASK, key)
+        if root is None:
+            root = _EMPTY_NODE
+        return PersistentMap(root, self._size - 1, self._sequence)
+
+    # Yields the leaves of the map in the order their keys were first set.
+    def leaves(self):
+
+        slots = [None] * self._sequence
+        pending = [self._root]
+        while pending:
+            for entry in pending.pop().entries:
+                if type(entry) is tuple:
+                    slots[entry[2]] = entry
+                else:
+                    pending.append(entry)
+        for leaf in slots:
+            if leaf is not None:
+                yield leaf
+
+    def __iter__(self):
+        return (leaf[0] for leaf in self.leaves())
+
+    def items(self):
+        return ((leaf[0], leaf[1]) for leaf in self.leaves())
+
+    def _set(self, node, shift, key_hash, key, value):
+
+        if type(node) is _CollisionNode:
+            for (index, leaf) in enumerate(node.entries):
+                if leaf[0] == key:
+                    entries = node.entries[:index] + ((key, value, leaf[2]),) + node.entries[index + 1:]
+                    return (_CollisionNode(entries), False)
+            return (_CollisionNode(node.entries + ((key, value, self._sequence),)), True)
+
+        bit = 1 << ((key_hash >> shift) & 31)
+        index = bin(node.bitmap & (bit - 1)).count('1')
+        entries = node.entries
+
+        if not node.bitmap & bit:
+            leaf = (key, value, self._sequence)
+            return (_TrieNode(node.bitmap | bit, entries[:index] + (leaf,) + entries[index:]), True)
+
+        entry = entries[index]
+        if type(entry) is tuple:
+            if entry[0] == key:
+                if entry[1] is value:
+                    return (node, False)
+                (child, added) = ((key, value, entry[2]), False)
+            else:
+                child = self._merge(entry, hash(entry[0]) & _HASH_MASK, (key, value, self._sequence), key_hash,
+                                    shift + 5)
+                added = True
+        else:
+            (child, added) = self._set(entry, shift + 5, key_hash, key, value)
+            if child is entry:
+                return (node, False)
+
+        return (_TrieNode(node.bitmap, entries[:index] + (child,) + entries[index + 1:]), added)
+
+    # Returns a node that holds two leaves whose keys differ.
+    def _merge(self, first, first_hash, second, second_hash, shift):
+
+        if shift >= 64:
+            return _CollisionNode((first, second))
+
+        first_bit = 1 << ((first_hash >> shift) & 31)
+        second_bit = 1 << ((second_hash >> shift) & 31)
+        if first_bit == second_bit:
+            return _TrieNode(first_bit, (self._merge(first, first_hash, second, second_hash, shift + 5),))
+        if first_bit < second_bit:
+            return _TrieNode(first_bit | second_bit, (first, second))
+        return _TrieNode(first_bit | second_bit, (second, first))
+
+    # Returns the node without key, a single leaf if only one is left below
+    # the root, or None if nothing is left.
+    def _delete(self, node, shift, key_hash, key):
+
+        if type(node) is _CollisionNode:
+            entries = tuple(leaf for leaf in node.entries if leaf[0] != key)
+            return entries[0] if len(entries) == 1 else _CollisionNode(entries)
+
+        bit = 1 << ((key_hash >> shift) & 31)
+        index = bin(node.bitmap & (bit - 1)).count('1')
+        entry = node.entries[index]
+        child = None if type(entry) is tuple else self._delete(entry, shift + 5, key_hash, key)
+
+        if child is None:
+            bitmap = node.bitmap & ~bit
+            entries = node.entries[:index] + node.entries[index + 1:]
+        else:
+            bitmap = node.bitmap
+            entries = node.entries[:index] + (child,) + node.entries[index + 1:]
+
+        if not entries:
+            return None
+        if len(entries) == 1 and type(entries[0]) is tuple and shift:
+            return entries[0]
+        return _TrieNode(bitmap, entries)
+
+    def __str__(self):
+        return 'PersistentMap({value})'.format(value=repr(dict(self.items())))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+# A Symbol Table that is a PersistentMap, behind the interface of a dict, so
+# that the interpreter uses it as it uses a dict. Its state is the map it
+# holds: snapshot() returns the map, restore() puts a snapshot back and fork()
+# returns a new Symbol Table that starts from the same map, all in constant
+# time. For instance:
+#
+#   snapshot = symbol_table.snapshot()
+#   symbol_table['x'] = 1
+#   symbol_table.restore(snapshot)   # x is gone again
+class SymbolTable(collections.abc.MutableMapping):
+
+    def __init__(self, items=(), persistent_map=None):
+        self.map = persistent_map if persistent_map is not None else PersistentMap()
+        self.update(items)
+
+    def __getitem__(self, key):
+        return self.map[key]
+
+    def get(self, key, default=None):
+        return self.map.get(key, default)
+
+    def __contains__(self, key):
+        return self.map.get(key, _MISSING) is not _MISSING
+
+    def __setitem__(self, key, value):
+        self.map = self.map.set(key, value)
+
+    def __delitem__(self, key):
+
+        if key not in self:
+            raise KeyError(key)
+        self.map = self.map.delete(key)
+
+    def __iter__(self):
+        return iter(self.map)
+
+    def __len__(self):
+        return len(self.map)
+
+    def items(self):
+        return self.map.items()
+
+    def values(self):
+        return (value for (_, value) in self.map.items())
+
+    def clear(self):
+        self.map = PersistentMap()
+
+    def snapshot(self):
+        return self.map
+
+    def restore(self, snapshot):
+        self.map = snapshot
+
+    def fork(self):
+        return SymbolTable(persistent_map=self.map)
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.abc.Mapping):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    def __str__(self):
+        return 'SymbolTable({value})'.format(value=repr(dict(self.items())))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+# This is the Toy Interpreter.
+# The job of the interpreter is to facilitate the communication between
+# an instantiated Lexer and Parser, manage a global Symbol Table, evaluate
+# a Parser generated Abstract Syntax Tree (AST), and report any detected
+# errors during the evaluation of an AST.
+class Interpreter(object):
+
+    # A ParseCache may be given to cache the programs this interpreter
+    # evaluates or compiles; it may be shared with other interpreters. A
+    # ProgramCache may be given to save the programs of the files it evaluates
+    # to disk.
+    #
+    # When persistent is set, the Symbol Table is a SymbolTable rather than a
+    # dict, and every program is evaluated in a transaction(): a program that
+    # fails leaves the Symbol Table as it was before the program.
+    def __init__(self, parse_cache=None, program_cache=None, persistent=False):
+        self.parse_cache = parse_cache
+        self.program_cache = program_cache
+        self.persistent = persistent
+        self.lexer = Lexer()
+        self.parser = Parser(self.lexer)
+        self.optimizer = Optimizer()
+        self.liveness = LivenessAnalysis()
+        self.interner = SubexpressionInterner()
+        self.compiler = Compiler()
+        self.python_compiler = PythonCompiler()
+        self.virtual_machine = VirtualMachine()
+        self.vector_machine = VectorMachine()
+        self.dependency_graph = DependencyGraph(self.compiler, self.virtual_machine)
+        self.symbol_table = SymbolTable() if persistent else {}
+        self.stats = None
+        self.hooks = None
+        self.skipped_statements = 0
+
+    # Starts recording InterpreterStats of the programs that evaluate_input()
+    # evaluates, which are then available as the stats attribute, and returns
+    # them. Programs are evaluated a statement at a time while stats are
+    # recorded, so recording is meant for profiling; when it is disabled, the
+    # only cost is a single check per evaluated program.
+    def enable_stats(self):
+
+        if self.stats is None:
+            self.stats = InterpreterStats()
+        return self.stats
+
+    # Stops recording stats and returns those recorded.
+    def disable_stats(self):
+
+        stats = self.stats
+        self.stats = None
+        return stats
+
+    # Registers a callback for one of the EVENTS of the programs that
+    # evaluate_input() evaluates, with the arguments:
+    #
+    #   statement_start   (index, assignment) before a statement is evaluated.
+    #   statement_end     (index, assignment, value) after it is evaluated.
+    #   node              (node, value) for every expression node evaluated,
+    #                     in the order of the tree walking evaluator.
+    #   read              (name, value) for every variable read.
+    #   write             (name, value) for every variable assigned.
+    #
+    # While any callback is registered, programs are evaluated by walking
+    # their AST, whatever the engine and even if compact, so that every node
+    # is seen. Only the statements that a pruned program evaluates are
+    # traced, and a common subexpression that is reused is a single node
+    # event, without the nodes below it. When none is, the only cost is a
+    # single check per evaluated program, as for stats. See the TraceRecorder
+    # for a recorder of the last events.
+    def register_hook(self, event, callback):
+        if event not in EVENTS:
+            raise ValueError("unknown event {0}".format(repr(event)))
+
+        if self.hooks is None:
+            self.hooks = dict((name, []) for name in EVENTS)
+        self.hooks[event].append(callback)
+
+    # Unregisters a callback that register_hook() registered for an event.
+    def unregister_hook(self, event, callback):
+        if event not in EVENTS:
+            raise ValueError("unknown event {0}".format(repr(event)))
+
+        if self.hooks is None or callback not in self.hooks[event]:
+            raise ValueError("callback is not registered for {0}".format(repr(event)))
+        self.hooks[event].remove(callback)
+        if not any(self.hooks.values()):
+            self.hooks = None
+
+    # Resets this interpreter's state to its initial state.
+    def reset(self):
+        self.lexer.reset()
+        self.parser.reset()
+        self.dependency_graph = DependencyGraph(self.compiler, self.virtual_machine)
+        self.symbol_table = SymbolTable() if self.persistent else {}
+
+    # Returns a context manager within which the Symbol Table is restored to
+    # its current state should an exception be raised. For instance:
+    #
+    #   with interpreter.transaction():
+    #       interpreter.evaluate_input("x = 1;")
+    #       interpreter.evaluate_input("y = z;")   # raises, x is rolled back
+    #
+    # Taking the snapshot costs constant time for a persistent interpreter
+    # and a copy of the Symbol Table otherwise.
+    @contextlib.contextmanager
+    def transaction(self):
+
+        symbol_table = self.symbol_table
+        if isinstance(symbol_table, SymbolTable):
+            snapshot = symbol_table.snapshot()
+            try:
+                yield
+            except:
+                symbol_table.restore(snapshot)
+                raise
+        else:
+            snapshot = dict(symbol_table)
+            try:
+                yield
+            except:
+                symbol_table.clear()
+                symbol_table.update(snapshot)
+                raise
+
+    # Returns a new interpreter, with the same caches and options, whose
+    # Symbol Table starts as a copy of this interpreter's; the copy of a
+    # persistent Symbol Table takes constant time and shares its structure.
+    # The definitions of define() are not copied.
+    def fork(self):
+
+        interpreter = Interpreter(self.parse_cache, self.program_cache, self.persistent)
+        if isinstance(self.symbol_table, SymbolTable):
+            interpreter.symbol_table = self.symbol_table.fork()
+        else:
+            interpreter.symbol_table = dict(self.symbol_table)
+        return interpreter
+
+    # Evaluates a given program by:
+    #   1. Generating a stream of tokens from the program -- Lexer's Job.
+    #   2. Generating a Abstract Syntax Tree (AST) from the stream of tokens -- Parser's Job.
+    #   3. Optionally, optimizing the AST -- Optimizer's Job.
+    #   4. Evaluating the AST provided by the parser -- Interpreter's Job.
+    #   5. Update the symbol table with the evaluated AST values.
+    # This method also returns a reference to the evaluated AST.
+    #
+    # The engine selects how the AST is evaluated: ENGINE_TREE walks the AST
+    # directly while ENGINE_VM compiles it to Bytecode that is executed by
+    # the Virtual Machine. ENGINE_SLOTS also compiles it to Bytecode, but
+    # rejects a program that reads an undefined variable before any of it
+    # runs and executes it on a frame of slots rather than the Symbol Table.
+    #
+    # When compact is set the AST is stored, and evaluated, as a NodeTable,
+    # which is built one statement at a time so that the whole program never
+    # exists as AST objects.
+    #
+    # When the interpreter has a ParseCache, a program that has already been
+    # prepared with the same options is taken from the cache rather than being
+    # scanned, parsed, optimized and compiled again.
+    #
+    # The arithmetic selects one of the arithmetic modes (see ARITHMETICS).
+    # Arithmetic other than float arithmetic is carried out by the Virtual
+    # Machine, whatever the engine, and can not be combined with optimize,
+    # since the optimizer folds constants with float arithmetic.
+    #
+    # When prune is set, or outputs are given, the program is pruned by the
+    # LivenessAnalysis before it is evaluated. With prune, only dead stores
+    # are skipped, and the Symbol Table of a successful evaluation is the same
+    # as without it. With outputs, a list of variable names, only the
+    # statements that compute them are evaluated, and the Symbol Table only
+    # receives the variables of those statements. For instance:
+    #
+    #   interpreter.evaluate_input("a = 1; b = 2; c = a + 1;", outputs=['c'])
+    #   interpreter.symbol_table        # {'a': 1, 'c': 2}
+    #   interpreter.skipped_statements  # 1
+    #
+    # A skipped statement raises no error, so a pruned program that fails
+    # leaves only the variables of the statements evaluated before the error.
+    # Compact programs can not be pruned.
+    #
+    # When cse is set, the AST is hash-consed by the SubexpressionInterner
+    # and every common subexpression is computed once, and then reused for
+    # as long as the variables it reads are not assigned, e.g. (x + y) in
+    #
+    #   a = (x + y) * 2; b = (x + y) * 3; x = 1; c = x + y;
+    #
+    # is computed by a and reused by b, while c computes it again. Such
+    # programs are evaluated by walking their shared AST, with the same
+    # results and errors, so cse requires the tree engine; compact programs
+    # can not be shared. Pruned programs are pruned before they are shared.
+    #
+    # Every option is honoured whatever the others, or rejected with a
+    # ValueError: the stats (see enable_stats()) are recorded and the hooks
+    # (see register_hook()) are called however the program is evaluated.
+    def evaluate_input(self, input_string, engine=ENGINE_TREE, optimize=False, compact=False,
+                       arithmetic=ARITHMETIC_FLOAT, prune=False, outputs=None, cse=False):
+        if self.persistent:
+            with self.transaction():
+                return self._evaluate_input(input_string, engine, optimize, compact, arithmetic, prune, outputs, cse)
+        return self._evaluate_input(input_string, engine, optimize, compact, arithmetic, prune, outputs, cse)
+
+    def _evaluate_input(self, input_string, engine, optimize, compact, arithmetic, prune, outputs, cse):
+        if engine not in ENGINES:
+            raise ValueError("unknown engine {0}".format(repr(engine)))
+        if arithmetic not in ARITHMETICS:
+            raise ValueError("unknown arithmetic {0}".format(repr(arithmetic)))
+        if optimize and arithmetic != ARITHMETIC_FLOAT:
+            raise ValueError("{0} arithmetic can not be optimized".format(arithmetic))
+        pruned = prune or outputs is not None
+        if compact and pruned:
+            raise ValueError("compact programs can not be pruned")
+        if compact and cse:
+            raise ValueError("compact programs can not be shared")
+        if cse and engine != ENGINE_TREE:
+            raise ValueError("shared programs can only be evaluated by the {0} engine".format(ENGINE_TREE))
+        if outputs is not None:
+            outputs = tuple(outputs)
+
+        if cse or self.hooks is not None:
+            return self._evaluate_walked(input_string, optimize, arithmetic, pruned, outputs, cse)
+        if pruned:
+            return self._evaluate_pruned(input_string, engine, optimize, arithmetic, outputs)
+        if self.stats is not None:
+            return self._evaluate_instrumented(input_string, engine, optimize, compact, arithmetic)
+        if arithmetic != ARITHMETIC_FLOAT:
+            return self._evaluate_arithmetic(input_string, compact, arithmetic)
+
+        key = (input_string, engine, optimize, compact)
+        prepared = self._cached(key)
+        if prepared is None:
+            if compact:
+                prog = self.compact_input(input_string, optimize)
+                size = prog.nbytes()
+            else:
+                prog = self._parse(input_string, optimize)
+                size = len(self.lexer.tokens) * CACHE_BYTES_PER_TOKEN
+
+            bytecode = None
+            if engine != ENGINE_TREE:
+                bytecode = self.compiler.compile_table(prog) if compact else self.compiler.compile_program(prog)
+
+            prepared = (prog, bytecode)
+            self._cache(key, prepared, sys.getsizeof(input_string) + size)
+
+        (prog, bytecode) = prepared
+        if bytecode is not None:
+            self._run_bytecode(bytecode, engine)
+        else:
+            self._evaluate_program(prog)
+
+        return prog
+
+    # Evaluates the program of a given file, as evaluate_input() does with its
+    # text, without reading the whole file into a string; the file is memory
+    # mapped and scanned as bytes by Lexer.scanner_file(). Returns the AST.
+    #
+    # When the interpreter has a ProgramCache, the program is instead loaded
+    # from the cache, or scanned and parsed and saved to it, as a NodeTable,
+    # which is returned.
+    def evaluate_file(self, path, engine=ENGINE_TREE, optimize=False):
+        if self.persistent:
+            with self.transaction():
+                return self._evaluate_file(path, engine, optimize)
+        return self._evaluate_file(path, engine, optimize)
+
+    def _evaluate_file(self, path, engine, optimize):
+        if engine not in ENGINES:
+            raise ValueError("unknown engine {0}".format(repr(engine)))
+
+        if self.program_cache is not None:
+            table = self.program_cache.load(path, optimize, lambda source: self._build_table(source, optimize))
+            if engine != ENGINE_TREE:
+                self._run_bytecode(self.compiler.compile_table(table), engine)
+            else:
+                self._evaluate_program(table)
+            return table
+
+        # The mapping of the file is released once it is parsed.
+        try:
+            self.lexer.scanner_file(path)
+            self.parser.reset()
+            prog = self.parser.program()
+        finally:
+            self.lexer.reset()
+            self.parser.reset()
+        if optimize:
+            prog = self.optimizer.optimize_program(prog)
+
+        if engine != ENGINE_TREE:
+            self._run_bytecode(self.compiler.compile_program(prog), engine)
+        else:
+            self._evaluate_program(prog)
+
+        return prog
+
+    # Scans and parses the source of a program file, given as bytes, into a
+    # NodeTable for the ProgramCache.
+    def _build_table(self, source, optimize):
+
+        self.lexer.scanner_buffer(source)
+        self.parser.reset()
+        prog = self.parser.program()
+        if optimize:
+            prog = self.optimizer.optimize_program(prog)
+
+        table = NodeTable()
+        table.add_program(prog)
+        return table
+
+    def _evaluate_arithmetic(self, input_string, compact, arithmetic):
+
+        key = (input_string, ENGINE_VM, False, compact)
+        prepared = self._cached(key)
+        if prepared is None:
+            if compact:
+                prog = self.compact_input(input_string)
+                size = prog.nbytes()
+                bytecode = self.compiler.compile_table(prog)
+            else:
+                prog = self._parse(input_string, False)
+                size = len(self.lexer.tokens) * CACHE_BYTES_PER_TOKEN
+                bytecode = self.compiler.compile_program(prog)
+
+            prepared = (prog, bytecode)
+            self._cache(key, prepared, sys.getsizeof(input_string) + size)
+
+        (prog, bytecode) = prepared
+        self.virtual_machine.run_arithmetic(bytecode, self.symbol_table, ARITHMETICS[arithmetic])
+
+        return prog
+
+    def _evaluate_pruned(self, input_string, engine, optimize, arithmetic, outputs):
+
+        stats = self.stats
+        timer = time.perf_counter
+        key = (input_string, engine, optimize, arithmetic, 'pruned', outputs)
+        prepared = self._cached(key)
+        if prepared is None:
+            (prog, skipped, reserved) = self._prune(self._parse(input_string, optimize, stats), outputs)
+            size = len(self.lexer.tokens) * CACHE_BYTES_PER_TOKEN
+
+            bytecode = None
+            if engine != ENGINE_TREE or arithmetic != ARITHMETIC_FLOAT:
+                start = timer()
+                bytecode = self.compiler.compile_program(prog)
+                if stats is not None:
+                    stats.add_phase('compile', timer() - start)
+
+            prepared = (prog, bytecode, skipped, reserved)
+            self._cache(key, prepared, sys.getsizeof(input_string) + size)
+        elif stats is not None:
+            stats.cache_hits += 1
+
+        (prog, bytecode, skipped, reserved) = prepared
+        self.skipped_statements = skipped
+        if stats is not None:
+            stats.programs += 1
+            stats.skipped_statements += skipped
+            stats.add_nodes(prog)
+
+        evaluation_start = timer()
+        try:
+            with self._reserved(reserved):
+                if arithmetic != ARITHMETIC_FLOAT:
+                    self.virtual_machine.run_arithmetic(bytecode, self.symbol_table, ARITHMETICS[arithmetic])
+                elif bytecode is not None:
+                    self._run_bytecode(bytecode, engine)
+                else:
+                    self._evaluate_program(prog)
+        finally:
+            if stats is not None:
+                stats.add_phase('evaluate', timer() - evaluation_start)
+
+        return prog
+
+    # Returns the program that the LivenessAnalysis prunes of a given parsed
+    # program, the number of statements it skipped and the variables that
+    # must be reserved in the Symbol Table while it is evaluated.
+    def _prune(self, parsed, outputs):
+
+        (prog, skipped) = self.liveness.prune(parsed, outputs)
+
+        # A skipped dead store may be the first assignment of its variable, so
+        # every new variable is reserved in the Symbol Table up front to keep
+        # the order of a full evaluation.
+        reserved = ()
+        if outputs is None and skipped:
+            reserved = tuple(collections.OrderedDict.fromkeys(
+                assignment.left.value for assignment in parsed.assignments))
+
+        return (prog, skipped, reserved)
+
+    # Returns a context manager within which the given variables that are not
+    # yet in the Symbol Table hold a place in it, which those left unassigned
+    # give up on exit.
+    @contextlib.contextmanager
+    def _reserved(self, variable_names):
+
+        symbol_table = self.symbol_table
+        for variable_name in variable_names:
+            symbol_table.setdefault(variable_name, None)
+        try:
+            yield
+        finally:
+            for variable_name in variable_names:
+                if symbol_table.get(variable_name, 0) is None:
+                    del symbol_table[variable_name]
+
+    # Evaluates a program as evaluate_input() does by walking its AST, one
+    # statement at a time, which is how programs are evaluated while hooks are
+    # registered, and with common subexpression elimination when cse is set.
+    # Pruned programs are pruned before their AST is shared.
+    def _evaluate_walked(self, input_string, optimize, arithmetic, pruned, outputs, cse):
+
+        stats = self.stats
+        timer = time.perf_counter
+        key = (input_string, 'walked', optimize, pruned, outputs, cse)
+        prepared = self._cached(key)
+        if prepared is None:
+            prog = self._parse(input_string, optimize, stats)
+            size = len(self.lexer.tokens) * CACHE_BYTES_PER_TOKEN
+            (skipped, reserved) = (0, ())
+            if pruned:
+                (prog, skipped, reserved) = self._prune(prog, outputs)
+            shared = None
+            if cse:
+                (prog, shared) = self.interner.intern_program(prog)
+
+            prepared = (prog, shared, skipped, reserved)
+            self._cache(key, prepared, sys.getsizeof(input_string) + size)
+        elif stats is not None:
+            stats.cache_hits += 1
+
+        (prog, shared, skipped, reserved) = prepared
+        if pruned:
+            self.skipped_statements = skipped
+        if stats is not None:
+            stats.programs += 1
+            stats.skipped_statements += skipped
+            stats.add_nodes(prog)
+
+        arithmetic = ARITHMETICS[arithmetic]
+        # The callbacks are fixed for the program, even if a callback
+        # registers or unregisters others.
+        hooks = dict((event, ()) for event in EVENTS)
+        if self.hooks is not None:
+            hooks = dict((event, tuple(callbacks)) for (event, callbacks) in self.hooks.items())
+        symbol_table = self.symbol_table
+        # The values of common subexpressions by id, and the ids of those
+        # computed by the names of the variables they read.
+        values = {}
+        readers = {}
+
+        evaluation_start = timer()
+        try:
+            with self._reserved(reserved):
+                for (index, assignment) in enumerate(prog.assignments):
+                    start = timer()
+                    for callback in hooks[EVENT_STATEMENT_START]:
+                        callback(index, assignment)
+
+                    value = arithmetic.store(self._walk(assignment.right, arithmetic, hooks[EVENT_NODE],
+                                                        hooks[EVENT_READ], shared, values, readers))
+                    variable_name = assignment.left.value
+                    symbol_table[variable_name] = value
+                    for node_id in readers.pop(variable_name, ()):
+                        values.pop(node_id, None)
+
+                    for callback in hooks[EVENT_WRITE]:
+                        callback(variable_name, value)
+                    for callback in hooks[EVENT_STATEMENT_END]:
+                        callback(index, assignment, value)
+                    if stats is not None:
+                        stats.add_statement(self._statement_key(assignment), timer() - start)
+        finally:
+            if stats is not None:
+                stats.add_phase('evaluate', timer() - evaluation_start)
+
+        return prog
+
+    # The opcodes of the functions of an Arithmetic, by operator token type.
+    _arithmetic_opcodes = {PLUS: OP_ADD, MINUS: OP_SUB, MUL: OP_MUL, DIV: OP_DIV}
+
+    # Computes an expression as _compute_AST() does, in the same order, with
+    # the given Arithmetic. The tree is walked in post-order with an explicit
+    # stack, so arbitrarily deep trees need no recursion.
+    #
+    # Every node evaluated, and its value, is passed to the node callbacks,
+    # and every variable read, and its value, to the read callbacks. When the
+    # common subexpressions of a shared AST are given, see
+    # SubexpressionInterner, the value of each one computed is kept in values
+    # and its id is added to the readers of every variable it reads; a common
+    # subexpression whose value is kept is not computed again, and is passed
+    # to the node callbacks without the nodes below it.
+    def _walk(self, root, arithmetic, node_callbacks=(), read_callbacks=(), shared=None, values=None, readers=None):
+
+        binary = arithmetic.binary
+        wrap = arithmetic.wrap
+        opcodes = self._arithmetic_opcodes
+        symbol_table = self.symbol_table
+        results = []
+        pending = [(root, False)]
+
+        while pending:
+            (node, visited) = pending.pop()
+
+            if isinstance(node, BinOp):
+                if visited:
+                    right = results.pop()
+                    value = binary[opcodes[node.token.type]](results.pop(), right)
+                else:
+                    value = None if shared is None else values.get(id(node))
+                    if value is None:
+                        pending.append((node, True))
+                        pending.append((node.right, False))
+                        pending.append((node.left, False))
+                        continue
+
+            elif isinstance(node, UnaryOp):
+                if visited:
+                    value = results.pop()
+                    if node.token.type == MINUS:
+                        value = arithmetic.neg(value)
+                else:
+                    value = None if shared is None else values.get(id(node))
+                    if value is None:
+                        pending.append((node, True))
+                        pending.append((node.expr, False))
+                        continue
+
+            elif isinstance(node, Id):
+                variable_name = node.value
+                value = symbol_table.get(variable_name)
+                if value is None:
+                    self._error_undefined_variable(repr(variable_name))
+                for callback in read_callbacks:
+                    callback(variable_name, value if wrap is None else wrap(value))
+
+            else:
+                value = node.value if isinstance(node, Constant) else int(node.value)
+
+            if visited and shared is not None:
+                names = shared.get(id(node))
+                if names is not None:
+                    values[id(node)] = value
+                    for variable_name in names:
+                        readers.setdefault(variable_name, []).append(id(node))
+            for callback in node_callbacks:
+                callback(node, value if wrap is None else wrap(value))
+            results.append(value)
+
+        return results.pop()
+
+    def _run_bytecode(self, bytecode, engine):
+
+        if engine == ENGINE_SLOTS:
+            self._run_slots(bytecode)
+        else:
+            self.virtual_machine.run(bytecode, self.symbol_table)
+
+    # Runs Bytecode with its variables resolved to slots. The free variables
+    # of the program are checked first, so a program that reads an undefined
+    # variable is rejected before any of it runs, whereas the other engines
+    # report the error when the variable is read. The frame is then loaded
+    # from the Symbol Table, the program runs on the frame and the variables
+    # it assigned, even if it failed part way, are stored back in the Symbol
+    # Table in the order of their first assignments.
+    def _run_slots(self, bytecode):
+
+        if bytecode.free_slots is None:
+            bytecode.resolve()
+
+        names = bytecode.names
+        symbol_table = self.symbol_table
+        for slot in bytecode.free_slots:
+            if symbol_table.get(names[slot]) is None:
+                self._error_undefined_variable(repr(names[slot]))
+
+        frame = [symbol_table.get(name) for name in names]
+        try:
+            self.virtual_machine.run_frame(bytecode, frame)
+        finally:
+            for slot in bytecode.stored_slots:
+                value = frame[slot]
+                if value is not None:
+                    symbol_table[names[slot]] = value
+
+    # Evaluates a program as evaluate_input() does while recording stats. The
+    # program is prepared one phase at a time, and its statements compiled and
+    # evaluated one at a time, so that each can be timed. Arithmetic other
+    # than float arithmetic is carried out by the Virtual Machine, as usual.
+    def _evaluate_instrumented(self, input_string, engine, optimize, compact, arithmetic):
+
+        stats = self.stats
+        timer = time.perf_counter
+        stats.programs += 1
+        if arithmetic != ARITHMETIC_FLOAT:
+            engine = ENGINE_VM
+
+        key = (input_string, engine, optimize, compact, 'instrumented')
+        prepared = self._cached(key)
+        if prepared is None:
+            if compact:
+                start = timer()
+                prog = self.compact_input(input_string, optimize)
+                stats.add_phase('parse', timer() - start)
+                size = prog.nbytes()
+            else:
+                prog = self._parse(input_string, optimize, stats)
+                size = len(self.lexer.tokens) * CACHE_BYTES_PER_TOKEN
+
+            bytecodes = None
+            if engine != ENGINE_TREE:
+                start = timer()
+                if compact:
+                    bytecodes = [self.compiler.compile_table(prog)]
+                else:
+                    bytecodes = [self.compiler.compile_statement(assignment) for assignment in prog.assignments]
+                stats.add_phase('compile', timer() - start)
+
+            prepared = (prog, bytecodes)
+            self._cache(key, prepared, sys.getsizeof(input_string) + size)
+        else:
+            stats.cache_hits += 1
+
+        (prog, bytecodes) = prepared
+        stats.add_nodes(prog)
+
+        if compact:
+            statements = ['{0}#{1}'.format(prog.names[prog.firsts[statement]], index)
+                          for (index, statement) in enumerate(prog.statements)]
+            steps = [bytecodes[0] if bytecodes else prog]
+        else:
+            statements = [self._statement_key(assignment) for assignment in prog.assignments]
+            steps = bytecodes if bytecodes else prog.assignments
+
+        evaluation_start = timer()
+        try:
+            for (index, step) in enumerate(steps):
+                start = timer()
+                if arithmetic != ARITHMETIC_FLOAT:
+                    self.virtual_machine.run_arithmetic(step, self.symbol_table, ARITHMETICS[arithmetic])
+                elif isinstance(step, Bytecode):
+                    self._run_bytecode(step, engine)
+                else:
+                    self._evaluate_program(step)
+                seconds = timer() - start
+                if compact:
+                    # The whole table was evaluated; its time is shared out.
+                    for statement in statements:
+                        stats.add_statement(statement, seconds / len(statements))
+                else:
+                    stats.add_statement(statements[index], seconds)
+        finally:
+            stats.add_phase('evaluate', timer() - evaluation_start)
+
+        return prog
+
+    # Returns the key of the stats of a statement: 'name@line:column'.
+    def _statement_key(self, assignment):
+        return '{0}@{1}:{2}'.format(assignment.left.value, assignment.line, assignment.column)
+
+    # Scans, parses and, if asked, optimizes a program. When stats are given,
+    # the time of each phase and the tokens scanned are recorded in them.
+    def _parse(self, input_string, optimize, stats=None):
+
+        timer = time.perf_counter
+        start = timer()
+        self.lexer.scanner_input(input_string)
+        if stats is not None:
+            scanned = timer()
+            stats.add_phase('lex', scanned - start)
+            stats.tokens += len(self.lexer.tokens)
+        self.parser.reset()
+        prog = self.parser.program()
+        if stats is not None:
+            parsed = timer()
+            stats.add_phase('parse', parsed - scanned)
+        if optimize:
+            prog = self.optimizer.optimize_program(prog)
+            if stats is not None:
+                stats.add_phase('optimize', timer() - parsed)
+
+        return prog
+
+    def _cached(self, key):
+
+        if self.parse_cache is None:
+            return None
+        return self.parse_cache.get(key)
+
+    def _cache(self, key, prepared, size):
+
+        if self.parse_cache is not None:
+            self.parse_cache.put(key, prepared, size)
+
+    # Defines, or redefines, the assignments of a given program in this
+    # interpreter's DependencyGraph and recomputes only the statements that
+    # the change affects, like a spreadsheet. For instance:
+    #
+    #   interpreter.define("rate = 4 + 5; kite = 5; flight = rate + kite;")
+    #   interpreter.define("kite = 6;")   # recomputes kite and flight only
+    #
+    # The Symbol Table is then the same as after evaluating, in order, every
+    # definition made since the last reset. Returns the names of the variables
+    # that were recomputed.
+    def define(self, input_string):
+
+        prog = self._parse(input_string, False)
+        return self.dependency_graph.define(prog.assignments, self.symbol_table)
+
+    # Evaluates a given program with its independent statements running in
+    # parallel, on a given concurrent.futures Executor or else on a pool of
+    # processes that is created for the program, by default one per CPU. The
+    # statements are scheduled by a StatementDAG; the Symbol Table, and the
+    # error raised should a statement fail, are the same as those of
+    # evaluate_input(). For instance:
+    #
+    #   with concurrent.futures.ProcessPoolExecutor() as executor:
+    #       interpreter.evaluate_parallel("a = 9 * 9; b = 7 * 7; c = a + b;", executor=executor)
+    #
+    # runs a and b at the same time, and then c. Every statement is a task of
+    # its own, so only programs of expensive statements, such as arithmetic on
+    # large integers, gain from it.
+    def evaluate_parallel(self, input_string, processes=None, executor=None, optimize=False):
+        import concurrent.futures
+
+        key = (input_string, 'parallel', optimize)
+        prepared = self._cached(key)
+        if prepared is None:
+            prog = self._parse(input_string, optimize)
+            prepared = (prog, StatementDAG(self.compiler, prog.assignments))
+            size = len(self.lexer.tokens) * CACHE_BYTES_PER_TOKEN
+            self._cache(key, prepared, sys.getsizeof(input_string) + size)
+
+        (prog, dag) = prepared
+        if executor is not None:
+            self._run_dag(dag, executor)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+                self._run_dag(dag, executor)
+
+        return prog
+
+    def _run_dag(self, dag, executor):
+
+        if self.persistent:
+            with self.transaction():
+                dag.run(executor, self.symbol_table)
+        else:
+            dag.run(executor, self.symbol_table)
+
+    # Compiles a given program into a Python function for repeated execution.
+    # The function takes a Symbol Table, or None for an empty one, evaluates
+    # the program against it and returns it updated; its results and errors
+    # are the same as those of evaluate_input(). For instance:
+    #
+    #   program = interpreter.compile("flight = rate + kite;")
+    #   program({'rate': 9, 'kite': 5})   # {'rate': 9, 'kite': 5, 'flight': 14}
+    def compile(self, input_string, optimize=False):
+
+        key = (input_string, 'compiled', optimize)
+        prepared = self._cached(key)
+        if prepared is None:
+            function = self.python_compiler.compile_program(self._parse(input_string, optimize))
+            prepared = (function,)
+            size = len(self.lexer.tokens) * CACHE_BYTES_PER_TOKEN
+            self._cache(key, prepared, sys.getsizeof(input_string) + size)
+
+        return prepared[0]
+
+    # Evaluates a given program once for every row of a batch of inputs. The
+    # columns map variable names to equally long sequences of values, or to
+    # single values that apply to every row, and the program is executed by
+    # the VectorMachine a column at a time, which requires NumPy. For instance:
+    #
+    #   result = interpreter.evaluate_batch("flight = rate + kite;",
+    #                                       {'rate': [9, 4], 'kite': 5})
+    #   result.columns['flight']   # array([14, 9])
+    #   result.errors              # array([False, False])
+    #
+    # See the VectorMachine for the dtypes and how errors of single rows are
+    # reported. This interpreter's Symbol Table is neither read nor updated.
+    def evaluate_batch(self, input_string, columns, dtype='int64', optimize=False):
+
+        key = (input_string, ENGINE_VM, optimize, False)
+        prepared = self._cached(key)
+        if prepared is None:
+            prog = self._parse(input_string, optimize)
+            prepared = (prog, self.compiler.compile_program(prog))
+            size = len(self.lexer.tokens) * CACHE_BYTES_PER_TOKEN
+            self._cache(key, prepared, sys.getsizeof(input_string) + size)
+
+        return self.vector_machine.run(prepared[1], columns, dtype)
+
+    # Parses, and optionally optimizes, a given program into a NodeTable. The
+    # statements are parsed one at a time and added to the table, so that
+    # only the AST objects of a single statement exist at any time.
+    def compact_input(self, input_string, optimize=False):
+
+        table = NodeTable()
+        lexer = Lexer()
+        for assignment in Parser(lexer).statements(lexer.generate_tokens((input_string,))):
+            if optimize:
+                assignment = self.optimizer.optimize_statement(assignment)
+            table.add_statement(assignment)
+
+        return table
+
+    # Evaluates a program that is given as an iterable of chunks of text, such
+    # as read_chunks() of a program file, by streaming it through the Lexer,
+    # Parser and evaluation engine one statement at a time. After each
+    # statement is evaluated its assigned variable name and value are yielded
+    # and the statement is discarded, so a program of any size runs in memory
+    # bounded by its chunk size and its Symbol Table, and the first results are
+    # available before the rest of the program has even been read.
+    #
+    # Note that the statements that precede a syntax error are evaluated,
+    # whereas evaluate_input() rejects the whole program.
+    #
+    # Every stream is scanned and parsed by a Lexer and Parser of its own, so
+    # that the interpreter may evaluate other programs while a stream is
+    # suspended.
+    def evaluate_stream(self, chunks, engine=ENGINE_TREE, optimize=False):
+        if engine not in ENGINES:
+            raise ValueError("unknown engine {0}".format(repr(engine)))
+
+        lexer = Lexer()
+        for assignment in Parser(lexer).statements(lexer.generate_tokens(chunks)):
+            if optimize:
+                assignment = self.optimizer.optimize_statement(assignment)
+
+            if engine != ENGINE_TREE:
+                self._run_bytecode(self.compiler.compile_statement(assignment), engine)
+            else:
+                self._evaluate_program(assignment)
+
+            variable_name = assignment.left.value
+            yield variable_name, self.symbol_table[variable_name]
+
+    def _error_undefined_variable(self, data):
+        raise InterpreterUninitializedVariableError(data)
+
+    def _evaluate_program(self, root):
+
+        if isinstance(root, NodeTable):
+            self._evaluate_table(root)
+
+        if isinstance(root, Program):
+            for assignment in root.assignments:
+                self._evaluate_program(assignment)
+
+        if isinstance(root, Assign):
+            variable_name = root.left.value
+            self.symbol_table[variable_name] = int(self._compute_AST(root.right))
+
+    def _compute_AST(self, root):
+
+        if isinstance(root, Id):
+            variable_name = root.value
+            identifier_value = self.symbol_table.get(variable_name)
+            if identifier_value is None:
+                self._error_undefined_variable(repr(variable_name))
+            else:
+                return identifier_value
+
+        elif isinstance(root, Num):
+            if isinstance(root, Constant):
+                return root.value
+            return int(root.value)
+
+        elif isinstance(root, BinOp):
+
+            if root.token.type == PLUS:
+                return self._compute_AST(root.left) + self._compute_AST(root.right)
+
+            elif root.token.type == MINUS:
+                return self._compute_AST(root.left) - self._compute_AST(root.right)
+
+            elif root.token.type == MUL:
+                return self._compute_AST(root.left) * self._compute_AST(root.right)
+
+            # Supports Integer Division Only: 2/3 returns 0 and 3/2 returns 1
+            elif root.token.type == DIV:
+                return self._compute_AST(root.left) / self._compute_AST(root.right)
+
+        elif isinstance(root, UnaryOp):
+
+            if root.token.type == PLUS:
+                return +self._compute_AST(root.expr)
+
+            elif root.token.type == MINUS:
+                return -self._compute_AST(root.expr)
+
+    # Evaluates a NodeTable directly. The nodes of each statement are stored
+    # in post-order, so the statement is evaluated by a single scan over its
+    # nodes with a stack of operand values, in the same left to right order
+    # as _compute_AST().
+    def _evaluate_table(self, table):
+
+        kinds = table.kinds
+        operators = table.operators
+        firsts = table.firsts
+        constants = table.constants
+        names = table.names
+        symbol_table = self.symbol_table
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        start = 0
+
+        for statement in table.statements:
+            for i in range(start, statement):
+                kind = kinds[i]
+
+                if kind == NODE_ID:
+                    variable_name = names[firsts[i]]
+                    identifier_value = symbol_table.get(variable_name)
+                    if identifier_value is None:
+                        self._error_undefined_variable(repr(variable_name))
+                    push(identifier_value)
+
+                elif kind == NODE_BINOP:
+                    right = pop()
+                    operator = operators[i]
+                    if operator == OPERATOR_PLUS:
+                        stack[-1] = stack[-1] + right
+                    elif operator == OPERATOR_MINUS:
+                        stack[-1] = stack[-1] - right
+                    elif operator == OPERATOR_MUL:
+                        stack[-1] = stack[-1] * right
+                    # Supports Integer Division Only, truncated on assignment.
+                    elif operator == OPERATOR_DIV:
+                        stack[-1] = stack[-1] / right
+
+                elif kind == NODE_UNARYOP:
+                    if operators[i] == OPERATOR_MINUS:
+                        stack[-1] = -stack[-1]
+
+                else:
+                    push(constants[firsts[i]])
+
+            symbol_table[names[firsts[statement]]] = int(pop())
+            start = statement + 1
+
+    # Evaluation output is formatted to a single line.
+    def stringed_output(self):
+
+        return ", ".join("{key} = {value}".format(key=key, value=value) for (key, value) in self.symbol_table.items())
+
+    # Evaluation output is formatted to multi-line--one assignment per line.
+    def normal_output(self):
+        return "\n".join("{key} = {value}".format(key=key, value=value) for (key, value) in self.symbol_table.items())
+
+    # Writes the evaluation output to a text file, or to any object with a
+    # write() method such as the file of a socket (socket.makefile('w')), as
+    # normal_output() formats it when multiline is set and as stringed_output()
+    # formats it otherwise, but followed by a line ending. The variables are
+    # formatted and written in batches, so the whole output is never built in
+    # memory. Returns the number of variables written.
+    def write_output(self, file, multiline=True):
+
+        separator = "\n" if multiline else ", "
+        items = iter(self.symbol_table.items())
+        count = 0
+        batch = list(itertools.islice(items, OUTPUT_BATCH_SIZE))
+        while batch:
+            if count:
+                file.write(separator)
+            file.write(separator.join("{key} = {value}".format(key=key, value=value) for (key, value) in batch))
+            count += len(batch)
+            batch = list(itertools.islice(items, OUTPUT_BATCH_SIZE))
+        if count:
+            file.write("\n")
+
+        return count
+
+    # Saves the Symbol Table to a binary file as a snapshot that load_state()
+    # restores. The snapshot holds, after its magic and version:
+    #
+    #   the number of variables, as a varint;
+    #   the name table: its size, as a varint, followed by the names in their
+    #   order in the Symbol Table, separated by NUL bytes;
+    #   the values: a little endian int64 for each variable, 0 for values that
+    #   do not fit in 64 bits;
+    #   the big values: their number, then each one's index and size in
+    #   bytes, as varints, followed by its little endian two's complement bytes.
+    #
+    # Names and machine sized values are converted in bulk rather than one at a
+    # time, so large Symbol Tables are saved and loaded quickly. Only the
+    # Symbol Table is saved, which must map variable names to integers.
+    def save_state(self, file):
+
+        names = list(self.symbol_table.keys())
+        values = array.array('q')
+        big_values = []
+        try:
+            try:
+                values.fromlist(list(self.symbol_table.values()))
+            except OverflowError:
+                values = array.array('q')
+                for (index, value) in enumerate(self.symbol_table.values()):
+                    if -1 << 63 <= value < 1 << 63:
+                        values.append(value)
+                    else:
+                        values.append(0)
+                        big_values.append((index, value.__index__()))
+        except (TypeError, AttributeError):
+            raise ValueError("only integer variables can be saved")
+        if sys.byteorder != 'little':
+            values.byteswap()
+
+        try:
+            name_table = b'\0'.join(name.encode('ascii') for name in names)
+        except (UnicodeEncodeError, AttributeError):
+            raise ValueError("only ASCII variable names can be saved")
+        if name_table.count(b'\0') != max(len(names) - 1, 0):
+            raise ValueError("variable names can not contain NUL characters")
+
+        header = bytearray(SNAPSHOT_MAGIC)
+        header.append(SNAPSHOT_VERSION)
+        _write_varint(header, len(names))
+        _write_varint(header, len(name_table))
+        file.write(header)
+        file.write(name_table)
+        file.write(values.tobytes())
+
+        trailer = bytearray()
+        _write_varint(trailer, len(big_values))
+        for (index, value) in big_values:
+            size = (value.bit_length() + 8) // 8
+            _write_varint(trailer, index)
+            _write_varint(trailer, size)
+            trailer += value.to_bytes(size, 'little', signed=True)
+        file.write(trailer)
+
+    # Restores a Symbol Table that save_state() saved to a binary file. The
+    # interpreter is reset first, so its previous state is discarded; names
+    # are interned as they would be when scanned.
+    def load_state(self, file):
+
+        data = file.read()
+        if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError("not an interpreter snapshot")
+        pos = len(SNAPSHOT_MAGIC)
+        if data[pos:pos + 1] != bytes((SNAPSHOT_VERSION,)):
+            raise ValueError("unsupported snapshot version")
+        pos += 1
+
+        (count, pos) = _read_varint(data, pos)
+        (size, pos) = _read_varint(data, pos)
+        name_table = data[pos:pos + size]
+        pos += size
+        names = list(map(sys.intern, name_table.decode('ascii').split('\0'))) if count else []
+
+        values = array.array('q')
+        values.frombytes(data[pos:pos + 8 * count])
+        pos += 8 * count
+        if sys.byteorder != 'little':
+            values.byteswap()
+        values = values.tolist()
+        if len(names) != count or len(values) != count:
+            raise ValueError("corrupt interpreter snapshot")
+
+        (big_count, pos) = _read_varint(data, pos)
+        for _ in range(big_count):
+            (index, pos) = _read_varint(data, pos)
+            (size, pos) = _read_varint(data, pos)
+            if index >= count:
+                raise ValueError("corrupt interpreter snapshot")
+            values[index] = int.from_bytes(data[pos:pos + size], 'little', signed=True)
+            pos += size
+
+        if pos != len(data):
+            raise ValueError("corrupt interpreter snapshot")
+
+        self.reset()
+        self.symbol_table.update(zip(names, values))
+
+    # Shows the AST hierarchy by indenting nodes according ot their level in the tree.
+    def show_tree_heirarchy(self, root):
+
+        if isinstance(root, NodeTable):
+            self._show_table_heirarchy(root)
+            return
+
+        def show_tree(root, level):
+
+            padding = ""
+            if level > 0:
+                padding = " " * level * 4
+                # padding += "\u2514"
+                # padding += "\u2500\u2500"
+            print(padding + root.__str__())
+
+            if isinstance(root, Program):
+                for assignment in root.assignments:
+                    show_tree(assignment, level + 1)
 
-# Main defines an terminal based interface for the Toy Interpreter.
-def main():
+            if isinstance(root, BinOp):
+                show_tree(root.left, level + 1)
+                show_tree(root.right, level + 1)
 
-    interpreter = Interpreter()
+            if isinstance(root, Assign):
+                show_tree(root.left, level + 1)
+                show_tree(root.right, level + 1)
+
+            elif isinstance(root, UnaryOp):
+                show_tree(root.expr, level + 1)
+
+        show_tree(root, 0)
+
+    # Shows the hierarchy of a NodeTable in the same format as the AST
+    # hierarchy. The tree is walked with an explicit stack.
+    def _show_table_heirarchy(self, table):
+
+        print(table.__str__())
+        for statement in table.statements:
+            pending = [(statement, 1)]
+            while pending:
+                (index, level) = pending.pop()
+                print(" " * level * 4 + table.node_string(index))
+                if table.kinds[index] == NODE_ASSIGN:
+                    print(" " * (level + 1) * 4 + 'Id({value})'.format(value=repr(table.names[table.firsts[index]])))
+                for child in reversed(table.children(index)):
+                    pending.append((child, level + 1))
+
+# Appends a non-negative integer to a bytearray as a varint: seven bits per
+# byte, least significant first, with the high bit set on all but the last.
+def _write_varint(output, value):
 
+    while value > 0x7f:
+        output.append((value & 0x7f) | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+# Reads a varint from data at pos and returns it with the position after it.
+def _read_varint(data, pos):
+
+    value = 0
+    shift = 0
     while True:
+        if pos >= len(data):
+            raise ValueError("corrupt interpreter snapshot")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+# Reads a text file in chunks of at most chunk_size characters, which lets a
+# program file of any size be streamed through Interpreter.evaluate_stream().
+def read_chunks(file, chunk_size=CHUNK_SIZE):
+
+    chunk = file.read(chunk_size)
+    while chunk:
+        yield chunk
+        chunk = file.read(chunk_size)
+
+
+# The result of evaluating one program of a batch: its position in the batch,
+# its name, e.g. the path of its file, the Symbol Table it left behind and,
+# should its evaluation have failed, a description of the error. As with
+# evaluate_input(), the Symbol Table of a failed program holds the variables
+# assigned before the error.
+class ProgramResult(object):
+    def __init__(self, index, name, symbol_table, error=None):
+        self.index = index
+        self.name = name
+        self.symbol_table = symbol_table
+        self.error = error
+
+    def output(self):
+        if self.error is not None:
+            return self.error
+        return ', '.join('{0} = {1}'.format(key, value) for (key, value) in self.symbol_table.items())
+
+    def __str__(self):
+        return 'ProgramResult({name}: {output})'.format(name=self.name, output=self.output())
+
+    def __repr__(self):
+        return self.__str__()
+
+
+# The Interpreter, and the options it evaluates with, of a worker process of
+# evaluate_programs(). Each worker evaluates its programs with its own
+# interpreter, which it resets between programs.
+_worker_interpreter = None
+_worker_options = None
+
+
+def _initialize_worker(engine, optimize, program_cache):
+    global _worker_interpreter, _worker_options
+
+    _worker_interpreter = Interpreter(program_cache=program_cache)
+    _worker_options = (engine, optimize)
+
+
+# Evaluates a program of a batch in a worker process. A task is a tuple of the
+# program's index, its name and its source, where a source of None means the
+# name is the path of a file to be read by the worker.
+def _evaluate_task(task):
+
+    (index, name, source) = task
+    (engine, optimize) = _worker_options
+    interpreter = _worker_interpreter
+    interpreter.reset()
+
+    error = None
+    try:
+        if source is None:
+            interpreter.evaluate_file(name, engine, optimize)
+        else:
+            interpreter.evaluate_input(source, engine, optimize)
+    except Exception as err:
+        error = _error_message(err)
+
+    # A tuple is cheaper to send back to the parent process than an object.
+    return (index, name, interpreter.symbol_table, error)
+
+
+# Describes the error of a program that is evaluated without a Session.
+def _error_message(err):
+
+    if isinstance(err, InterpreterSyntaxError):
+        return "syntax error"
+    elif isinstance(err, InterpreterUninitializedVariableError):
+        return "uninitialized variable error: {0}".format(err)
+    elif isinstance(err, EnvironmentError):
+        return "could not read program: {0}".format(err)
+    return "unknown error: {0}".format(repr(err))
+
+
+# Evaluates many independent programs in a pool of worker processes and
+# yields a ProgramResult for each of them. Programs are given as an iterable
+# of sources, or of (name, source) pairs, and are sent to the workers in
+# chunks of chunk_size programs to keep the cost of communication low. The
+# results are yielded in the order of the programs or, when ordered is False,
+# as soon as they are evaluated. An error of one program is captured in its
+# result and does not affect the others. For instance:
+#
+#   for result in evaluate_programs(["x = 1;", "y = x;"]):
+#       print(result.output())   # "x = 1", then an uninitialized variable error
+#
+# The number of processes defaults to the number of CPUs.
+def evaluate_programs(programs, processes=None, chunk_size=None, ordered=True, engine=ENGINE_TREE, optimize=False):
+
+    tasks = []
+    for (index, program) in enumerate(programs):
+        (name, source) = (index, program) if isinstance(program, str) else program
+        tasks.append((index, name, source))
+    return _run_tasks(tasks, processes, chunk_size, ordered, engine, optimize, None)
+
+
+# Evaluates the programs of many files as evaluate_programs() does; the files
+# are read by the worker processes and the results are named by their paths.
+# The workers save and load the programs with a ProgramCache, if one is given.
+def evaluate_files(paths, processes=None, chunk_size=None, ordered=True, engine=ENGINE_TREE, optimize=False,
+                   program_cache=None):
+
+    tasks = [(index, path, None) for (index, path) in enumerate(paths)]
+    return _run_tasks(tasks, processes, chunk_size, ordered, engine, optimize, program_cache)
+
+
+def _run_tasks(tasks, processes, chunk_size, ordered, engine, optimize, program_cache):
+    if engine not in ENGINES:
+        raise ValueError("unknown engine {0}".format(repr(engine)))
+
+    return _pool_results(tasks, processes, chunk_size, ordered, engine, optimize, program_cache)
+
+
+def _pool_results(tasks, processes, chunk_size, ordered, engine, optimize, program_cache):
+    import multiprocessing
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if chunk_size is None:
+        # Several chunks per process balance the load of unequal programs.
+        chunk_size = max(1, min(BATCH_CHUNK_SIZE, len(tasks) // (processes * 4)))
+
+    pool = multiprocessing.Pool(processes, _initialize_worker, (engine, optimize, program_cache))
+    try:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for (index, name, symbol_table, error) in imap(_evaluate_task, tasks, chunk_size):
+            yield ProgramResult(index, name, symbol_table, error)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+# The checks of test_driver() that exercise features beyond the output of a
+# single program. Each returns its output as a string.
+
+# A stream that is suspended while the interpreter evaluates another program
+# carries on with its own statements.
+def _test_interleaved_stream():
+
+    interpreter = Interpreter()
+    stream = interpreter.evaluate_stream(["a = 1; b = 2; c = 3;"])
+    next(stream)
+    interpreter.evaluate_input("q = 10 + 20;")
+    for _ in stream:
+        pass
+    return interpreter.stringed_output()
+
+
+# A ParseCache counts its hits, misses and evictions, and the Program that an
+# evaluation returns can still be extended after it has been cached.
+def _test_parse_cache():
+
+    cache = ParseCache(max_entries=2)
+    interpreter = Interpreter(cache)
+    for input_string in ("a = 1;", "a = 1;", "b = 2;", "c = 3;", "a = 1;"):
+        interpreter.evaluate_input(input_string)
+
+    prog = interpreter.evaluate_input("d = 4;")
+    prog.addStatement(prog.assignments[0])
+    cached = interpreter.evaluate_input("d = 4;")
+    return "entries={0}, hits={1}, misses={2}, evictions={3}, statements={4}".format(
+        len(cache), cache.hits, cache.misses, cache.evictions, len(cached.assignments))
+
+
+# Redefining a cell of a model recomputes it and its dependents only, and
+# leaves the same Symbol Table as a full run of the redefined model, while a
+# redefinition that fails leaves the model and the Symbol Table as they were.
+def _test_redefinition():
+
+    model = "rate = 4 + 5; kite = 5; flight = rate + kite; other = 7; total = flight * 2;"
+    interpreter = Interpreter()
+    interpreter.define(model)
+    recomputed = interpreter.define("kite = 6;")
+
+    full = Interpreter()
+    full.evaluate_input(model.replace("kite = 5;", "kite = 6;"))
+    same = interpreter.symbol_table == full.symbol_table and \
+        list(interpreter.symbol_table) == list(full.symbol_table)
+
+    try:
+        interpreter.define("rate = 2; kite = 1 / (rate - 2);")
+        failure = "no error"
+    except ZeroDivisionError:
+        failure = interpreter.stringed_output()
+    interpreter.define("rate = 1;")
+
+    return "recomputed {0}; same as a full run: {1}; after failure: {2}; then: {3}".format(
+        ", ".join(recomputed), same, failure, interpreter.stringed_output())
+
+
+# A batch evaluates a program for every row of its columns, for both dtypes,
+# and flags the rows that fail in its error mask, while a program that reads
+# an undefined variable fails as a whole. Returns None without NumPy.
+def _test_batch():
+
+    try:
+        _import_numpy()
+    except ImportError:
+        return None
+
+    interpreter = Interpreter()
+    outputs = []
+    for dtype in ('int64', object):
+        result = interpreter.evaluate_batch("flight = rate / kite; total = flight * 2 - 1;",
+                                            {'rate': [9, 4, -7], 'kite': [2, 0, 1]}, dtype)
+        rows = ["error" if error else "flight = {0}, total = {1}".format(flight, total)
+                for (flight, total, error) in zip(result.columns['flight'], result.columns['total'], result.errors)]
+        outputs.append("; ".join(rows))
+    try:
+        interpreter.evaluate_batch("x = y;", {'z': [1, 2]})
+    except InterpreterUninitializedVariableError as err:
+        outputs.append("uninitialized variable error: {0}".format(err))
+    try:
+        interpreter.evaluate_batch("y = x + 99999999999999999999;", {'x': [1, 2]}, 'int64')
+    except ValueError as err:
+        outputs.append("value error: {0}".format(err))
+    return " | ".join(outputs)
+
+
+# Independent programs, and program files, are evaluated by worker processes,
+# in order or not, and the error of one program does not affect the others.
+def _test_programs():
+    import tempfile
+
+    programs = ["x = 1;", ("second", "y = x;"), "z = 2 * 3;", "w = (1;"]
+    ordered = [str(result) for result in evaluate_programs(programs, processes=2, chunk_size=1)]
+    unordered = sorted(evaluate_programs(programs, processes=2, chunk_size=1, ordered=False),
+                       key=lambda result: result.index)
+    if [str(result) for result in unordered] != ordered:
+        return "unordered results differ: {0}".format(unordered)
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for (index, source) in enumerate(("a = 4 / 3;", "b = a;")):
+            paths.append(os.path.join(directory, "{0}.toy".format(index)))
+            with open(paths[-1], "w") as file:
+                file.write(source)
+        paths.append(os.path.join(directory, "missing.toy"))
+        files = [result.output() for result in evaluate_files(paths, processes=2)]
+
+    return "; ".join(ordered + files[:2] + [files[2].split(":")[0]])
+
+
+# Threads that share a ParseCache, as the sessions of an EvaluationServer
+# do, never lose count of the bytes it holds. Threads are switched as often
+# as possible to expose races.
+def _test_shared_parse_cache():
+    import concurrent.futures
+
+    cache = ParseCache(max_entries=16)
+
+    def use(seed):
+        for index in range(20000):
+            key = (seed + index) % 24
+            if cache.get(key) is None:
+                cache.put(key, (), key + 1)
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            list(executor.map(use, range(8)))
+    finally:
+        sys.setswitchinterval(switch_interval)
+    return "entries={0}, bytes consistent: {1}".format(
+        len(cache), cache.nbytes == sum(size for (_, size) in cache.entries.values()))
+
+
+# Sessions of the EvaluationServer have Symbol Tables of their own, and long
+# programs are evaluated in its executor.
+def _test_server():
+    import asyncio
+
+    async def converse(port, lines):
+        (reader, writer) = await asyncio.open_connection("127.0.0.1", port)
+        answers = []
+        for line in lines:
+            writer.write(line.encode("utf-8") + b"\n")
+            answers.append((await reader.readline()).decode("utf-8").rstrip("\n"))
+        writer.write(b"exit\n")
+        await writer.drain()
+        writer.close()
+        return "; ".join(answers)
+
+    async def serve():
+        server = EvaluationServer(executor_threshold=16, parse_cache=ParseCache())
+        await server.start("127.0.0.1", 0)
+        port = server.server.sockets[0].getsockname()[1]
         try:
-            terminal = input('uNiCoRn> ')
-        except EOFError:
-            break
+            return await asyncio.gather(converse(port, ["x = 1;", "y = x + 1 + 2 + 3 + 4 + 5;", "symbols"]),
+                                        converse(port, ["y = x;", "incremental", "x = 5; y = x;", "x = 6;"]))
+        finally:
+            server.close()
+            await server.wait_closed()
+            server.executor.shutdown()
+
+    return " | ".join(asyncio.run(serve()))
+
+
+# Stats count the programs, cache hits, tokens, nodes and statement
+# evaluations of the programs evaluated, and time the phases.
+def _test_stats():
+
+    interpreter = Interpreter(ParseCache())
+    stats = interpreter.enable_stats()
+    for engine in (ENGINE_TREE, ENGINE_VM):
+        for _ in range(2):
+            interpreter.evaluate_input("x = 1; y = (x + 2) * -x;", engine)
+    interpreter.disable_stats()
+    interpreter.evaluate_input("z = 3;")
+
+    return "programs={0}, cache_hits={1}, tokens={2}, max_depth={3}, nodes={4}, statements={5}, phases={6}".format(
+        stats.programs, stats.cache_hits, stats.tokens, stats.max_depth,
+        ", ".join("{0} {1}".format(name, count) for (name, count) in sorted(stats.nodes.items())),
+        ", ".join("{0} x{1}".format(key, count) for (key, (count, _)) in stats.statements.items()),
+        ", ".join("{0} x{1}".format(phase, calls) for (phase, (calls, _)) in stats.phases.items()))
+
+
+# A file that is evaluated is no longer mapped once it has been parsed, so it
+# may be rewritten while its AST is still in use.
+def _test_file_mapping():
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program.toy")
+        with open(path, "w") as file:
+            file.write("rate = 4 + 5;\nkite = rate * 2;\n")
+        interpreter = Interpreter()
+        prog = interpreter.evaluate_file(path)
+        with open(path, "w"):
+            pass
+        right = prog.assignments[1].right
+        return "{0}; tokens left: {1}; kite = {2} {3} {4}".format(
+            interpreter.stringed_output(), len(interpreter.lexer.tokens), right.left.value, right.token.value,
+            right.right.value)
+
+
+# A snapshot restores big values, and every corruption of a snapshot, here
+# each of its truncations and a big value index beyond its variables, is
+# reported as a ValueError.
+def _test_snapshots():
+
+    interpreter = Interpreter()
+    interpreter.evaluate_input("a = 1; b = 99999999999 * 99999999999; c = -a;")
+    snapshot = io.BytesIO()
+    interpreter.save_state(snapshot)
+    data = snapshot.getvalue()
+    interpreter.reset()
+    interpreter.load_state(io.BytesIO(data))
+    restored = interpreter.stringed_output()
+
+    # The snapshot ends with the big value count, the index and size of the
+    # only big value and its bytes.
+    size = (interpreter.symbol_table['b'].bit_length() + 8) // 8
+    index_position = len(data) - size - 2
+    corrupt = [data[:size] for size in range(len(data))]
+    corrupt.append(data[:index_position] + b'\x07' + data[index_position + 1:])
+    errors = set()
+    for data in corrupt:
+        try:
+            interpreter.load_state(io.BytesIO(data))
+            errors.add("no error")
+        except ValueError:
+            errors.add("ValueError")
+    return "{0}; {1}".format(restored, ", ".join(sorted(errors)))
+
+
+# The integer and int64 arithmetic modes truncate every division, and int64
+# arithmetic wraps around on overflow, whether programs run on the Virtual
+# Machine or are walked with their common subexpressions shared.
+def _test_arithmetic():
+
+    programs = [
+        "x = 7 / 2 * 2; y = -7 / 2;",
+        "x = 9223372036854775807 + 1; y = x - 1;",
+        "x = 0 - 9223372036854775807 - 1; y = x / -1; z = -x;",
+        "x = 4294967296 * 4294967296 + 18446744073709551615; y = x * 2 / 3;",
+        "x = 1 / (4294967296 * 4294967296);",
+    ]
+    interpreter = Interpreter()
+    outputs = []
+    for arithmetic in (ARITHMETIC_INTEGER, ARITHMETIC_INT64):
+        for program_text in programs:
+            results = set()
+            for cse in (False, True):
+                interpreter.reset()
+                try:
+                    interpreter.evaluate_input(program_text, arithmetic=arithmetic, cse=cse)
+                    results.add(interpreter.stringed_output())
+                except ZeroDivisionError:
+                    results.add("division by zero")
+            outputs.append(" / ".join(sorted(results)))
+    return "; ".join(outputs)
+
+
+def _test_pruning():
+
+    cases = [
+        ("a = 1; b = 2; c = a + 1;", {"outputs": ['c']}),
+        ("a = 1; b = z; c = a * 3;", {"outputs": ['c']}),
+        ("a = 1; a = 2; b = a; b = -a;", {"prune": True}),
+    ]
+    interpreter = Interpreter()
+    outputs = []
+    for (program_text, options) in cases:
+        results = set()
+        for engine in ENGINES:
+            interpreter.reset()
+            interpreter.evaluate_input(program_text, engine, **options)
+            results.add("{0} ({1} skipped)".format(interpreter.stringed_output(), interpreter.skipped_statements))
+        outputs.append(" / ".join(sorted(results)))
+    return "; ".join(outputs)
+
+
+def _test_run_main():
+    import tempfile
+
+    runs = [
+        (["first.toy"], ""),
+        (["first.toy", "second.toy", "--engine", "vm"], ""),
+        (["first.toy", "second.toy", "--output", "json"], ""),
+        (["-", "--arithmetic", "integer"], "y = 7 / 2;"),
+    ]
+    outputs = []
+    with tempfile.TemporaryDirectory() as directory:
+        for (name, text) in (("first.toy", "x = 1; y = x * 2;"), ("second.toy", "z = w;")):
+            with open(os.path.join(directory, name), "w") as file:
+                file.write(text)
+        for (args, standard_input) in runs:
+            args = [arg if not arg.endswith(".toy") else os.path.join(directory, arg) for arg in args]
+            (stdin, stdout, stderr) = (sys.stdin, io.StringIO(), io.StringIO())
+            sys.stdin = io.StringIO(standard_input)
+            try:
+                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                    status = run_main(args)
+            finally:
+                sys.stdin = stdin
+            text = (stdout.getvalue() + stderr.getvalue()).replace(directory + os.sep, "")
+            outputs.append("{0}: {1}".format(status, text.strip().replace("\n", " | ")))
+    return "; ".join(outputs)
+
+
+def _test_trace():
+
+    programs = [
+        ("x = 2; y = -(x + 1) * x;", ARITHMETIC_FLOAT),
+        ("x = 9223372036854775807; y = x + 1;", ARITHMETIC_INT64),
+    ]
+    interpreter = Interpreter()
+    outputs = []
+    for (program_text, arithmetic) in programs:
+        results = set()
+        for engine in ENGINES:
+            interpreter.reset()
+            recorder = TraceRecorder()
+            recorder.attach(interpreter)
+            interpreter.evaluate_input(program_text, engine, arithmetic=arithmetic)
+            recorder.detach(interpreter)
+            results.add(recorder.format().replace("\n", ", "))
+        outputs.append(" / ".join(sorted(results)))
+
+    recorder = TraceRecorder(3, (EVENT_READ, EVENT_WRITE))
+    recorder.attach(interpreter)
+    interpreter.evaluate_input("a = 1; b = a; c = b + a;")
+    recorder.detach(interpreter)
+    interpreter.evaluate_input("d = 1;")
+    outputs.append(recorder.format().replace("\n", ", "))
+    return "; ".join(outputs)
+
+
+# Every option of evaluate_input() is honoured whatever the others: stats
+# are recorded and hooks called on every path, or the combination is
+# rejected with a ValueError.
+def _test_options():
+
+    runs = [
+        {"arithmetic": ARITHMETIC_INT64},
+        {"cse": True},
+        {"outputs": ['y'], "engine": ENGINE_VM},
+        {"prune": True, "cse": True},
+    ]
+    outputs = []
+    for options in runs:
+        for traced in (False, True):
+            interpreter = Interpreter(ParseCache())
+            stats = interpreter.enable_stats()
+            recorder = TraceRecorder(events=(EVENT_NODE, EVENT_WRITE))
+            if traced:
+                recorder.attach(interpreter)
+            for _ in range(2):
+                interpreter.reset()
+                interpreter.evaluate_input("z = 7; x = 2 + 3; y = (x + 1) * (x + 1); x = y; z = x;", **options)
+            outputs.append("{0} (programs={1}, cache_hits={2}, skipped_statements={3}, statements={4}, events={5})".format(
+                interpreter.stringed_output(), stats.programs, stats.cache_hits, stats.skipped_statements,
+                sum(count for (count, _) in stats.statements.values()), len(recorder)))
+
+    rejected = [
+        {"compact": True, "cse": True},
+        {"compact": True, "prune": True},
+        {"engine": ENGINE_VM, "cse": True},
+        {"optimize": True, "arithmetic": ARITHMETIC_INT64},
+        {"arithmetic": "decimal"},
+    ]
+    for options in rejected:
+        try:
+            Interpreter().evaluate_input("x = 1;", **options)
+            outputs.append("accepted")
+        except ValueError as err:
+            outputs.append(str(err))
+    return "; ".join(outputs)
+
+
+def test_driver():
+    import concurrent.futures
+    import tempfile
+
+    program = "program"
+    expected = "expected"
+    programs = [
+        {program: "eval = 3;",  expected: "eval = 3"},
+        {program: "eval = 5 +7;",   expected: "eval = 12"},
+        {program: "eval = 7- 5;",   expected: "eval = 2"},
+        {program: "eval = 5+7;",    expected: "eval = 12"},
+        {program: "eval = 7-5;",    expected: "eval = 2"},
+        {program: "eval = 5 + 7;",      expected: "eval = 12"},
+        {program: "eval = 7 - 5;",      expected: "eval = 2"},
+        {program: "eval = 27+11;",      expected: "eval = 38"},
+        {program: "eval = 11+22;",      expected: "eval = 33"},
+        {program: "eval = 27+ 11;",     expected: "eval = 38"},
+        {program: "eval = 11 +22;",     expected: "eval = 33"},
+        {program: "eval = 27 + 11;",    expected: "eval = 38"},
+        {program: "eval = 11 + 22;",    expected: "eval = 33"},
+        {program: "eval = 22 + 1;",     expected: "eval = 23"},
+        {program: "eval = 1 + 22;",     expected: "eval = 23"},
+        {program: "eval = 1 + 2 + 3;",      expected: "eval = 6"},
+        {program: "eval = 11 + 2 + 30;",    expected: "eval = 43"},
+        {program: "eval = 11 + 2 + 30 + 4;",    expected: "eval = 47"},
+        {program: "eval = 11 - 2 + 30 - 4;",    expected: "eval = 35"},
+        {program: "eval = 11-2+30-4;",          expected: "eval = 35"},
+        {program: "eval = 7 * 4 / 2;",          expected: "eval = 14"},
+        {program: "eval = 7 * 4 / 2 * 3;",      expected: "eval = 42"},
+        {program: "eval = 10 * 4  * 2 * 3 / 8;",    expected: "eval = 30"},
+        {program: "eval = 14 + 2 * 3 - 6 / 2;",     expected: "eval = 17"},
+        {program: "eval = 2 + 7 * 4;",              expected: "eval = 30"},
+        {program: "eval = 7 - 8 / 4;",              expected: "eval = 5"},
+        {program: "eval = (14 + 2) * (9 - 3) / 3;", expected: "eval = 32"},
+        {program: "eval = (2 + 7) * 4;",            expected: "eval = 36"},
+        {program: "eval = (1 - 9) / 4;",            expected: "eval = -2"},
+        {program: "eval = 7 + 3 * (10 / (12 / (3 + 1) - 1));",  expected: "eval = 22"},
+        {program: "eval = 7 + (((3 + 2)));",                    expected: "eval = 12"},
+        {program: "eval = 7 + 3 * (10 / (12 / (3 + 1) - 1)) / (2 + 3) - 5 - 3 + (8);", expected: "eval = 10"},
+        {program: "eval = - 3;",    expected: "eval = -3"},
+        {program: "eval = + 3;",    expected: "eval = 3"},
+        {program: "eval = - - - 5 + - 3;",              expected: "eval = -8"},
+        {program: "eval = - - - - 5 + - 3;",            expected: "eval = 2"},
+        {program: "eval = 5 - - - + - 3;",              expected: "eval = 8"},
+        {program: "eval = 5 - - - + - (3 + 4) - +2;",   expected: "eval = 10"},
+        {program: "rate = 4 + 5; kite = 5; flight = rate + kite;",  expected: "rate = 9, kite = 5, flight = 14"},
+        {program: "x = 1; y = 2; z = ---(x+y)*(x+-y);", expected: "x = 1, y = 2, z = 3"},
+        {program: "x = 0 y = x; z = ---(x+y);",     expected: "syntax error"},
+        {program: "x = 0; y = x; z = ---(x+y));",   expected: "syntax error"},
+        {program: "x_2 = 0;",       expected: "x_2 = 0"},
+        {program: "x = 001;",       expected: "syntax error"},
+        {program: "_2 = 0;",        expected: "syntax error"},
+        {program: "0x = 11;",       expected: "syntax error"},
+        {program: "3 = 11;",        expected: "syntax error"},
+        {program: "_ = 11;",        expected: "syntax error"},
+        {program: "x123a = 21;",    expected: "x123a = 21"},
+        {program: "x = y;",         expected: "uninitialized variable error: 'y' is undefined."},
+        {program: "x = x;",         expected: "uninitialized variable error: 'x' is undefined."},
+        {program: "x = y;",         expected: "uninitialized variable error: 'y' is undefined."},
+        {program: "x = 56; y = x + z;",             expected: "uninitialized variable error: 'z' is undefined."},
+        {program: "x = 56; y = t + v;",             expected: "uninitialized variable error: 't' is undefined."},
+        {program: "x = 56; y = (x + (z));",         expected: "uninitialized variable error: 'z' is undefined."},
+        {program: "rate = 4; time = rate + speed;", expected: "uninitialized variable error: 'speed' is undefined."},
+        {program: "\n rate = 4 + 5; \n kite = 5; \n flight = rate + kite; \n", expected: "rate = 9, kite = 5, flight = 14"},
+        {program: "x = 7 / 2 * 2;",                 expected: "x = 7"},
+        {program: "x = 1; y = x / (x - 1);",        expected: "unknown error"},
+        {program: "x = 5; y = x + 1 / (2 - 2);",    expected: "unknown error"},
+        {program: "x = 5; y = - - x * (3 - 2) + 0;",    expected: "x = 5, y = 5"},
+        {program: "x = 9 / 2 * 2 + 0; y = x * (4 / 4);", expected: "x = 9, y = 9"},
+        {program: "x = (0 + y) * 1 - 0;",           expected: "uninitialized variable error: 'y' is undefined."},
+        {program: "x = 1; y = 2; x = y + 1; y = x;", expected: "x = 3, y = 3"},
+        {program: "x = 2; y = (x + 1) * (x + 1); x = (x + 1) * 3; z = (x + 1) + y;", expected: "x = 9, y = 9, z = 19"},
+    ]
+
+    failed_tests = 0
+    passed_tests = 0
+    print(BCOLORS.OKBLUE, "\n:: BEGIN TESTS ::\n", BCOLORS.ENDC)
+
+    # Every program is run twice; the second run is served from the parse cache.
+    # Parallel programs share a pool of worker processes, and cached programs
+    # are written to a file of a temporary directory, whose ProgramCache
+    # follows the changes of the file.
+    interpreter = Interpreter(ParseCache(), ProgramCache())
+    persistent_interpreter = Interpreter(ParseCache(), persistent=True)
+    recorder = TraceRecorder(64)
+    executor = concurrent.futures.ProcessPoolExecutor(2)
+    directory = tempfile.TemporaryDirectory()
+    program_path = os.path.join(directory.name, "program.toy")
+    for (repeated, program_pkg) in itertools.product((False, True), programs):
+        for (engine, optimize, form) in itertools.product(ENGINES, (False, True), ("input", "compact", "stream", "compiled", "defined", "profiled", "restored", "exact", "parallel", "pruned", "cached", "transactional", "traced", "shared")):
+
+            # Compiled programs run as Python code, and traced and shared
+            # programs by walking their AST, whatever the engine.
+            # Defined programs run on the dependency graph, restored ones
+            # through a snapshot, exact ones with exact arithmetic and
+            # parallel ones on the statement DAG, all unoptimized.
+            if form in ("compiled", "traced", "shared") and engine != ENGINE_TREE:
+                continue
+            if form in ("defined", "restored", "exact", "parallel") and (engine != ENGINE_TREE or optimize):
+                continue
+
+            interpreter.reset()
+
+            mode = engine + (" optimized " if optimize else " ") + form + (" repeated" if repeated else "")
+            output = ""
+            prog = None
+
+            try:
+                if form == "stream":
+                    # Small chunks split lexemes across chunk boundaries.
+                    source = program_pkg[program]
+                    chunks = [source[i:i + 3] for i in range(0, len(source), 3)]
+                    for _ in interpreter.evaluate_stream(chunks, engine, optimize):
+                        pass
+                elif form == "compiled":
+                    interpreter.compile(program_pkg[program], optimize)(interpreter.symbol_table)
+                elif form == "defined":
+                    interpreter.define(program_pkg[program])
+                elif form == "restored":
+                    # The state is saved to a snapshot and loaded back.
+                    snapshot = io.BytesIO()
+                    try:
+                        interpreter.evaluate_input(program_pkg[program])
+                    finally:
+                        interpreter.save_state(snapshot)
+                        snapshot.seek(0)
+                        interpreter.load_state(snapshot)
+                elif form == "shared":
+                    prog = interpreter.evaluate_input(program_pkg[program], engine, optimize, cse=True)
+                elif form == "traced":
+                    recorder.attach(interpreter)
+                    try:
+                        prog = interpreter.evaluate_input(program_pkg[program], engine, optimize)
+                    finally:
+                        recorder.detach(interpreter)
+                elif form == "transactional":
+                    # The output is taken from the persistent Symbol Table,
+                    # which a failed program must leave empty.
+                    persistent_interpreter.reset()
+                    interpreter.symbol_table = persistent_interpreter.symbol_table
+                    prog = persistent_interpreter.evaluate_input(program_pkg[program], engine, optimize)
+                elif form == "cached":
+                    with open(program_path, "w") as file:
+                        file.write(program_pkg[program])
+                    prog = interpreter.evaluate_file(program_path, engine, optimize)
+                elif form == "pruned":
+                    prog = interpreter.evaluate_input(program_pkg[program], engine, optimize, prune=True)
+                elif form == "parallel":
+                    prog = interpreter.evaluate_parallel(program_pkg[program], executor=executor)
+                elif form == "exact":
+                    prog = interpreter.evaluate_input(program_pkg[program], arithmetic=ARITHMETIC_EXACT)
+                elif form == "profiled":
+                    interpreter.enable_stats()
+                    try:
+                        prog = interpreter.evaluate_input(program_pkg[program], engine, optimize)
+                    finally:
+                        interpreter.disable_stats()
+                else:
+                    prog = interpreter.evaluate_input(program_pkg[program], engine, optimize, form == "compact")
+                output = interpreter.stringed_output()
+            except InterpreterSyntaxError:
+                output = "syntax error"
+            except InterpreterUninitializedVariableError as err:
+                output = "uninitialized variable error: {0}".format(err)
+            except:
+                output = "unknown error"
+
+            if form == "transactional" and prog is None and interpreter.symbol_table:
+                output += " after partial updates"
+
+            if str(output) != str(program_pkg[expected]):
+                print(BCOLORS.FAIL, "Test: <Failed> Mode:", mode, "Input:", program_pkg[program],
+                      "\n\t:: Expected:", program_pkg[expected], "\n\t::   Actual:", output, BCOLORS.ENDC)
+                failed_tests += 1
+                print(interpreter.lexer.tokens)
+                interpreter.show_tree_heirarchy(prog)
+            else:
+                print(BCOLORS.OKGREEN, "Test: <Passed> Mode:", mode, "Input:", program_pkg[program],
+                      ":: Output:", output, BCOLORS.ENDC)
+                passed_tests += 1
+
+    # Every check exercises a feature beyond the output of a single program
+    # and returns its own output, which is compared to the expected one, or
+    # None if it can not run here, e.g. without NumPy.
+    check = "check"
+    checks = [
+        {program: "interleaved stream", check: _test_interleaved_stream, expected: "a = 1, q = 30, b = 2, c = 3"},
+        {program: "parse cache", check: _test_parse_cache,
+         expected: "entries=2, hits=2, misses=5, evictions=3, statements=1"},
+        {program: "redefinition", check: _test_redefinition,
+         expected: "recomputed kite, flight, total; same as a full run: True; "
+                   "after failure: rate = 9, kite = 6, flight = 15, other = 7, total = 30; "
+                   "then: rate = 1, kite = 6, flight = 7, other = 7, total = 14"},
+        {program: "batch", check: _test_batch,
+         expected: "flight = 4, total = 7; error; flight = -7, total = -15 | "
+                   "flight = 4, total = 7; error; flight = -7, total = -15 | "
+                   "uninitialized variable error: 'y' is undefined. | "
+                   "value error: literal 99999999999999999999 does not fit in dtype int64"},
+        {program: "batch of programs", check: _test_programs,
+         expected: "ProgramResult(0: x = 1); ProgramResult(second: uninitialized variable error: 'x' is undefined.); "
+                   "ProgramResult(2: z = 6); ProgramResult(3: syntax error); a = 1; "
+                   "uninitialized variable error: 'a' is undefined.; could not read program"},
+        {program: "stats", check: _test_stats,
+         expected: "programs=4, cache_hits=2, tokens=30, max_depth=3, "
+                   "nodes=Assign 8, BinOp 8, Id 16, Num 8, Program 4, UnaryOp 4, statements=x@1:0 x4, y@1:7 x4, "
+                   "phases=lex x2, parse x2, evaluate x4, compile x1"},
+        {program: "file mapping", check: _test_file_mapping,
+         expected: "rate = 9, kite = 18; tokens left: 0; kite = rate * 2"},
+        {program: "snapshots", check: _test_snapshots,
+         expected: "a = 1, b = 9999999999800000000001, c = -1; ValueError"},
+        {program: "integer arithmetic", check: _test_arithmetic,
+         expected: "x = 6, y = -3; x = 9223372036854775808, y = 9223372036854775807; "
+                   "x = -9223372036854775808, y = 9223372036854775808, z = 9223372036854775808; "
+                   "x = 36893488147419103231, y = 24595658764946068820; x = 0; "
+                   "x = 6, y = -3; x = -9223372036854775808, y = 9223372036854775807; "
+                   "x = -9223372036854775808, y = -9223372036854775808, z = -9223372036854775808; "
+                   "x = -1, y = 0; division by zero"},
+        {program: "pruning", check: _test_pruning,
+         expected: "a = 1, c = 2 (1 skipped); a = 1, c = 3 (1 skipped); a = 2, b = -2 (2 skipped)"},
+        {program: "shared parse cache", check: _test_shared_parse_cache,
+         expected: "entries=16, bytes consistent: True"},
+        {program: "server", check: _test_server,
+         expected: "x = 1; x = 1, y = 16; x = 1, y = 16 | uninitialized variable error: 'x' is undefined.; "
+                   "incremental mode on; x = 5, y = 5; x = 6, y = 6"},
+        {program: "run main", check: _test_run_main,
+         expected: "0: x = 1 | y = 2; "
+                   "1: first.toy: x = 1, y = 2 | second.toy: uninitialized variable error: 'w' is undefined.; "
+                   "1: {\"file\": \"first.toy\", \"symbols\": {\"x\": 1, \"y\": 2}, \"error\": null} | "
+                   "{\"file\": \"second.toy\", \"symbols\": {}, "
+                   "\"error\": \"uninitialized variable error: 'w' is undefined.\"}; 0: y = 3"},
+        {program: "trace", check: _test_trace,
+         expected: "statement_start 0 Assign('='), node Num('2') 2, write x 2, statement_end 0 Assign('=') 2, "
+                   "statement_start 1 Assign('='), read x 2, node Id('x') 2, node Num('1') 1, node BinOp('+') 3, "
+                   "node UnaryOp('-') -3, read x 2, node Id('x') 2, node BinOp('*') -6, write y -6, "
+                   "statement_end 1 Assign('=') -6; "
+                   "statement_start 0 Assign('='), node Num('9223372036854775807') 9223372036854775807, "
+                   "write x 9223372036854775807, statement_end 0 Assign('=') 9223372036854775807, "
+                   "statement_start 1 Assign('='), read x 9223372036854775807, node Id('x') 9223372036854775807, "
+                   "node Num('1') 1, node BinOp('+') -9223372036854775808, write y -9223372036854775808, "
+                   "statement_end 1 Assign('=') -9223372036854775808; read b 1, read a 1, write c 2"},
+        {program: "options", check: _test_options,
+         expected: "z = 36, x = 36, y = 36 (programs=2, cache_hits=1, skipped_statements=0, statements=10, events=0); "
+                   "z = 36, x = 36, y = 36 (programs=2, cache_hits=1, skipped_statements=0, statements=10, events=36); "
+                   "z = 36, x = 36, y = 36 (programs=2, cache_hits=1, skipped_statements=0, statements=10, events=0); "
+                   "z = 36, x = 36, y = 36 (programs=2, cache_hits=1, skipped_statements=0, statements=10, events=32); "
+                   "x = 5, y = 36 (programs=2, cache_hits=1, skipped_statements=6, statements=0, events=0); "
+                   "x = 5, y = 36 (programs=2, cache_hits=1, skipped_statements=6, statements=4, events=24); "
+                   "z = 36, x = 36, y = 36 (programs=2, cache_hits=1, skipped_statements=2, statements=8, events=0); "
+                   "z = 36, x = 36, y = 36 (programs=2, cache_hits=1, skipped_statements=2, statements=8, events=28); "
+                   "compact programs can not be shared; compact programs can not be pruned; "
+                   "shared programs can only be evaluated by the tree engine; "
+                   "int64 arithmetic can not be optimized; unknown arithmetic 'decimal'"},
+    ]
+
+    for check_pkg in checks:
+        mode = "check"
+        try:
+            output = check_pkg[check]()
+        except Exception as err:
+            output = "{0}: {1}".format(type(err).__name__, err)
+
+        if output is None:
+            print(BCOLORS.WARNING, "Test: <Skipped> Mode:", mode, "Input:", check_pkg[program], BCOLORS.ENDC)
+        elif str(output) != str(check_pkg[expected]):
+            print(BCOLORS.FAIL, "Test: <Failed> Mode:", mode, "Input:", check_pkg[program],
+                  "\n\t:: Expected:", check_pkg[expected], "\n\t::   Actual:", output, BCOLORS.ENDC)
+            failed_tests += 1
+        else:
+            print(BCOLORS.OKGREEN, "Test: <Passed> Mode:", mode, "Input:", check_pkg[program],
+                  ":: Output:", output, BCOLORS.ENDC)
+            passed_tests += 1
+
+    executor.shutdown()
+    directory.cleanup()
+    print(BCOLORS.HEADER, "\n\tSTATISTICS: Failed = "+str(failed_tests)+", Passed = "+str(passed_tests), BCOLORS.ENDC)
+    print(BCOLORS.OKBLUE, "\n:: END TESTS ::", BCOLORS.ENDC)
+
+
+# Evaluates the program files given on the command line, or every file in
+# the directories given, in a pool of worker processes and prints the output
+# of each program, prefixed by its path. For instance:
+#
+#   python Interpreter.py --batch programs/ --processes 8 --unordered
+#
+# Returns 1 if any program failed and 0 otherwise.
+def batch_main(args):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="Interpreter.py --batch",
+                                     description="Evaluate many toy programs in parallel.")
+    parser.add_argument("paths", nargs="+", help="program files, or directories of program files")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="programs sent to a worker at a time")
+    parser.add_argument("--unordered", action="store_true", help="print results as soon as they are evaluated")
+    parser.add_argument("--engine", choices=ENGINES, default=ENGINE_TREE)
+    parser.add_argument("--optimize", action="store_true")
+    parser.add_argument("--cache", action="store_true", help="save parsed programs in __toycache__ directories")
+    parser.add_argument("--cache-dir", default=None, help="save parsed programs in this directory")
+    options = parser.parse_args(args)
+
+    program_cache = None
+    if options.cache or options.cache_dir:
+        program_cache = ProgramCache(options.cache_dir)
+
+    paths = []
+    for path in options.paths:
+        if os.path.isdir(path):
+            paths.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if os.path.isfile(os.path.join(path, name)))
+        else:
+            paths.append(path)
+
+    failed = 0
+    for result in evaluate_files(paths, options.processes, options.chunk_size, not options.unordered,
+                                 options.engine, options.optimize, program_cache):
+        if result.error is not None:
+            failed += 1
+        print("{0}: {1}".format(result.name, result.output()))
+
+    return 1 if failed else 0
+
+
+# A Session is the state of one user of the interpreter, i.e. an Interpreter
+# and whether it is in incremental mode, and executes the commands that the
+# user enters:
+#
+#   reset         resets the interpreter's state.
+#   symbols       shows the variables of the Symbol Table.
+#   incremental   toggles incremental mode, in which every input defines, or
+#                 redefines, variables like the cells of a spreadsheet, so
+#                 that redefining a variable also recomputes every variable
+#                 that depends on it.
+#
+# Any other input is a program to be evaluated. The variables are shown one
+# per line or, when multiline is False, on a single line.
+class Session(object):
+    def __init__(self, parse_cache=None, multiline=True):
+        self.interpreter = Interpreter(parse_cache)
+        self.incremental = False
+        self.multiline = multiline
+
+    def _output(self):
+        if self.multiline:
+            return self.interpreter.normal_output()
+        return self.interpreter.stringed_output()
+
+    # Executes a command and returns its output.
+    def execute(self, terminal):
+
+        interpreter = self.interpreter
         if not terminal:
-            print("Accpeted Format:[0..9][+,-][0..9]")
-            continue
+            return "Accpeted Format:[0..9][+,-][0..9]"
 
         output = ""
 
-        if terminal == "exit":
-            break
-
-        elif terminal == "reset":
+        if terminal == "reset":
             try:
                 interpreter.reset()
             except:
@@ -608,17 +4998,21 @@ def main():
 
         elif terminal == "symbols":
             try:
-                output = interpreter.normal_output()
+                output = self._output()
             except:
                 output = "error -- could not get symbols"
 
-        elif terminal == "test":
-            test_driver()
+        elif terminal == "incremental":
+            self.incremental = not self.incremental
+            output = "incremental mode " + ("on" if self.incremental else "off")
 
         else:
             try:
-                interpreter.evaluate_input(terminal)
-                output = interpreter.normal_output()
+                if self.incremental:
+                    interpreter.define(terminal)
+                else:
+                    interpreter.evaluate_input(terminal)
+                output = self._output()
             except InterpreterSyntaxError:
                 output = "syntax error"
             except InterpreterUninitializedVariableError as err:
@@ -626,7 +5020,261 @@ def main():
             except:
                 output = "unknown error"
 
-        print(output)
+        return output
+
+
+# Evaluation server settings
+#
+# A session that sends nothing for IDLE_TIMEOUT seconds is closed, a line may
+# hold at most MAX_LINE_LENGTH characters, and programs longer than
+# EXECUTOR_THRESHOLD characters are evaluated in the server's executor.
+IDLE_TIMEOUT = 300
+MAX_LINE_LENGTH = 1024 * 1024
+EXECUTOR_THRESHOLD = 4 * 1024
+
+
+# This is the Evaluation Server.
+# The job of the evaluation server is to serve the interpreter to many
+# concurrent users over TCP, or a Unix socket, with asyncio. Every connection
+# is a Session with its own Interpreter and Symbol Table, that speaks a line
+# protocol: each line sent is a command of the Session, or "exit" to close
+# the connection, and is answered by one line of output. For instance:
+#
+#   server = EvaluationServer()
+#   asyncio.run(server.serve_forever(port=7777))
+#
+# A session handles its lines one at a time and waits for each answer to be
+# sent before reading the next line, so that a client that sends faster than
+# it reads is held back by TCP flow control instead of filling the server's
+# memory. Sessions that stay idle for idle_timeout seconds are evicted.
+#
+# Long programs are evaluated in an executor, by default a pool of threads,
+# so that the event loop keeps serving the other sessions while they run.
+class EvaluationServer(object):
+    def __init__(self, executor=None, idle_timeout=IDLE_TIMEOUT, max_line_length=MAX_LINE_LENGTH,
+                 executor_threshold=EXECUTOR_THRESHOLD, parse_cache=None):
+        import concurrent.futures
+
+        self.executor = executor or concurrent.futures.ThreadPoolExecutor()
+        self.idle_timeout = idle_timeout
+        self.max_line_length = max_line_length
+        self.executor_threshold = executor_threshold
+        self.parse_cache = parse_cache
+        self.sessions = {}
+        self.tasks = set()
+        self.server = None
+
+    # Starts listening on a TCP host and port or, when path is given, on a
+    # Unix socket.
+    async def start(self, host=None, port=None, path=None):
+        import asyncio
+
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self._serve, path, limit=self.max_line_length)
+        else:
+            self.server = await asyncio.start_server(self._serve, host, port, limit=self.max_line_length)
+        return self.server
+
+    # Stops listening and closes every session.
+    def close(self):
+
+        if self.server is not None:
+            self.server.close()
+        for writer in list(self.sessions.values()):
+            writer.close()
+
+    async def wait_closed(self):
+
+        if self.server is not None:
+            await self.server.wait_closed()
+
+    # Starts listening, as start() does, and serves until the server is
+    # closed or the task is cancelled, and then closes every session and
+    # waits for them to end.
+    async def serve_forever(self, host=None, port=None, path=None):
+        import asyncio
+
+        await self.start(host, port, path)
+        try:
+            await self.server.serve_forever()
+        finally:
+            self.close()
+            await self.wait_closed()
+            if self.tasks:
+                await asyncio.wait(list(self.tasks))
+
+    async def _serve(self, reader, writer):
+        import asyncio
+
+        session = Session(self.parse_cache, multiline=False)
+        self.sessions[session] = writer
+        self.tasks.add(asyncio.current_task())
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    writer.write(b"idle timeout\n")
+                    break
+                except ValueError:
+                    # The line exceeded the stream's limit and can not be
+                    # skipped reliably, so the session ends.
+                    writer.write(b"error -- line too long\n")
+                    break
+                if not line:
+                    break
+
+                terminal = line.decode("utf-8", "replace").rstrip("\r\n")
+                if terminal == "exit":
+                    break
+                if len(terminal) > self.executor_threshold:
+                    output = await loop.run_in_executor(self.executor, session.execute, terminal)
+                else:
+                    output = session.execute(terminal)
+
+                writer.write(output.encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            del self.sessions[session]
+            self.tasks.discard(asyncio.current_task())
+            writer.close()
+
+
+# Serves the interpreter over the network until interrupted; see the
+# EvaluationServer. For instance:
+#
+#   python Interpreter.py --serve --port 7777
+#   python Interpreter.py --serve --unix /tmp/toy.sock
+def serve_main(args):
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(prog="Interpreter.py --serve",
+                                     description="Serve the toy interpreter over a line protocol.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--unix", metavar="PATH", default=None, help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT, help="seconds before an idle session is closed")
+    options = parser.parse_args(args)
+
+    server = EvaluationServer(idle_timeout=options.idle_timeout, parse_cache=ParseCache())
+    try:
+        asyncio.run(server.serve_forever(options.host, options.port, options.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown()
+
+    return 0
+
+
+# Evaluates the programs of the files given on the command line, one after
+# the other and each on its own Symbol Table, and prints their variables.
+# A path of "-" reads a program from the standard input. For instance:
+#
+#   python Interpreter.py model.toy
+#   python Interpreter.py first.toy second.toy --engine vm --output json
+#   echo "x = 1;" | python Interpreter.py -
+#
+# The variables of a single program are printed one per line, and those of
+# several programs one program per line, prefixed by its path. Errors are
+# printed to the standard error. With --output json, every program is
+# printed as a JSON object on a line of its own, with its path, variables
+# and error. Returns 1 if any program failed and 0 otherwise.
+def run_main(args):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog="Interpreter.py", description="Evaluate toy programs.")
+    parser.add_argument("paths", nargs="+", metavar="file", help='program file, or "-" for the standard input')
+    parser.add_argument("--engine", choices=ENGINES, default=ENGINE_TREE)
+    parser.add_argument("--optimize", action="store_true")
+    parser.add_argument("--arithmetic", choices=list(ARITHMETICS), default=ARITHMETIC_FLOAT)
+    parser.add_argument("--output", choices=("text", "json"), default="text")
+    parser.add_argument("--cache", action="store_true", help="save parsed programs in __toycache__ directories")
+    parser.add_argument("--cache-dir", default=None, help="save parsed programs in this directory")
+    options = parser.parse_args(args)
+
+    program_cache = None
+    if options.cache or options.cache_dir:
+        program_cache = ProgramCache(options.cache_dir)
+    interpreter = Interpreter(program_cache=program_cache)
+
+    failed = 0
+    for path in options.paths:
+        interpreter.reset()
+        error = None
+        try:
+            if path == "-":
+                interpreter.evaluate_input(sys.stdin.read(), options.engine, options.optimize,
+                                           arithmetic=options.arithmetic)
+            elif options.arithmetic != ARITHMETIC_FLOAT:
+                with open(path) as file:
+                    interpreter.evaluate_input(file.read(), options.engine, options.optimize,
+                                               arithmetic=options.arithmetic)
+            else:
+                interpreter.evaluate_file(path, options.engine, options.optimize)
+        except Exception as err:
+            error = _error_message(err)
+            failed += 1
+
+        if options.output == "json":
+            json.dump(collections.OrderedDict([("file", path), ("symbols", dict(interpreter.symbol_table)),
+                                               ("error", error)]), sys.stdout)
+            sys.stdout.write("\n")
+        elif error is not None:
+            sys.stderr.write("{0}: {1}\n".format(path, error))
+        elif len(options.paths) > 1:
+            if interpreter.symbol_table:
+                sys.stdout.write("{0}: ".format(path))
+                interpreter.write_output(sys.stdout, multiline=False)
+            else:
+                sys.stdout.write("{0}:\n".format(path))
+        else:
+            interpreter.write_output(sys.stdout)
+
+    return 1 if failed else 0
+
+
+# Main defines an terminal based interface for the Toy Interpreter, in which
+# the commands of a Session are entered, as well as "test" to run the tests
+# and "exit".
+#
+# With the --batch option, the program files given on the command line are
+# evaluated in parallel instead; see batch_main(). With the --serve option,
+# the interpreter is served over the network; see serve_main(). With any
+# other arguments, programs are evaluated without a prompt; see run_main().
+# Commands piped to the standard input without arguments are still read one
+# line at a time as commands, so that a program is only read from the
+# standard input when "-" is given.
+def main():
+
+    if sys.argv[1:2] == ["--batch"]:
+        sys.exit(batch_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["--serve"]:
+        sys.exit(serve_main(sys.argv[2:]))
+    if sys.argv[1:]:
+        sys.exit(run_main(sys.argv[1:]))
+
+    session = Session(ParseCache())
+
+    while True:
+        try:
+            terminal = input('uNiCoRn> ')
+        except EOFError:
+            break
+
+        if terminal == "exit":
+            break
+
+        elif terminal == "test":
+            test_driver()
+            continue
+
+        print(session.execute(terminal))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,328 @@
+# # # # # # # # # # # # # # # # # # #
+# Stefan Agapie                     #
+# Final Project -- Toy Interpreter  #
+# # # # # # # # # # # # # # # # # # #
+#
+# Benchmarks of the Toy Interpreter.
+#
+# Generates synthetic workloads of a given size and times each phase of the
+# interpreter separately: scanning (Lexer.scanner_input), parsing
+# (Parser.program), compiling to Bytecode (Compiler.compile_program) and
+# evaluation, on each of the engines that are selected with --engine (by
+# default all of them). Results can be saved as JSON and compared with a saved
+# baseline to spot regressions:
+#
+#   python benchmark.py --output baseline.json
+#   python benchmark.py --baseline baseline.json
+#   python benchmark.py --engine vm --engine slots --workload long_chain
+#
+# Times are the best of several repetitions, which is the most stable measure
+# on a busy machine; peak memory is measured in a separate, traced run.
+#
+# The time it takes to import the interpreter, which every run from the
+# command line pays, is measured with python -X importtime and checked
+# against a budget.
+import argparse
+import collections
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from Interpreter import ENGINE_SLOTS, ENGINE_TREE, ENGINES, Interpreter
+
+
+# Workload generators
+#
+# Each generator returns the source of a program whose size grows with n.
+
+# x = 1 + 2 + ... + n;
+def operator_chain(n):
+    return "x = " + " + ".join(str(i % 9 + 1) for i in range(n)) + ";"
+
+
+# x = (1 + (1 + (... (1 + 1) ...)));
+def nested_parentheses(n):
+    return "x = " + "(1 + " * n + "1" + ")" * n + ";"
+
+
+# x = 0; x = x * 3 / 3 + 1; ... n times
+def many_statements(n):
+    return "x = 0; " + " ".join("x = x * 3 / 3 + 1;" for _ in range(n))
+
+
+# v0 = 1; v1 = v0 + 1; v2 = v1 + 2; ...
+def many_variables(n):
+    statements = ["v0 = 1;"]
+    statements.extend("v{0} = v{1} + {0};".format(i, i - 1) for i in range(1, n))
+    return " ".join(statements)
+
+
+# x = - - - ... - 1;
+def unary_run(n):
+    return "x = " + "- " * n + "1;"
+
+
+# The workloads and their default sizes. The sizes of the chains, nesting and
+# unary runs are bounded by the recursion of the tree walking evaluator, except
+# for the long chain, which only the engines that evaluate Bytecode can run:
+# the tree walking engine skips it.
+WORKLOADS = collections.OrderedDict([
+    ("operator_chain", (operator_chain, 500)),
+    ("nested_parentheses", (nested_parentheses, 300)),
+    ("many_statements", (many_statements, 20000)),
+    ("many_variables", (many_variables, 20000)),
+    ("unary_run", (unary_run, 500)),
+    ("long_chain", (operator_chain, 100000)),
+])
+
+# The phases of a run that depend on the engine.
+ENGINE_PHASES = ("compile", "evaluate")
+
+# The relative slowdown of a phase beyond which it counts as a regression.
+REGRESSION_THRESHOLD = 0.10
+
+# Small workloads are run several times per repetition, so that every
+# repetition processes at least this many tokens and takes long enough to be
+# timed reliably.
+MIN_TOKENS = 50000
+
+# The longest time, in seconds, that importing the interpreter may take.
+STARTUP_BUDGET = 0.025
+
+
+# Runs every phase of a program once on an engine and returns the time of
+# each phase. The tree walking engine evaluates the AST, so its compile phase
+# takes no time; the slots engine resolves its Bytecode as it compiles.
+def _run_phases(interpreter, source, engine):
+
+    timer = time.perf_counter
+    lexer = interpreter.lexer
+    parser = interpreter.parser
+
+    start = timer()
+    lexer.scanner_input(source)
+    scanned = timer()
+    parser.reset()
+    prog = parser.program()
+    parsed = timer()
+    bytecode = None
+    if engine != ENGINE_TREE:
+        bytecode = interpreter.compiler.compile_program(prog)
+        if engine == ENGINE_SLOTS:
+            bytecode.resolve()
+    compiled = timer()
+    interpreter.symbol_table = {}
+    if bytecode is None:
+        interpreter._evaluate_program(prog)
+    else:
+        interpreter._run_bytecode(bytecode, engine)
+    evaluated = timer()
+
+    return (scanned - start, parsed - scanned, compiled - parsed, evaluated - compiled)
+
+
+def _phase(seconds, tokens):
+    return collections.OrderedDict([
+        ("seconds", seconds),
+        ("tokens_per_second", tokens / seconds if seconds else None),
+    ])
+
+
+# Benchmarks a program on each of the given engines and returns its results:
+# its size, the best time of the lex and parse phases over a number of
+# repetitions on any engine and, for each engine, the best time of its
+# compile and evaluate phases, the throughput of each phase in tokens per
+# second and the peak memory of a whole run. An engine that can not evaluate
+# the program, i.e. the tree walking engine on an expression that is too deep
+# for its recursion, is recorded as skipped.
+def benchmark(source, repeat=5, engines=ENGINES):
+
+    interpreter = Interpreter()
+    interpreter.lexer.scanner_input(source)
+    tokens = len(interpreter.lexer.tokens)
+    number = max(1, MIN_TOKENS // tokens)
+
+    results = collections.OrderedDict([
+        ("characters", len(source)),
+        ("tokens", tokens),
+        ("engines", collections.OrderedDict()),
+    ])
+    front = None
+    for engine in engines:
+        try:
+            _run_phases(interpreter, source, engine)
+        except RecursionError:
+            results["engines"][engine] = collections.OrderedDict([("skipped", "expression too deep")])
+            continue
+
+        best = None
+        for _ in range(repeat):
+            runs = [_run_phases(interpreter, source, engine) for _ in range(number)]
+            times = tuple(sum(phase) / number for phase in zip(*runs))
+            best = times if best is None else tuple(min(pair) for pair in zip(best, times))
+        front = best[:2] if front is None else tuple(min(pair) for pair in zip(front, best[:2]))
+
+        tracemalloc.start()
+        try:
+            _run_phases(Interpreter(), source, engine)
+            (_, peak) = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        engine_results = results["engines"][engine] = collections.OrderedDict()
+        for (phase, seconds) in zip(ENGINE_PHASES, best[2:]):
+            engine_results[phase] = _phase(seconds, tokens)
+        engine_results["peak_memory_bytes"] = peak
+
+    if front is None:
+        # No engine could run the program; time the front end on its own.
+        front = (float("inf"), float("inf"))
+        for _ in range(repeat):
+            start = time.perf_counter()
+            interpreter.lexer.scanner_input(source)
+            scanned = time.perf_counter()
+            interpreter.parser.reset()
+            interpreter.parser.program()
+            front = (min(front[0], scanned - start), min(front[1], time.perf_counter() - scanned))
+    for (phase, seconds) in zip(("lex", "parse"), front):
+        results[phase] = _phase(seconds, tokens)
+    return results
+
+
+# Returns the best time, in seconds, of importing the interpreter in a new
+# process, as reported by python -X importtime for the Interpreter module.
+def startup_time(repeat=5):
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, "-X", "importtime", "-c", "import Interpreter"]
+    best = None
+    for _ in range(repeat):
+        output = subprocess.run(command, cwd=directory, stderr=subprocess.PIPE, universal_newlines=True,
+                                check=True).stderr
+        for line in output.splitlines():
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() == "Interpreter":
+                seconds = int(fields[1]) / 1e6
+                best = seconds if best is None else min(best, seconds)
+    return best
+
+
+# Runs every workload, with its size scaled by a factor, on each of the given
+# engines and returns the results together with a description of the
+# environment.
+def run_suite(scale=1.0, repeat=5, workloads=None, engines=ENGINES):
+
+    results = collections.OrderedDict([
+        ("python", platform.python_version()),
+        ("platform", platform.platform()),
+        ("scale", scale),
+        ("repeat", repeat),
+        ("startup_seconds", startup_time(repeat)),
+        ("workloads", collections.OrderedDict()),
+    ])
+    for (name, (generator, size)) in WORKLOADS.items():
+        if workloads and name not in workloads:
+            continue
+        size = max(1, int(size * scale))
+        workload = benchmark(generator(size), repeat, engines)
+        workload["size"] = size
+        results["workloads"][name] = workload
+    return results
+
+
+# Compares results with a baseline and returns a description of every phase
+# that is slower, or every workload whose peak memory on an engine is larger,
+# by more than the threshold. Workloads of different sizes, and engines that
+# either run skipped or the baseline lacks, are not compared.
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+
+    regressions = []
+    startup = results.get("startup_seconds")
+    reference_startup = baseline.get("startup_seconds")
+    if startup and reference_startup and startup > reference_startup * (1 + threshold):
+        regressions.append("startup: {0:.4g} vs {1:.4g} ({2:+.1%})".format(
+            startup, reference_startup, startup / reference_startup - 1))
+
+    for (name, workload) in results["workloads"].items():
+        reference = baseline["workloads"].get(name)
+        if reference is None or reference.get("size") != workload.get("size"):
+            continue
+
+        measures = [(phase, workload[phase]["seconds"], reference[phase]["seconds"]) for phase in ("lex", "parse")]
+        for (engine, engine_results) in workload["engines"].items():
+            reference_engine = reference.get("engines", {}).get(engine)
+            if reference_engine is None or "skipped" in engine_results or "skipped" in reference_engine:
+                continue
+            measures.extend(("{0} {1}".format(engine, phase), engine_results[phase]["seconds"],
+                             reference_engine[phase]["seconds"]) for phase in ENGINE_PHASES)
+            measures.append(("{0} peak memory".format(engine), engine_results["peak_memory_bytes"],
+                             reference_engine["peak_memory_bytes"]))
+        for (measure, value, reference_value) in measures:
+            if reference_value and value > reference_value * (1 + threshold):
+                regressions.append("{0} {1}: {2:.4g} vs {3:.4g} ({4:+.1%})".format(
+                    name, measure, value, reference_value, value / reference_value - 1))
+    return regressions
+
+
+def _report(results):
+
+    print("startup: {0:.1f} ms".format(results["startup_seconds"] * 1e3))
+    print("{0:<20} {1:<6} {2:>10} {3:>12} {4:>12} {5:>12} {6:>12} {7:>12}".format(
+        "workload", "engine", "tokens", "lex tok/s", "parse tok/s", "compile tok/s", "eval tok/s", "peak KiB"))
+    for (name, workload) in results["workloads"].items():
+        for (engine, engine_results) in workload["engines"].items():
+            if "skipped" in engine_results:
+                print("{0:<20} {1:<6} {2:>10} skipped: {3}".format(
+                    name, engine, workload["tokens"], engine_results["skipped"]))
+                continue
+            rates = [workload[phase]["tokens_per_second"] or 0 for phase in ("lex", "parse")]
+            rates.extend(engine_results[phase]["tokens_per_second"] or 0 for phase in ENGINE_PHASES)
+            print("{0:<20} {1:<6} {2:>10} {3:>12.3g} {4:>12.3g} {5:>12.3g} {6:>12.3g} {7:>12.1f}".format(
+                name, engine, workload["tokens"], rates[0], rates[1], rates[2], rates[3],
+                engine_results["peak_memory_bytes"] / 1024.0))
+
+
+def main(args=None):
+
+    parser = argparse.ArgumentParser(description="Benchmark the phases of the toy interpreter.")
+    parser.add_argument("--scale", type=float, default=1.0, help="factor applied to every workload's size")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions of each workload, the best is kept")
+    parser.add_argument("--workload", action="append", choices=list(WORKLOADS), help="run only these workloads")
+    parser.add_argument("--engine", action="append", choices=ENGINES,
+                        help="run only on these engines (default: every engine)")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results with this JSON file")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative slowdown reported as a regression")
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET,
+                        help="seconds that importing the interpreter may take")
+    options = parser.parse_args(args)
+
+    results = run_suite(options.scale, options.repeat, options.workload, options.engine or ENGINES)
+    _report(results)
+
+    over_budget = results["startup_seconds"] > options.startup_budget
+    if over_budget:
+        print("startup over budget: {0:.1f} ms > {1:.1f} ms".format(
+            results["startup_seconds"] * 1e3, options.startup_budget * 1e3))
+
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            regressions = compare(results, json.load(file), options.threshold)
+        for regression in regressions:
+            print("regression: " + regression)
+        if regressions:
+            return 1
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())